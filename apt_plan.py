@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+import argparse
+import glob
+import os
+import shlex
+import subprocess
+import time
+import depprobe
+import run_trace
+
+# Packages each method needs on the central server and on the jump box
+PACKAGES = {
+    "central": {
+        "reverse-ssh": ["openssh-client"],
+        "openvpn": ["openvpn"],
+        "wireguard": ["wireguard"],
+        "tor-ssh": ["tor", "autossh", "openssh-client", "curl"],
+    },
+    "jumpbox": {
+        "reverse-ssh": ["openssh-client"],
+        "openvpn": ["openvpn"],
+        "wireguard": ["wireguard"],
+        "tor-ssh": ["autossh", "openssh-client"],
+    },
+}
+
+# Package lists younger than this are reused instead of running 'apt-get update'
+MAX_LIST_AGE = 3600
+
+# Files whose mtime tells us when the package lists were last refreshed
+LIST_STAMPS = ["/var/lib/apt/lists", "/var/lib/apt/periodic/update-success-stamp"]
+
+# Installer embedded in generated jump box scripts: uses a local .deb bundle shipped next to the
+# script when present, otherwise apt with the same freshness check.
+INSTALL_SNIPPET = '''
+# Install packages from the bundled .deb cache if shipped, otherwise with apt
+def install_packages(packages):
+    missing = [p for p in packages if subprocess.run(["dpkg", "-s", p], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode != 0]
+    if not missing:
+        return
+    bundle = os.path.join(os.path.dirname(os.path.abspath(__file__)), "debs")
+    debs = sorted(os.path.join(bundle, f) for f in os.listdir(bundle) if f.endswith(".deb")) if os.path.isdir(bundle) else []
+    if debs:
+        subprocess.run(["dpkg", "-i"] + debs, check=True)
+        return
+    if not os.path.isdir("/var/lib/apt/lists") or time.time() - os.stat("/var/lib/apt/lists").st_mtime > 3600:
+        subprocess.run(["apt-get", "update"], check=True)
+    subprocess.run(["apt-get", "install", "-y"] + missing, check=True)
+'''
+
+def packages_for(methods, role="central"):
+    """Collect the packages needed by every selected method, without duplicates."""
+    packages = []
+    for method in methods:
+        for package in PACKAGES[role].get(method, []):
+            if package not in packages:
+                packages.append(package)
+    return packages
+
+def lists_age():
+    """Seconds since the apt package lists were last refreshed (infinity if never)."""
+    stamps = []
+    for path in LIST_STAMPS:
+        try:
+            stamps.append(os.stat(path).st_mtime)
+        except OSError:
+            pass
+    return time.time() - max(stamps) if stamps else float("inf")
+
+def plan(packages):
+    """Return (missing packages, whether 'apt-get update' is needed first)."""
+    installed = depprobe.installed_packages()
+    missing = [p for p in packages if p not in installed]
+    return missing, bool(missing) and lists_age() > MAX_LIST_AGE
+
+def ensure_packages(packages, run=run_trace.run):
+    """Install every missing package with one apt-get call, refreshing lists only when stale.
+
+    run is the caller's command runner, so each script keeps its own error handling.
+    """
+    missing, update = plan(packages)
+    if not missing:
+        return []
+    if update:
+        run("apt-get update")
+    run("apt-get install -y " + " ".join(missing))
+    return missing
+
+def dependency_closure(packages):
+    """Resolve the packages plus their recursive Depends/PreDepends with one apt-cache call."""
+    with run_trace.step("apt-cache depends --recurse"):
+        output = subprocess.run(
+            ["apt-cache", "depends", "--recurse", "--no-recommends", "--no-suggests", "--no-conflicts",
+             "--no-breaks", "--no-replaces", "--no-enhances"] + list(packages),
+            check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout.decode()
+    names = []
+    for line in output.splitlines():
+        if line and not line.startswith(" ") and not line.startswith("<"):
+            name = line.strip().split(":")[0]
+            if name not in names:
+                names.append(name)
+    return names
+
+def build_bundle(packages, out_dir, run=run_trace.run):
+    """Download .deb files for packages and all their dependencies into out_dir for offline installs."""
+    os.makedirs(out_dir, exist_ok=True)
+    names = dependency_closure(packages)
+    # run() takes a shell command (it is traced and captured per task), so quote everything interpolated
+    run(f"cd {shlex.quote(out_dir)} && apt-get download " + " ".join(shlex.quote(name) for name in names))
+    return sorted(glob.glob(os.path.join(out_dir, "*.deb")))
+
+def main():
+    parser = argparse.ArgumentParser(description="Plan and install the packages needed by JumpSecure methods.")
+    parser.add_argument("command", choices=["plan", "install", "bundle"])
+    parser.add_argument("--methods", nargs="+", default=list(PACKAGES["central"]), help="Methods to collect packages for")
+    parser.add_argument("--role", choices=["central", "jumpbox"], default="central")
+    parser.add_argument("--out", default="debs", help="Bundle directory (bundle command)")
+    args = parser.parse_args()
+
+    packages = packages_for(args.methods, args.role)
+    if args.command == "plan":
+        missing, update = plan(packages)
+        print(f"Packages: {' '.join(packages)}")
+        print(f"Missing: {' '.join(missing) or 'none'}")
+        print(f"apt-get update needed: {'yes' if update else 'no'}")
+    elif args.command == "install":
+        installed = ensure_packages(packages)
+        print(f"Installed: {' '.join(installed) or 'nothing, all packages present'}")
+    else:
+        debs = build_bundle(packages, args.out)
+        print(f"Wrote {len(debs)} .deb files to '{args.out}'. Ship it next to the jump box scripts.")
+
+if __name__ == "__main__":
+    main()
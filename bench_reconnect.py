@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+import argparse
+import getpass
+import os
+import re
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+import tunnel_ports
+from bench_ssh_profiles import start_loopback_sshd
+
+# Simulate a reconnect storm: N jump boxes open their reverse tunnels at the same moment against a
+# private loopback sshd, once with sshd's default limits and once with the tunnel_ports capacity profile
+
+def _penalties_off():
+    """OpenSSH 9.8+ penalises sources that drop connections; every simulated box shares 127.0.0.1."""
+    version = subprocess.run(["ssh", "-V"], capture_output=True, text=True).stderr
+    m = re.search(r"OpenSSH_(\d+)\.(\d+)", version)
+    return "PerSourcePenalties no\n" if m and (int(m.group(1)), int(m.group(2))) >= (9, 8) else ""
+
+def connect(port, key, target, remote_port, hold, timeout, results, index):
+    """One box: open the reverse tunnel, report when the session is up, keep it for hold seconds."""
+    argv = ["ssh", "-p", str(port), "-i", key, "-o", "BatchMode=yes", "-o", "StrictHostKeyChecking=no",
+            "-o", "UserKnownHostsFile=/dev/null", "-o", "LogLevel=ERROR", "-o", f"ConnectTimeout={timeout}",
+            "-o", "ExitOnForwardFailure=yes", "-R", f"{remote_port}:127.0.0.1:{port}", target, f"echo up; sleep {hold}"]
+    started = time.perf_counter()
+    proc = subprocess.Popen(argv, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    up = proc.stdout.readline().strip() == "up"
+    elapsed = time.perf_counter() - started
+    results[index] = elapsed if proc.wait() == 0 and up else None
+
+def storm(tmp, boxes, extra, hold, timeout):
+    """(seconds to connect for each box, or None if it failed; wall time), or None without sshd."""
+    started = start_loopback_sshd(tmp, extra + _penalties_off())
+    if started is None:
+        return None
+    sshd, port, key = started
+    try:
+        ports_file = os.path.join(tmp, "tunnel_ports.json")
+        remote_ports = [tunnel_ports.allocate(f"box{i}", path=ports_file)[0] for i in range(boxes)]
+        results = [None] * boxes
+        threads = [threading.Thread(target=connect, args=(port, key, f"{getpass.getuser()}@127.0.0.1",
+                                                          remote_ports[i], hold, timeout, results, i))
+                   for i in range(boxes)]
+        wall = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, time.perf_counter() - wall
+    finally:
+        sshd.terminate()
+        sshd.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test sshd with N jump boxes reconnecting at once.")
+    parser.add_argument("--boxes", type=int, default=200, help="Simulated jump boxes")
+    parser.add_argument("--hold", type=float, default=3, help="Seconds each tunnel stays up, so all are open together")
+    parser.add_argument("--timeout", type=int, default=20, help="ssh ConnectTimeout in seconds")
+    args = parser.parse_args()
+
+    configs = [("sshd defaults", ""), ("capacity profile", tunnel_ports.capacity_config(args.boxes))]
+    print(f"{'limits':<18} {'connected':>10} {'p50':>9} {'p95':>9} {'max':>9} {'wall':>8}")
+    for label, extra in configs:
+        with tempfile.TemporaryDirectory() as tmp:
+            outcome = storm(tmp, args.boxes, extra, args.hold, args.timeout)
+        if outcome is None:
+            print("Skipped: no sshd available for a loopback load test (install openssh-server).")
+            return
+        results, wall = outcome
+        times = sorted(t for t in results if t is not None)
+        if not times:
+            print(f"{label:<18} {0:>5}/{args.boxes:<4}")
+            continue
+        p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+        print(f"{label:<18} {len(times):>5}/{args.boxes:<4} {statistics.median(times) * 1000:7.0f}ms "
+              f"{p95 * 1000:7.0f}ms {times[-1] * 1000:7.0f}ms {wall:7.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+import argparse
+import getpass
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import tempfile
+import time
+import ssh_profiles
+
+# Benchmark each SSH transport profile over a private loopback sshd (or a real --host)
+SSHD_CONFIG = """Port {port}
+ListenAddress 127.0.0.1
+HostKey {tmp}/host_key
+AuthorizedKeysFile {tmp}/authorized_keys
+PidFile {tmp}/sshd.pid
+PasswordAuthentication no
+KbdInteractiveAuthentication no
+UsePAM no
+StrictModes no
+"""
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_loopback_sshd(tmp, extra=""):
+    """Start a throwaway sshd on 127.0.0.1 that accepts a fresh key; returns (process, port, key) or None.
+
+    extra is appended to the sshd config (limits under test in bench_reconnect.py).
+    """
+    sshd = shutil.which("sshd") or next((p for p in ("/usr/sbin/sshd", "/sbin/sshd") if os.path.exists(p)), None)
+    if not sshd:
+        return None
+    port = free_port()
+    for name in ("host_key", "client_key"):
+        subprocess.run(["ssh-keygen", "-q", "-t", "ed25519", "-N", "", "-f", f"{tmp}/{name}"], check=True)
+    shutil.copy(f"{tmp}/client_key.pub", f"{tmp}/authorized_keys")
+    with open(f"{tmp}/sshd_config", "w") as f:
+        f.write(SSHD_CONFIG.format(port=port, tmp=tmp) + extra)
+    proc = subprocess.Popen([sshd, "-D", "-e", "-f", f"{tmp}/sshd_config"], stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return proc, port, f"{tmp}/client_key"
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    return None
+
+def ssh_argv(target, port, key, profile, control_path, *remote):
+    # ssh keeps the first value it sees for an option, so the overrides go before the profile
+    argv = ["ssh", "-p", str(port), "-o", "BatchMode=yes", "-o", "StrictHostKeyChecking=no",
+            "-o", "UserKnownHostsFile=/dev/null", "-o", "LogLevel=ERROR", "-o", f"ControlPath={control_path}"]
+    if key:
+        argv += ["-i", key]
+    return argv + ssh_profiles.options(profile) + [target, *remote]
+
+def measure(profile, target, port, key, tmp, megabytes, pings, data):
+    control_path = f"{tmp}/cm-{profile}"
+    base = lambda *remote: ssh_argv(target, port, key, profile, control_path, *remote)
+
+    started = time.perf_counter()
+    subprocess.run(base("true"), check=True)
+    first_connect = time.perf_counter() - started
+    started = time.perf_counter()
+    subprocess.run(base("true"), check=True)
+    reused_connect = time.perf_counter() - started
+
+    chunk = bytes(1 << 20) if data == "zeros" else os.urandom(1 << 20)
+    proc = subprocess.Popen(base("cat > /dev/null"), stdin=subprocess.PIPE)
+    started = time.perf_counter()
+    for _ in range(megabytes):
+        proc.stdin.write(chunk)
+    proc.stdin.close()
+    proc.wait()
+    throughput = megabytes / (time.perf_counter() - started)
+
+    proc = subprocess.Popen(base("cat"), stdin=subprocess.PIPE, stdout=subprocess.PIPE, bufsize=0)
+    line = b"x" * 63 + b"\n"
+    rtts = []
+    for _ in range(pings):
+        started = time.perf_counter()
+        proc.stdin.write(line)
+        received = b""
+        while len(received) < len(line):
+            received += proc.stdout.read(len(line) - len(received))
+        rtts.append(time.perf_counter() - started)
+    proc.stdin.close()
+    proc.wait()
+
+    subprocess.run(["ssh", "-o", f"ControlPath={control_path}", "-O", "exit", target],
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return first_connect, reused_connect, throughput, statistics.median(rtts), max(rtts)
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure throughput and latency for each SSH transport profile.")
+    parser.add_argument("--host", help="user@host to benchmark against instead of a private loopback sshd")
+    parser.add_argument("--port", type=int, default=22, help="SSH port for --host")
+    parser.add_argument("--megabytes", type=int, default=256, help="Data pushed per throughput run")
+    parser.add_argument("--pings", type=int, default=200, help="Round trips per latency run")
+    parser.add_argument("--data", choices=["random", "zeros"], default="random",
+                        help="Payload for the throughput run (zeros favour compression)")
+    parser.add_argument("--profile", action="append", choices=ssh_profiles.names(), help="Only these profiles")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sshd = None
+        if args.host:
+            target, port, key = args.host, args.port, None
+        else:
+            started = start_loopback_sshd(tmp)
+            if started is None:
+                print("Skipped: no sshd available for a loopback benchmark (install openssh-server or pass --host).")
+                return
+            sshd, port, key = started
+            target = f"{getpass.getuser()}@127.0.0.1"
+        try:
+            print(f"{'profile':<16} {'connect':>9} {'reused':>9} {'throughput':>13} {'rtt p50':>9} {'rtt max':>9}")
+            for profile in args.profile or ssh_profiles.names():
+                first, reused, mbps, p50, worst = measure(profile, target, port, key, tmp,
+                                                          args.megabytes, args.pings, args.data)
+                print(f"{profile:<16} {first * 1000:7.1f}ms {reused * 1000:7.1f}ms {mbps:8.1f} MiB/s "
+                      f"{p50 * 1000:7.2f}ms {worst * 1000:7.2f}ms")
+        finally:
+            if sshd:
+                sshd.terminate()
+                sshd.wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Entry points and the arguments used to start them; None means import the module body only
+# (interactive scripts that would otherwise prompt or require root)
+ENTRY_POINTS = [
+    ("jump-secure.py", ["--help"]),
+    ("private-connect.py", ["--help"]),
+    ("server-n-jumpbox.py", ["--help"]),
+    ("openvpn-server-setup.py", None),
+    ("setup_jumpbox.py", None),
+    ("wg_provision.py", ["--help"]),
+    ("wg_peers.py", ["--help"]),
+    ("pki_ca.py", ["--help"]),
+    ("dh_pool.py", ["--help"]),
+    ("ssh_key_pool.py", ["--help"]),
+    ("ipam.py", ["--help"]),
+    ("key_registry.py", ["--help"]),
+    ("tunnel_ports.py", ["--help"]),
+    ("apt_plan.py", ["--help"]),
+    ("tunnel_supervisor.py", ["--help"]),
+    ("run_trace.py", ["--help"]),
+    ("firewall.py", ["--help"]),
+]
+
+# Modules that must only be imported on the code paths that need them
+DEFERRED = ["yaml", "colorama", "pyfiglet", "cryptography", "multiprocessing", "concurrent.futures", "asyncio"]
+
+# Default baseline file (machine-specific, create it with --save-baseline)
+BASELINE_FILE = os.path.join(HERE, "startup_baseline.json")
+
+def command(script, args, extra=()):
+    path = os.path.join(HERE, script)
+    if args is None:
+        return [sys.executable, *extra, "-c", f"import runpy; runpy.run_path({path!r}, run_name='__startup_bench__')"]
+    return [sys.executable, *extra, path, *args]
+
+def run_once(argv, pycache):
+    """Run one start-up and return wall seconds."""
+    env = dict(os.environ, PYTHONPYCACHEPREFIX=pycache)
+    started = time.perf_counter()
+    subprocess.run(argv, cwd=HERE, env=env, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - started
+
+def import_breakdown(argv, pycache):
+    """Return [(cumulative_us, self_us, module)] for every import, from -X importtime."""
+    env = dict(os.environ, PYTHONPYCACHEPREFIX=pycache)
+    proc = subprocess.run([argv[0], "-X", "importtime", *argv[1:]], cwd=HERE, env=env,
+                          stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    rows = []
+    for line in proc.stderr.decode(errors="replace").splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold and warm start-up time of every entry point.")
+    parser.add_argument("--runs", type=int, default=10, help="Warm runs per entry point (median is reported)")
+    parser.add_argument("--cold-runs", type=int, default=3, help="Cold runs per entry point (empty bytecode cache)")
+    parser.add_argument("--top", type=int, default=5, help="Slowest top-level imports to show per entry point")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Baseline JSON to compare warm medians against")
+    parser.add_argument("--save-baseline", action="store_true", help="Write the current warm medians as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown against the baseline")
+    parser.add_argument("--slack-ms", type=float, default=5.0, help="Allowed absolute slowdown against the baseline")
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    failures = []
+    results = {}
+    with tempfile.TemporaryDirectory() as warm_cache:
+        for script, script_args in ENTRY_POINTS:
+            argv = command(script, script_args)
+            cold = []
+            for _ in range(args.cold_runs):
+                with tempfile.TemporaryDirectory() as cold_cache:
+                    cold.append(run_once(argv, cold_cache))
+            run_once(argv, warm_cache)  # Populate the bytecode cache
+            warm = [run_once(argv, warm_cache) for _ in range(args.runs)]
+            cold_ms = statistics.median(cold) * 1000
+            warm_ms = statistics.median(warm) * 1000
+            results[script] = warm_ms
+
+            breakdown = import_breakdown(argv, warm_cache)
+            imported = {name.strip() for _, _, name in breakdown}
+            top_level = sorted((row for row in breakdown if not row[2].startswith("  ")), reverse=True)[:args.top]
+            print(f"{script:<26} cold {cold_ms:7.1f} ms   warm {warm_ms:7.1f} ms")
+            for cumulative_us, self_us, name in top_level:
+                print(f"    {cumulative_us / 1000:7.1f} ms cumulative {self_us / 1000:6.1f} ms self  {name.strip()}")
+
+            eager = [name for name in DEFERRED if name in imported]
+            if eager:
+                failures.append(f"{script} imports {', '.join(eager)} at start-up")
+            if script in baseline:
+                limit = baseline[script] * (1 + args.tolerance) + args.slack_ms
+                if warm_ms > limit:
+                    failures.append(f"{script} warm start-up {warm_ms:.1f} ms exceeds {limit:.1f} ms "
+                                    f"(baseline {baseline[script]:.1f} ms)")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"\nSaved baseline to {args.baseline}.")
+    if failures:
+        print("\nStart-up regressions:")
+        for failure in failures:
+            print(f"  - {failure}")
+        sys.exit(1)
+    print("\nNo start-up regressions.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+import argparse
+import subprocess
+import shutil
+import sys
+import tempfile
+import time
+import wg_peers
+import wg_provision
+
+# Benchmark batch WireGuard provisioning against the old 'wg genkey | wg pubkey' fork-per-key approach
+def time_batch(peers):
+    """Time key generation, config rendering and bundle writing for a batch of peers."""
+    with tempfile.TemporaryDirectory() as tmp:
+        started = time.perf_counter()
+        server_config, bundles = wg_provision.provision_peers(peers, "203.0.113.10", 51820, "10.0.0.0/16")
+        wg_provision.write_server_config(server_config, f"{tmp}/wg0.conf")
+        wg_provision.write_bundles(bundles, f"{tmp}/bundles")
+        return time.perf_counter() - started
+
+def time_forked(samples):
+    """Time the per-key 'wg genkey' + 'wg pubkey' forks used previously, or None if wg is missing."""
+    if not shutil.which("wg"):
+        return None
+    started = time.perf_counter()
+    for _ in range(samples):
+        private = subprocess.check_output("wg genkey", shell=True).decode().strip()
+        subprocess.check_output(f"echo '{private}' | wg pubkey", shell=True)
+    return (time.perf_counter() - started) / samples
+
+def check_rerun(peers):
+    """Provision, re-run unchanged, then re-run with one more jump box; return what a live re-run would do.
+
+    Returns (unchanged re-run renders the same config, [Interface] unchanged after growing,
+    peers to add or update live, peers to remove live, new bundles, a keepalive edited
+    in the config is picked up as an update).
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        path, state_dir = f"{tmp}/wg0.conf", f"{tmp}/ipam"
+        provision = lambda count: wg_peers.provision(path, count, "203.0.113.10", 51820, "10.0.0.0/16", state_dir=state_dir)
+        first, _ = provision(peers)
+        wg_provision.write_server_config(first, path)
+        again, _ = provision(peers)
+        grown, bundles = provision(peers + 1)
+        live = {peer["public_key"]: wg_peers.peer_state(peer) for peer in wg_peers.parse_config(first)[1]}
+        updates, removals = wg_peers.peer_delta(wg_peers.parse_config(grown)[1], live)
+        edited = wg_peers.parse_config(first)[1]
+        edited[0]["extra"].append("PersistentKeepalive = 25")
+        settings_applied = wg_peers.peer_delta(edited, live)[0] == edited[:1]
+        return (again == first, wg_peers.Interface(path, grown).differs() is None, len(updates), len(removals),
+                len(bundles), settings_applied)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batch WireGuard peer provisioning.")
+    parser.add_argument("--peers", type=int, default=1000, help="Number of peers per batch")
+    parser.add_argument("--fork-samples", type=int, default=20, help="Key pairs to time with the wg binary")
+    args = parser.parse_args()
+
+    backend = "cryptography" if wg_provision._load_backend() else "pure Python"
+    elapsed = time_batch(args.peers)
+    print(f"In-process ({backend}): {args.peers} peers + server in {elapsed:.3f}s "
+          f"({elapsed / (args.peers + 1) * 1000:.3f} ms per key pair incl. rendering and writing)")
+
+    per_key = time_forked(args.fork_samples)
+    if per_key is None:
+        print("Forked 'wg genkey | wg pubkey': skipped, 'wg' is not installed.")
+    else:
+        projected = per_key * (args.peers + 1)
+        print(f"Forked 'wg genkey | wg pubkey': {per_key * 1000:.3f} ms per key pair, "
+              f"~{projected:.3f}s projected for {args.peers} peers (keys only)")
+
+    same, interface_kept, updates, removals, bundles, settings_applied = check_rerun(max(args.peers, 2))
+    ok = same and interface_kept and settings_applied and (updates, removals, bundles) == (1, 0, 1)
+    print(f"Re-run with one more jump box: {'interface kept' if interface_kept else 'INTERFACE CHANGED (restart)'}, "
+          f"{updates} peer(s) added live, {removals} removed, {bundles} new script(s)"
+          f"{'' if same else '; unchanged re-run rendered a DIFFERENT config'}"
+          f"{'' if settings_applied else '; an edited PersistentKeepalive was NOT applied live'}.")
+    if not ok:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
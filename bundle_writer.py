@@ -0,0 +1,92 @@
+import hashlib
+import json
+import os
+import string
+import run_trace
+from profile_store import atomic_write
+
+# Per-directory record of what each generated file was rendered from
+MANIFEST = ".bundle-manifest.json"
+
+def render(template, **values):
+    """Fill $name placeholders in a script template in a single pass.
+
+    Values are inserted verbatim, so certificates, keys and embedded code may contain braces
+    (or '$') without being re-interpreted, unlike str.format() or nested f-strings.
+    """
+    return string.Template(template).substitute(values)
+
+def input_hash(template, values, mode):
+    """Stable hash of everything an artifact is rendered from."""
+    digest = hashlib.sha256(template.encode())
+    digest.update(json.dumps(values, sort_keys=True, default=str).encode())
+    digest.update(str(mode).encode())
+    return digest.hexdigest()
+
+class Artifact:
+    """One generated file: a template, the values it is rendered with and the file mode."""
+
+    def __init__(self, name, template, values, mode=0o700):
+        self.name = name
+        self.template = template
+        self.values = values
+        self.mode = mode
+
+    def digest(self):
+        return input_hash(self.template, self.values, self.mode)
+
+    def render(self):
+        return render(self.template, **self.values)
+
+class BundleWriter:
+    """Writes artifacts into a directory, skipping those whose inputs and on-disk file are unchanged.
+
+    The manifest stores each file's input hash and the size/mtime it was written with; a file
+    is re-rendered only when its inputs change or someone modified or removed it.
+    """
+
+    def __init__(self, out_dir):
+        self.out_dir = out_dir
+        self.manifest_path = os.path.join(out_dir, MANIFEST)
+
+    def _load(self):
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _unchanged(self, entry, path, digest):
+        if not entry or entry.get("inputs") != digest:
+            return False
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return False
+        return [st.st_size, st.st_mtime_ns] == entry.get("stat")
+
+    def write(self, artifacts):
+        """Render and atomically write changed artifacts; return (written paths, unchanged paths)."""
+        with run_trace.step(f"bundles {self.out_dir}"):
+            return self._write(artifacts)
+
+    def _write(self, artifacts):
+        os.makedirs(self.out_dir, exist_ok=True)
+        manifest = self._load()
+        written, unchanged = [], []
+        for artifact in artifacts:
+            path = os.path.join(self.out_dir, artifact.name)
+            digest = artifact.digest()
+            if self._unchanged(manifest.get(artifact.name), path, digest):
+                if os.stat(path).st_mode & 0o7777 != artifact.mode:
+                    os.chmod(path, artifact.mode)
+                unchanged.append(path)
+                continue
+            atomic_write(path, artifact.render(), artifact.mode)
+            os.chmod(path, artifact.mode)  # The umask may have narrowed the mode at creation
+            st = os.stat(path)
+            manifest[artifact.name] = {"inputs": digest, "stat": [st.st_size, st.st_mtime_ns]}
+            written.append(path)
+        if written:
+            atomic_write(self.manifest_path, json.dumps(manifest, indent=1, sort_keys=True), 0o600)
+        return written, unchanged
@@ -0,0 +1,25 @@
+# Stand-ins for colorama's Fore and Style that import and initialise colorama on first use,
+# so commands that never print in color (e.g. --help) don't pay for the import
+_colorama = None
+
+def _load():
+    global _colorama
+    if _colorama is None:
+        import colorama
+        colorama.init()
+        _colorama = colorama
+    return _colorama
+
+class _Group:
+    """Proxy for one colorama attribute group (Fore, Style)."""
+
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        value = getattr(getattr(_load(), self._name), attr)
+        setattr(self, attr, value)
+        return value
+
+Fore = _Group("Fore")
+Style = _Group("Style")
@@ -0,0 +1,120 @@
+import os
+
+# dpkg status database and the on-disk probe cache
+DPKG_STATUS = "/var/lib/dpkg/status"
+CACHE_FILE = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "jumpsecure", "deps.json")
+
+# Dependencies that are package names rather than binaries: name -> binary that proves it is installed (None = package check only)
+BINARY_FOR = {
+    "easy-rsa": None,
+    "wireguard": "wg",
+    "wireguard-tools": "wg",
+    "openssh-client": "ssh",
+}
+
+# In-process caches, keyed the same way as the on-disk cache
+_path_cache = {}
+_package_cache = {}
+
+def _path_dirs(path=None):
+    return [d for d in (path if path is not None else os.environ.get("PATH", "")).split(os.pathsep) if d]
+
+def _path_key(path=None):
+    """Cache key for PATH lookups: the PATH string plus the mtime of every directory on it."""
+    dirs = _path_dirs(path)
+    stamps = []
+    for d in dirs:
+        try:
+            stamps.append(os.stat(d).st_mtime_ns)
+        except OSError:
+            stamps.append(0)
+    return os.pathsep.join(dirs) + "|" + ",".join(map(str, stamps))
+
+def _status_key(status=DPKG_STATUS):
+    try:
+        st = os.stat(status)
+    except OSError:
+        return "missing"
+    return f"{st.st_mtime_ns}:{st.st_size}"
+
+def which(name, path=None):
+    """Resolve a binary on PATH in-process (same result as 'which', without forking a shell)."""
+    key = _path_key(path)
+    found = _path_cache.setdefault(key, {})
+    if name not in found:
+        found[name] = None
+        for d in _path_dirs(path):
+            candidate = os.path.join(d, name)
+            if os.path.isfile(candidate) and os.access(candidate, os.X_OK):
+                found[name] = candidate
+                break
+    return found[name]
+
+def installed_packages(status=DPKG_STATUS):
+    """Parse the dpkg status database once and return the set of installed package names."""
+    key = _status_key(status)
+    if key not in _package_cache:
+        packages = set()
+        try:
+            with open(status, "rb") as f:
+                data = f.read()
+        except OSError:
+            data = b""
+        for stanza in data.split(b"\n\n"):
+            name = installed = None
+            for line in stanza.split(b"\n"):
+                if line.startswith(b"Package: "):
+                    name = line[9:].strip()
+                elif line.startswith(b"Status: "):
+                    installed = line.endswith(b" installed")
+            if name and installed:
+                packages.add(name.decode())
+        _package_cache.clear()
+        _package_cache[key] = packages
+    return _package_cache[key]
+
+def is_installed(dep):
+    """Return True if dep is available, as a binary on PATH or as an installed dpkg package."""
+    binary = BINARY_FOR.get(dep, dep)
+    if binary and which(binary):
+        return True
+    return dep in installed_packages()
+
+def _load_cache():
+    import json
+    try:
+        with open(CACHE_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_cache(cache):
+    import json
+    try:
+        os.makedirs(os.path.dirname(CACHE_FILE), exist_ok=True)
+        tmp = f"{CACHE_FILE}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(cache, f)
+        os.replace(tmp, CACHE_FILE)
+    except OSError:
+        pass  # The cache is an optimisation only
+
+def probe_all(dependencies):
+    """Check every method's dependencies in one call: {method: {dep: installed}}.
+
+    Results are cached on disk keyed on PATH (and its directory mtimes) and the dpkg status
+    mtime, so repeated CLI invocations skip both the PATH walk and the dpkg parse.
+    """
+    deps = sorted({dep for names in dependencies.values() for dep in names})
+    key = f"{_path_key()}|{_status_key()}|{','.join(deps)}"
+    cache = _load_cache()
+    if cache.get("key") == key:
+        status = cache["status"]
+    else:
+        status = {dep: is_installed(dep) for dep in deps}
+        _save_cache({"key": key, "status": status})
+    return {method: {dep: status[dep] for dep in names} for method, names in dependencies.items()}
+
+def missing(dependencies, method):
+    """Return the dependencies of method that are not installed, in declaration order."""
+    return [dep for dep, ok in probe_all(dependencies).get(method, {}).items() if not ok]
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+import argparse
+import fcntl
+import os
+import shutil
+import subprocess
+import sys
+import time
+import run_trace
+
+# Pool location and sizing
+POOL_DIR = "/var/lib/jumpsecure/dh-pool"
+POOL_SIZE = 4
+DH_BITS = 2048
+
+def _ready(pool_dir):
+    """Return finished DH parameter files in the pool, oldest first."""
+    if not os.path.isdir(pool_dir):
+        return []
+    entries = [e for e in os.scandir(pool_dir) if e.name.endswith(".pem") and e.is_file()]
+    entries.sort(key=lambda e: e.stat().st_mtime)
+    return [e.path for e in entries]
+
+def generate(path, bits=DH_BITS):
+    """Generate DH parameters into path, writing to a temp file first so readers never see partial output."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with run_trace.step(f"openssl dhparam {bits}"):
+            subprocess.run(["openssl", "dhparam", "-out", tmp, str(bits)], check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def refill(pool_dir=POOL_DIR, size=POOL_SIZE, bits=DH_BITS):
+    """Top the pool up to size files. Returns immediately if another refill holds the lock."""
+    os.makedirs(pool_dir, exist_ok=True)
+    with open(os.path.join(pool_dir, ".lock"), "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return 0
+        made = 0
+        while len(_ready(pool_dir)) < size:
+            generate(os.path.join(pool_dir, f"dh{bits}-{time.time_ns()}.pem"), bits)
+            made += 1
+        return made
+
+def start_background_refill(pool_dir=POOL_DIR, size=POOL_SIZE, bits=DH_BITS):
+    """Refill the pool in a detached process so the caller never waits on DH generation."""
+    subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--pool", pool_dir, "refill", "--size", str(size), "--bits", str(bits)],
+        stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True,
+        env={k: v for k, v in os.environ.items() if k != run_trace.TRACE_ENV})  # Keep the caller's trace file
+
+def take(dest, pool_dir=POOL_DIR, size=POOL_SIZE, bits=DH_BITS):
+    """Move one pre-computed dh.pem to dest and trigger a background refill.
+
+    Falls back to generating inline when the pool is empty. Returns "pool" or "generated".
+    """
+    os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+    source = "generated"
+    for path in _ready(pool_dir):
+        try:
+            shutil.move(path, dest)
+        except FileNotFoundError:
+            continue  # Another consumer took it first
+        source = "pool"
+        break
+    else:
+        generate(dest, bits)
+    start_background_refill(pool_dir, size, bits)
+    return source
+
+def main():
+    parser = argparse.ArgumentParser(description="Pool of pre-computed Diffie-Hellman parameters for OpenVPN.")
+    parser.add_argument("--pool", default=POOL_DIR, help="Pool directory")
+    sub = parser.add_subparsers(dest="command", required=True)
+    refill_cmd = sub.add_parser("refill", help="Generate parameters until the pool is full")
+    refill_cmd.add_argument("--size", type=int, default=POOL_SIZE)
+    refill_cmd.add_argument("--bits", type=int, default=DH_BITS)
+    take_cmd = sub.add_parser("take", help="Move one parameter file to DEST")
+    take_cmd.add_argument("dest")
+    sub.add_parser("status", help="Show how many parameter files are ready")
+    args = parser.parse_args()
+
+    if args.command == "refill":
+        made = refill(args.pool, args.size, args.bits)
+        print(f"Generated {made} DH parameter file(s); {len(_ready(args.pool))} ready in {args.pool}.")
+    elif args.command == "take":
+        source = take(args.dest, args.pool)
+        print(f"Wrote {args.dest} ({'from pool' if source == 'pool' else 'generated inline, pool was empty'}).")
+    else:
+        print(f"{len(_ready(args.pool))} DH parameter file(s) ready in {args.pool}.")
+
+if __name__ == "__main__":
+    main()
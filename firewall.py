@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import re
+import sys
+import depprobe
+import host_state
+import run_trace
+from profile_store import atomic_write
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Ports JumpSecure has opened, replayed at boot by the unit below
+STATE_DIR = "/etc/jumpsecure"
+RULES_FILE = os.path.join(STATE_DIR, "firewall.json")
+UNIT = "jumpsecure-firewall.service"
+UNIT_PATH = f"/etc/systemd/system/{UNIT}"
+
+# iptables chain holding JumpSecure's rules, jumped to from the top of INPUT (ahead of ufw's chains)
+IPTABLES_CHAIN = "JUMPSECURE-INPUT"
+# nftables chain inside the host's own filter table; an accept in a separate table would not
+# override a drop in this one
+NFT_TABLE = "inet filter"
+NFT_CHAIN = "jumpsecure"
+
+PROTOCOLS = ("udp", "tcp")
+
+UNIT_TEMPLATE = f"""[Unit]
+Description=JumpSecure firewall rules
+After=network-pre.target nftables.service ufw.service netfilter-persistent.service
+
+[Service]
+Type=oneshot
+RemainAfterExit=yes
+ExecStart={sys.executable} {os.path.join(HERE, 'firewall.py')} restore
+
+[Install]
+WantedBy=multi-user.target
+"""
+
+def parse_rule(spec):
+    """'1194/udp' (or '1194', udp by default) -> ('udp', 1194)."""
+    port, _, protocol = spec.partition("/")
+    protocol = protocol or "udp"
+    if protocol not in PROTOCOLS or not port.isdigit() or not 0 < int(port) < 65536:
+        raise ValueError(f"Invalid firewall rule '{spec}' (expected PORT[/udp|/tcp]).")
+    return protocol, int(port)
+
+def format_rule(rule):
+    protocol, port = rule
+    return f"{port}/{protocol}"
+
+def _read(command):
+    """Read-only query; returns stdout, or None if the command failed (table or chain missing)."""
+    proc = run_trace.run(command, check=False, capture=True)
+    return proc.stdout if proc.returncode == 0 else None
+
+def _load_file(path, text, run, loader):
+    """Write the ruleset next to the rules file (kept for inspection) and load it in one command."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    atomic_write(path, text, 0o600)
+    run(f"{loader} {path}")
+
+class IptablesBackend:
+    """One iptables-restore --noflush per address family, replacing only the JumpSecure chain.
+
+    Declaring the chain in the restore file flushes and refills it inside the same commit, so
+    each load is atomic and leaves the rest of the ruleset (ufw included) untouched.
+    """
+
+    name = "iptables"
+    persistent = True
+
+    def __init__(self):
+        self.families = [family for family in ("iptables", "ip6tables") if depprobe.which(f"{family}-restore")]
+
+    def state(self):
+        """(rules present in every family, {family: jump from INPUT present})."""
+        rules, jumps = None, {}
+        pattern = re.compile(rf"^-A {IPTABLES_CHAIN} -p (udp|tcp) (?:-m \w+ )?--dport (\d+) -j ACCEPT$")
+        for family in self.families:
+            saved = (_read(f"{family}-save -t filter") or "").splitlines()
+            found = [(m.group(1), int(m.group(2))) for m in map(pattern.match, saved) if m]
+            rules = found if rules is None else [rule for rule in rules if rule in found]
+            jumps[family] = f"-A INPUT -j {IPTABLES_CHAIN}" in saved
+        return rules or [], jumps
+
+    def render(self, rules, context):
+        scripts = {}
+        for family in self.families:
+            lines = ["*filter", f":{IPTABLES_CHAIN} - [0:0]"]
+            lines += [f"-A {IPTABLES_CHAIN} -p {protocol} -m {protocol} --dport {port} -j ACCEPT" for protocol, port in rules]
+            if not context.get(family):
+                lines.append(f"-I INPUT 1 -j {IPTABLES_CHAIN}")
+            lines.append("COMMIT")
+            scripts[family] = "\n".join(lines) + "\n"
+        return scripts
+
+    def load(self, scripts, run):
+        for family, text in scripts.items():
+            _load_file(os.path.join(STATE_DIR, f"firewall.{family}"), text, run, f"{family}-restore --noflush")
+
+class NftBackend:
+    """One nft -f transaction that refills the JumpSecure chain in the host's filter table."""
+
+    name = "nftables"
+    persistent = True
+
+    def state(self):
+        """(rules in the JumpSecure chain, (input chain exists, jump present))."""
+        chain = _read(f"nft list chain {NFT_TABLE} {NFT_CHAIN}") or ""
+        rules = [(m.group(1), int(m.group(2))) for m in re.finditer(r"\b(udp|tcp) dport (\d+) accept", chain)]
+        base = _read(f"nft list chain {NFT_TABLE} input")
+        return rules, (base is not None, base is not None and f"jump {NFT_CHAIN}" in base)
+
+    def render(self, rules, context):
+        has_input, has_jump = context
+        lines = [f"add table {NFT_TABLE}"]
+        if not has_input:
+            # Only create the base chain; re-adding an existing one could reset its policy
+            lines.append(f"add chain {NFT_TABLE} input {{ type filter hook input priority 0; policy accept; }}")
+        lines += [f"add chain {NFT_TABLE} {NFT_CHAIN}", f"flush chain {NFT_TABLE} {NFT_CHAIN}"]
+        lines += [f"add rule {NFT_TABLE} {NFT_CHAIN} {protocol} dport {port} accept" for protocol, port in rules]
+        if not has_jump:
+            lines.append(f"insert rule {NFT_TABLE} input jump {NFT_CHAIN}")
+        return {"nft": "\n".join(lines) + "\n"}
+
+    def load(self, scripts, run):
+        _load_file(os.path.join(STATE_DIR, "firewall.nft"), scripts["nft"], run, "nft -f")
+
+class DryRunBackend:
+    """Stand-in that records what would be loaded instead of touching the firewall.
+
+    Wrapping a real backend reads the live state and renders its ruleset; on its own it keeps
+    the rules in memory, so transactions can be exercised on any machine.
+    """
+
+    persistent = False
+
+    def __init__(self, backend=None, existing=()):
+        self.backend = backend
+        self.name = f"dry-run ({backend.name})" if backend else "dry-run"
+        self.rules = list(existing)
+        self.loads = []
+
+    def state(self):
+        return self.backend.state() if self.backend else (list(self.rules), None)
+
+    def render(self, rules, context):
+        if self.backend:
+            return self.backend.render(rules, context)
+        return {"rules": "".join(f"allow {format_rule(rule)}\n" for rule in rules)}
+
+    def load(self, scripts, run):
+        self.loads.append(scripts)
+        if not self.backend:
+            self.rules = [parse_rule(line.split()[1]) for line in scripts["rules"].splitlines()]
+
+def detect():
+    """The backend for this host, or None if it has neither nft nor iptables-restore.
+
+    A native nftables firewall (an 'inet filter' table) gets the nft backend; otherwise
+    iptables-restore is preferred, since ufw and most distributions manage rules through it.
+    """
+    has_nft, has_iptables = depprobe.which("nft"), depprobe.which("iptables-restore")
+    if has_nft and (not has_iptables or _read(f"nft list table {NFT_TABLE}") is not None):
+        return NftBackend()
+    if has_iptables:
+        return IptablesBackend()
+    if has_nft:
+        return NftBackend()
+    return None
+
+def load_saved(path=RULES_FILE):
+    try:
+        with open(path) as f:
+            return [tuple(rule) for rule in json.load(f)["rules"]]
+    except (OSError, ValueError, KeyError):
+        return []
+
+def _save(rules, path=RULES_FILE):
+    saved = load_saved(path)
+    rules = list(dict.fromkeys(saved + rules))
+    if rules == saved:
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    atomic_write(path, json.dumps({"rules": [list(rule) for rule in rules]}, indent=1), 0o600)
+
+def _persist(rules, run):
+    _save(rules)
+    unit = host_state.File(UNIT_PATH, UNIT_TEMPLATE, 0o644)
+    host_state.apply_steps([unit, host_state.Service(UNIT, watches=[unit])], run)
+
+class Transaction:
+    """Collects firewall rules and applies the missing ones in a single atomic load.
+
+    Rules already present are skipped; if none are missing nothing is loaded at all. There is
+    no per-rule command and no reload, so established connections are not disturbed.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend if backend is not None else detect()
+        self.rules = []
+
+    def allow(self, port, protocol="udp"):
+        rule = parse_rule(f"{port}/{protocol}")
+        if rule not in self.rules:
+            self.rules.append(rule)
+        return self
+
+    def commit(self, run=run_trace.run, persist=True):
+        """Load the rules that are not present yet; return them (empty if all were present)."""
+        if self.backend is None:
+            raise RuntimeError("Neither nft nor iptables-restore is installed; open the ports manually.")
+        with run_trace.step(f"firewall {self.backend.name}"):
+            current, context = self.backend.state()
+            added = [rule for rule in self.rules if rule not in current]
+            if added:
+                self.backend.load(self.backend.render(current + added, context), run)
+            if persist and self.backend.persistent:
+                _persist(self.rules, run)
+        return added
+
+def open_ports(ports, run=run_trace.run, backend=None):
+    """Open [(port, protocol)] in one transaction; return (backend name, added rules), or None without a backend."""
+    transaction = Transaction(backend)
+    if transaction.backend is None:
+        return None
+    for port, protocol in ports:
+        transaction.allow(port, protocol)
+    return transaction.backend.name, transaction.commit(run)
+
+def describe(result):
+    """One-line outcome of open_ports() for the setup scripts."""
+    if result is None:
+        return "Neither nft nor iptables-restore is installed. Please open the ports manually."
+    name, added = result
+    if not added:
+        return f"Firewall ({name}): ports already open, nothing loaded."
+    return f"Firewall ({name}): opened {', '.join(map(format_rule, added))} in one transaction."
+
+def main():
+    parser = argparse.ArgumentParser(description="Open JumpSecure ports in one atomic firewall transaction.")
+    parser.add_argument("command", choices=["allow", "status", "restore"])
+    parser.add_argument("rules", nargs="*", help="PORT[/udp|/tcp] (allow command)")
+    parser.add_argument("--dry-run", action="store_true", help="Print the ruleset that would be loaded")
+    args = parser.parse_args()
+
+    backend = detect()
+    if args.dry_run:
+        backend = DryRunBackend(backend)
+    elif backend is None:
+        print(describe(None))
+        sys.exit(1)
+    if args.command == "status":
+        current, _ = backend.state()
+        print(f"Backend: {backend.name}")
+        print(f"Open: {' '.join(map(format_rule, current)) or 'none'}")
+        print(f"Saved: {' '.join(map(format_rule, load_saved())) or 'none'}")
+        return
+    try:
+        rules = load_saved() if args.command == "restore" else [parse_rule(spec) for spec in args.rules]
+    except ValueError as e:
+        parser.error(str(e))
+    transaction = Transaction(backend)
+    for protocol, port in rules:
+        transaction.allow(port, protocol)
+    added = transaction.commit(persist=args.command == "allow")
+    if args.dry_run:
+        for scripts in backend.loads:
+            for name, text in scripts.items():
+                print(f"# {name}\n{text}", end="")
+    print(describe((backend.name, added)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+import os
+import pwd
+import subprocess
+import run_trace
+from profile_store import atomic_write
+
+# Drop-in that persists the kernel settings the setups need, instead of appending to /etc/sysctl.conf
+SYSCTL_CONF = "/etc/sysctl.d/99-jumpsecure.conf"
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read()
+    except OSError:
+        return None
+
+def _ids(owner):
+    entry = pwd.getpwnam(owner)
+    return entry.pw_uid, entry.pw_gid
+
+def _attributes_differ(path, mode, owner):
+    st = os.stat(path)
+    if st.st_mode & 0o7777 != mode:
+        return f"mode {oct(st.st_mode & 0o7777)} -> {oct(mode)}"
+    if owner and (st.st_uid, st.st_gid) != _ids(owner):
+        return f"owner -> {owner}"
+    return None
+
+def _set_attributes(path, mode, owner):
+    os.chmod(path, mode)  # The umask may have narrowed the mode at creation
+    if owner:
+        os.chown(path, *_ids(owner))
+
+class Step:
+    """One piece of desired host state.
+
+    differs() inspects the host without changing it and returns why it is out of date, or None;
+    apply() brings it up to date. changed is set by apply_steps() for steps that watch others.
+    """
+
+    changed = False
+
+    def differs(self):
+        raise NotImplementedError
+
+    def apply(self, run):
+        raise NotImplementedError
+
+class File(Step):
+    """A file with exactly this content, mode and (optionally) owner."""
+
+    def __init__(self, path, content, mode=0o600, owner=None):
+        self.name = path
+        self.path = path
+        self.content = content
+        self.mode = mode
+        self.owner = owner
+
+    def differs(self):
+        current = _read(self.path)
+        if current is None:
+            return "missing"
+        if current != self.content:
+            return "content"
+        return _attributes_differ(self.path, self.mode, self.owner)
+
+    def apply(self, run):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        atomic_write(self.path, self.content, self.mode)
+        _set_attributes(self.path, self.mode, self.owner)
+
+class Sysctl(Step):
+    """Kernel settings, both live in /proc/sys and persisted in the JumpSecure drop-in."""
+
+    def __init__(self, settings, conf=SYSCTL_CONF):
+        self.name = ", ".join(f"{key}={value}" for key, value in settings.items())
+        self.settings = {key: str(value) for key, value in settings.items()}
+        self.conf = conf
+
+    def _persisted(self):
+        persisted = {}
+        for line in (_read(self.conf) or "").splitlines():
+            key, sep, value = line.partition("=")
+            if sep and not line.lstrip().startswith("#"):
+                persisted[key.strip()] = value.strip()
+        return persisted
+
+    def differs(self):
+        for key, value in self.settings.items():
+            live = _read(f"/proc/sys/{key.replace('.', '/')}")
+            if live is None or live.strip() != value:
+                return f"{key} is {live.strip() if live else 'unset'}"
+        persisted = self._persisted()
+        if any(persisted.get(key) != value for key, value in self.settings.items()):
+            return f"not persisted in {self.conf}"
+        return None
+
+    def apply(self, run):
+        for key, value in self.settings.items():
+            with open(f"/proc/sys/{key.replace('.', '/')}", "w") as f:
+                f.write(value)
+        persisted = self._persisted()
+        persisted.update(self.settings)
+        os.makedirs(os.path.dirname(self.conf), exist_ok=True)
+        atomic_write(self.conf, "".join(f"{key} = {value}\n" for key, value in persisted.items()), 0o644)
+
+class Service(Step):
+    """A systemd unit that is enabled and running, restarted when a step it watches changed."""
+
+    def __init__(self, unit, watches=()):
+        self.name = unit
+        self.unit = unit
+        self.watches = list(watches)
+        self._state = None
+
+    def state(self):
+        """(UnitFileState, ActiveState) from one systemctl call."""
+        try:
+            with run_trace.step(f"systemctl show {self.unit}"):
+                result = subprocess.run(["systemctl", "show", "-p", "UnitFileState", "-p", "ActiveState", self.unit],
+                                        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        except FileNotFoundError:
+            return "", ""
+        props = dict(line.partition("=")[::2] for line in result.stdout.splitlines())
+        return props.get("UnitFileState", ""), props.get("ActiveState", "")
+
+    def differs(self):
+        self._state = enabled, active = self.state()
+        watched = [step.name for step in self.watches if step.changed]
+        if watched and active == "active":
+            return f"restart, {', '.join(watched)} changed"
+        if enabled not in ("enabled", "static"):
+            return "not enabled"
+        if active != "active":
+            return f"{active or 'unknown'}, not running"
+        return None
+
+    def apply(self, run):
+        enabled, active = self._state or self.state()
+        if any(step.changed and getattr(step, "path", "").startswith("/etc/systemd/") for step in self.watches):
+            run("systemctl daemon-reload")  # A watched unit file was written
+        if enabled not in ("enabled", "static"):
+            run(f"systemctl enable {self.unit}")
+        run(f"systemctl {'restart' if active == 'active' else 'start'} {self.unit}")
+
+def apply_steps(steps, run=run_trace.run, dry_run=False):
+    """Apply each step in order if the host differs from it; return [(step, reason)] for those that did.
+
+    run is the caller's command runner, so each script keeps its own error handling. An
+    empty result means the host was already in the desired state and nothing was touched.
+    """
+    changes = []
+    for step in steps:
+        reason = step.differs()
+        step.changed = reason is not None
+        if reason is None:
+            continue
+        changes.append((step, reason))
+        if not dry_run:
+            with run_trace.step(f"{type(step).__name__.lower()} {step.name}"):
+                step.apply(run)
+    return changes
+
+def format_changes(steps, changes):
+    """One summary line plus one line per changed step."""
+    if not changes:
+        return f"Host state: all {len(steps)} steps already applied, nothing changed."
+    lines = [f"Host state: applied {len(changes)} of {len(steps)} steps."]
+    lines += [f"  {type(step).__name__.lower()} {step.name}: {reason}" for step, reason in changes]
+    return "\n".join(lines)
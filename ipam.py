@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+import argparse
+import fcntl
+import ipaddress
+import os
+from profile_store import atomic_write
+
+# One bitmap, lease log and lock file per pool
+IPAM_DIR = "/etc/jumpsecure/ipam"
+
+# Fixed-size bitmap header holding the pool network, so bit offsets never move
+HEADER_SIZE = 64
+MAGIC = "JSIPAM1"
+
+# Largest pool (a /12 for IPv4): 128 KiB of bitmap
+MAX_ADDRESSES = 1 << 20
+
+# Compact the lease log once it holds this many lines more than there are live leases
+COMPACT_SLACK = 1024
+
+def _write_bytes(path, data):
+    """Binary counterpart of profile_store.atomic_write."""
+    tmp = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.{os.getpid()}.tmp")
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        os.write(fd, data)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    os.replace(tmp, path)
+
+def _check_name(name):
+    if not name or any(c.isspace() for c in name):
+        raise ValueError(f"Lease name '{name}' may not be empty or contain whitespace.")
+
+def _parse_record(line):
+    """(op, index, name) of one lease log line, or None if it is not a well-formed record."""
+    fields = line.split(" ", 2)
+    if len(fields) != 3 or fields[0] not in ("=", "+", "-") or not fields[2]:
+        return None
+    try:
+        return fields[0], int(fields[1]), fields[2]
+    except ValueError:
+        return None
+
+class Pool:
+    """Address allocator for one network: a bitmap of used addresses plus a log of named leases.
+
+    allocate, release and lookup are O(1): names map to bit indices in memory, each change is
+    one appended log line and a one-byte in-place bitmap write (both fsynced), and the search
+    for a free address starts at a hint that only moves back when an address is released.
+    The log is the commit point; if a crash leaves the bitmap behind it, opening the pool
+    rebuilds the bitmap from the log, and a torn last line (a write that never completed) is
+    truncated away.
+    """
+
+    def __init__(self, name, network, state_dir=IPAM_DIR):
+        self.name = name
+        self.network = ipaddress.ip_network(network)
+        if self.network.num_addresses > MAX_ADDRESSES:
+            raise ValueError(f"Pool network {network} is too large (at most {MAX_ADDRESSES} addresses).")
+        os.makedirs(state_dir, mode=0o700, exist_ok=True)
+        base = os.path.join(state_dir, name)
+        self.bitmap_path = f"{base}.bitmap"
+        self.leases_path = f"{base}.leases"
+        self._lock = open(f"{base}.lock", "w")
+        fcntl.flock(self._lock, fcntl.LOCK_EX)
+        try:
+            self._load()
+        except BaseException:
+            self._lock.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._lock.closed:
+            return
+        os.close(self._bitmap_fd)
+        os.close(self._log_fd)
+        self._lock.close()
+
+    def _header(self):
+        return f"{MAGIC} {self.network}\n".encode().ljust(HEADER_SIZE, b" ")
+
+    def _reserved(self):
+        """Indices no lease may take: the network and (IPv4 below /31) broadcast addresses."""
+        last = self.network.num_addresses - 1
+        if self.network.version == 4 and self.network.prefixlen < 31:
+            return [0, last]
+        return [0] if self.network.version == 6 else []
+
+    def _load(self):
+        self.leases = {}
+        lines = 0
+        try:
+            with open(self.leases_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = f"= 0 {self.network}\n".encode()
+            atomic_write(self.leases_path, data.decode())
+        complete = data.rfind(b"\n") + 1
+        if complete < len(data):
+            # A crash mid-append leaves a torn last record that was never committed; drop it
+            os.truncate(self.leases_path, complete)
+        for line in data[:complete].decode(errors="replace").splitlines():
+            lines += 1
+            record = _parse_record(line)
+            if record is None:
+                continue
+            op, index, name = record
+            if op == "=":
+                if name != str(self.network):
+                    raise ValueError(f"Pool '{self.name}' covers {name}, not {self.network}.")
+            elif not 0 <= index < self.network.num_addresses:
+                continue
+            elif op == "+":
+                self.leases[name] = index
+            elif self.leases.get(name) == index:
+                del self.leases[name]
+        self._log_lines = lines
+        self._log_fd = os.open(self.leases_path, os.O_WRONLY | os.O_APPEND)
+
+        self.bits = bytearray((self.network.num_addresses + 7) // 8)
+        for index in self._reserved() + list(self.leases.values()):
+            self.bits[index >> 3] |= 1 << (index & 7)
+        try:
+            with open(self.bitmap_path, "rb") as f:
+                on_disk = f.read()
+        except FileNotFoundError:
+            on_disk = b""
+        if on_disk != self._header() + self.bits:
+            _write_bytes(self.bitmap_path, self._header() + self.bits)
+        self._bitmap_fd = os.open(self.bitmap_path, os.O_RDWR)
+        self._hint = 0
+        self._by_index = {index: name for name, index in self.leases.items()}
+
+    def _set(self, index, used):
+        byte = index >> 3
+        if used:
+            self.bits[byte] |= 1 << (index & 7)
+        else:
+            self.bits[byte] &= ~(1 << (index & 7)) & 0xFF
+        os.pwrite(self._bitmap_fd, bytes([self.bits[byte]]), HEADER_SIZE + byte)
+        os.fsync(self._bitmap_fd)
+
+    def _log(self, op, index, name):
+        os.write(self._log_fd, f"{op} {index} {name}\n".encode())
+        os.fsync(self._log_fd)
+        self._log_lines += 1
+
+    def _next_free(self):
+        """Lowest free index at or after the hint, skipping full bytes."""
+        byte = self._hint >> 3
+        while byte < len(self.bits):
+            if self.bits[byte] != 0xFF:
+                for index in range(max(byte << 3, self._hint), min((byte + 1) << 3, self.network.num_addresses)):
+                    if not self.bits[index >> 3] & (1 << (index & 7)):
+                        return index
+            byte += 1
+        return None
+
+    def _address(self, index):
+        return str(self.network.network_address + index)
+
+    def allocate(self, name):
+        """The address leased to name, leasing the lowest free one if it has none yet."""
+        if name in self.leases:
+            return self._address(self.leases[name])
+        index = self._next_free()
+        if index is None:
+            raise ValueError(f"Pool '{self.name}' ({self.network}) has no free address left.")
+        self._commit(name, index)
+        self._hint = index + 1
+        return self._address(index)
+
+    def allocate_many(self, names):
+        """allocate() for a batch of names, with one log write and one fsync per file for the whole batch."""
+        new = [name for name in dict.fromkeys(names) if name not in self.leases]
+        for name in new:
+            _check_name(name)
+        indices, touched = [], set()
+        for _ in new:
+            index = self._next_free()
+            if index is None:
+                for taken in indices:
+                    self.bits[taken >> 3] &= ~(1 << (taken & 7)) & 0xFF
+                self._hint = indices[0] if indices else self._hint
+                raise ValueError(f"Pool '{self.name}' ({self.network}) has room for {len(indices)} more, "
+                                 f"{len(new)} requested.")
+            self.bits[index >> 3] |= 1 << (index & 7)
+            touched.add(index >> 3)
+            indices.append(index)
+            self._hint = index + 1
+        if new:
+            os.write(self._log_fd, "".join(f"+ {index} {name}\n" for name, index in zip(new, indices)).encode())
+            os.fsync(self._log_fd)
+            self._log_lines += len(new)
+            for byte in sorted(touched):
+                os.pwrite(self._bitmap_fd, bytes([self.bits[byte]]), HEADER_SIZE + byte)
+            os.fsync(self._bitmap_fd)
+            for name, index in zip(new, indices):
+                self.leases[name] = index
+                self._by_index[index] = name
+        return [self._address(self.leases[name]) for name in names]
+
+    def reserve(self, name, address):
+        """Lease a specific address to name (existing configs, fixed server addresses)."""
+        index = int(ipaddress.ip_address(address)) - int(self.network.network_address)
+        if not 0 <= index < self.network.num_addresses or index in self._reserved():
+            raise ValueError(f"{address} is not a usable address in {self.network}.")
+        if self.leases.get(name) == index:
+            return address
+        if index in self._by_index:
+            raise ValueError(f"{address} is already leased to '{self._by_index[index]}'.")
+        if name in self.leases:
+            self.release(name)
+        self._commit(name, index)
+        return address
+
+    def _commit(self, name, index):
+        _check_name(name)
+        self._log("+", index, name)
+        self._set(index, True)
+        self.leases[name] = index
+        self._by_index[index] = name
+
+    def release(self, name):
+        """Free the address leased to name; return it, or None if name had no lease."""
+        index = self.leases.pop(name, None)
+        if index is None:
+            return None
+        del self._by_index[index]
+        self._log("-", index, name)
+        self._set(index, False)
+        self._hint = min(self._hint, index)
+        if self._log_lines > 2 * len(self.leases) + COMPACT_SLACK:
+            self._compact()
+        return self._address(index)
+
+    def _compact(self):
+        """Rewrite the log with only the live leases."""
+        lines = [f"= 0 {self.network}\n"] + [f"+ {index} {name}\n" for name, index in self.leases.items()]
+        atomic_write(self.leases_path, "".join(lines))
+        os.close(self._log_fd)
+        self._log_fd = os.open(self.leases_path, os.O_WRONLY | os.O_APPEND)
+        self._log_lines = len(lines)
+
+    def lookup(self, name):
+        index = self.leases.get(name)
+        return None if index is None else self._address(index)
+
+    def owner(self, address):
+        """Name leasing address, or None."""
+        return self._by_index.get(int(ipaddress.ip_address(address)) - int(self.network.network_address))
+
+    def addresses(self):
+        """{name: address} of every lease."""
+        return {name: self._address(index) for name, index in self.leases.items()}
+
+def existing_network(name, state_dir=IPAM_DIR):
+    """Network of pool name as recorded in its lease log, or None if the pool does not exist."""
+    try:
+        with open(os.path.join(state_dir, f"{name}.leases")) as f:
+            return ipaddress.ip_network(f.readline().split(" ", 2)[2].strip())
+    except (OSError, IndexError, ValueError):
+        return None
+
+def fit_network(name, network, state_dir=IPAM_DIR):
+    """The network pool name should use when network is wanted; grows the pool if it is smaller.
+
+    Pools never shrink: an existing pool at least as large as network is kept. A smaller one
+    starting at the same address is widened to network in place, so every lease keeps its
+    address. Any other change would move leased addresses and raises ValueError.
+    """
+    wanted = ipaddress.ip_network(network)
+    current = existing_network(name, state_dir)
+    if current is None or current == wanted:
+        return wanted
+    if current.network_address != wanted.network_address or current.version != wanted.version:
+        raise ValueError(f"Pool '{name}' covers {current}, which cannot become {wanted} without moving leased "
+                         f"addresses; keep {current}, or release every lease and remove the pool files in {state_dir}.")
+    if current.num_addresses >= wanted.num_addresses:
+        return current
+    if wanted.num_addresses > MAX_ADDRESSES:
+        raise ValueError(f"Pool network {wanted} is too large (at most {MAX_ADDRESSES} addresses).")
+    base = os.path.join(state_dir, name)
+    with open(f"{base}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        with open(f"{base}.leases") as f:
+            f.readline()
+            leases = f.read()
+        # Indices are offsets from the unchanged network address; the next open rebuilds the bitmap
+        atomic_write(f"{base}.leases", f"= 0 {wanted}\n" + leases)
+        if os.path.exists(f"{base}.bitmap"):
+            os.remove(f"{base}.bitmap")
+    return wanted
+
+def openvpn_ranges(network):
+    """Split an OpenVPN network: (static half for jump boxes, (first, last) of the dynamic pool).
+
+    Jump boxes get fixed addresses from the lower half through client-config-dir entries;
+    other clients are handed addresses from the upper half by OpenVPN's own pool.
+    """
+    net = ipaddress.ip_network(network)
+    static, dynamic = net.subnets(prefixlen_diff=1)
+    return static, (dynamic[0], dynamic[-2])
+
+def openvpn_network(network, name="openvpn", state_dir=IPAM_DIR):
+    """The OpenVPN network to configure when network is wanted, given the pool of its static half.
+
+    fit_network() on the static half: an existing larger network is kept, a smaller one grows.
+    """
+    static, _ = openvpn_ranges(network)
+    return str(fit_network(name, static, state_dir).supernet(prefixlen_diff=1))
+
+def openvpn_server_directives(network, ccd_dir):
+    """Addressing lines for an OpenVPN server config (subnet topology, static and dynamic ranges)."""
+    net = ipaddress.ip_network(network)
+    _, (first, last) = openvpn_ranges(net)
+    return [
+        "topology subnet",
+        f"server {net.network_address} {net.netmask} nopool",
+        f"ifconfig-pool {first} {last} {net.netmask}",
+        f"client-config-dir {ccd_dir}",
+        "ifconfig-pool-persist ipp.txt",
+    ]
+
+def ccd_entry(address, network):
+    """client-config-dir file content pinning a client to address."""
+    return f"ifconfig-push {address} {ipaddress.ip_network(network).netmask}\n"
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and edit JumpSecure address pools.")
+    parser.add_argument("command", choices=["list", "allocate", "release"])
+    parser.add_argument("pool", help="Pool name (wg0, openvpn, ...)")
+    parser.add_argument("names", nargs="*", help="Lease names (allocate and release commands)")
+    parser.add_argument("--network", help="Pool network (required when the pool does not exist yet)")
+    parser.add_argument("--state-dir", default=IPAM_DIR)
+    args = parser.parse_args()
+
+    network = args.network or existing_network(args.pool, args.state_dir)
+    if network is None:
+        parser.error(f"Pool '{args.pool}' does not exist; pass --network to create it.")
+    try:
+        network = fit_network(args.pool, network, args.state_dir)
+        with Pool(args.pool, network, args.state_dir) as pool:
+            if args.command == "list":
+                used = sum(bin(byte).count("1") for byte in pool.bits)
+                print(f"Pool {args.pool}: {pool.network}, {len(pool.leases)} leases, "
+                      f"{pool.network.num_addresses - used} free")
+                for name, address in sorted(pool.addresses().items(), key=lambda item: ipaddress.ip_address(item[1])):
+                    print(f"  {address:<16} {name}")
+            elif args.command == "allocate":
+                for name in args.names:
+                    print(f"{name} {pool.allocate(name)}")
+            else:
+                for name in args.names:
+                    print(f"{name} {pool.release(name) or 'had no lease'}")
+    except ValueError as e:
+        parser.error(str(e))
+
+if __name__ == "__main__":
+    main()
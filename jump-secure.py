@@ -1,15 +1,19 @@
 import click
-import os
+import depprobe
+import firewall
+import run_trace
+import ssh_profiles
 import subprocess
-import yaml
-from colorama import Fore, Style, init
+import tunnel_supervisor
+from colors import Fore, Style
+from profile_store import ProfileStore
 
-# Initialize colorama for colored output
-init()
-
-# Configuration file
+# Legacy configuration file, migrated into the profile store on first use
 CONFIG_FILE = "config.yaml"
 
+# Directory holding one file per named tunnel profile
+PROFILE_DIR = "profiles"
+
 # Dependency requirements for each method
 DEPENDENCIES = {
     "tor-ssh": ["tor", "autossh", "ssh", "curl"],
@@ -22,38 +26,44 @@ DEPENDENCIES = {
 def run_command(command):
     """Execute a shell command and handle errors."""
     try:
-        subprocess.run(command, shell=True, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        run_trace.run(command, capture=True)
     except subprocess.CalledProcessError as e:
         click.echo(f"{Fore.RED}Error: {e}{Style.RESET_ALL}")
         raise
 
 def check_dependencies(method):
     """Check if required dependencies are installed."""
-    for dep in DEPENDENCIES.get(method, []):
-        if not subprocess.run(f"which {dep}", shell=True, stdout=subprocess.PIPE).stdout:
-            click.echo(f"{Fore.YELLOW}Warning: '{dep}' is not installed. Install it with: sudo apt install {dep}{Style.RESET_ALL}")
-            return False
-    return True
+    missing = depprobe.missing(DEPENDENCIES, method)
+    for dep in missing:
+        click.echo(f"{Fore.YELLOW}Warning: '{dep}' is not installed. Install it with: sudo apt install {dep}{Style.RESET_ALL}")
+    return not missing
 
 def open_firewall_port(port, protocol="udp"):
-    """Open a firewall port using ufw."""
-    if not subprocess.run("which ufw", shell=True, stdout=subprocess.PIPE).stdout:
-        click.echo(f"{Fore.YELLOW}Warning: 'ufw' is not installed. Install it or manually open port {port}/{protocol}.{Style.RESET_ALL}")
+    """Open a firewall port in one atomic transaction (nothing is loaded if it is already open)."""
+    result = firewall.open_ports([(port, protocol)], run_command)
+    if result is None:
+        click.echo(f"{Fore.YELLOW}Warning: neither nft nor iptables-restore is installed. Manually open port {port}/{protocol}.{Style.RESET_ALL}")
         return
-    run_command(f"ufw allow {port}/{protocol}")
-    click.echo(f"{Fore.GREEN}Opened port {port}/{protocol} on firewall.{Style.RESET_ALL}")
+    click.echo(f"{Fore.GREEN}{firewall.describe(result)}{Style.RESET_ALL}")
 
-def load_config():
-    """Load the configuration file."""
-    if os.path.exists(CONFIG_FILE):
-        with open(CONFIG_FILE, "r") as f:
-            return yaml.safe_load(f) or {}
-    return {}
+def profile_store():
+    """Open the profile store, migrating a legacy config.yaml on first use."""
+    return ProfileStore(PROFILE_DIR, CONFIG_FILE)
 
-def save_config(config):
-    """Save the configuration file."""
-    with open(CONFIG_FILE, "w") as f:
-        yaml.safe_dump(config, f)
+def load_profile(profile, method):
+    """Load a saved profile, or None (with an error) if it is missing or belongs to another method."""
+    try:
+        config = profile_store().get(profile)
+    except ValueError as e:
+        click.echo(f"{Fore.RED}{e}{Style.RESET_ALL}")
+        return None
+    if config is None:
+        click.echo(f"{Fore.RED}Please run 'setup --method {method} --profile {profile}' first.{Style.RESET_ALL}")
+        return None
+    if config["method"] != method:
+        click.echo(f"{Fore.RED}Profile '{profile}' is a {config['method']} profile, not {method}.{Style.RESET_ALL}")
+        return None
+    return config
 
 # CLI Group with Menu System
 @click.group(invoke_without_command=True)
@@ -64,78 +74,140 @@ def cli(ctx):
         click.echo(f"{Fore.CYAN}Welcome to the Secure Connection Multitool!{Style.RESET_ALL}")
         method = click.prompt("Choose connection method", type=click.Choice(["tor-ssh", "reverse-ssh", "openvpn", "wireguard"]))
         action = click.prompt("Choose action", type=click.Choice(["setup", "start", "stop", "test"]))
-        ctx.invoke(globals()[action], method=method)
+        ctx.invoke(globals()[action], method=method, profile=None)
 
 # Setup Command
 @cli.command()
 @click.option("--method", type=click.Choice(["tor-ssh", "reverse-ssh", "openvpn", "wireguard"]), prompt="Choose connection method")
-def setup(method):
+@click.option("--profile", help="Profile name (defaults to the method name)")
+def setup(method, profile):
     """Set up a connection method."""
     if not check_dependencies(method):
         click.echo(f"{Fore.RED}Setup aborted due to missing dependencies.{Style.RESET_ALL}")
         return
 
-    config = load_config()
-    if method not in config:
-        config[method] = {}
+    profile = profile or method
+    store = profile_store()
+    try:
+        config = store.get(profile) or {}
+    except ValueError as e:
+        click.echo(f"{Fore.RED}{e}{Style.RESET_ALL}")
+        return
+    if config.get("method", method) != method:
+        click.echo(f"{Fore.RED}Profile '{profile}' already exists as a {config['method']} profile.{Style.RESET_ALL}")
+        return
 
     if method == "tor-ssh":
-        config[method]["server_ip"] = click.prompt("Enter server IP")
-        config[method]["port"] = click.prompt("Enter SSH port", type=int, default=22)
-        save_config(config)
+        config["server_ip"] = click.prompt("Enter server IP")
+        config["port"] = click.prompt("Enter SSH port", type=int, default=22)
+        config["transport"] = click.prompt("SSH transport profile", type=click.Choice(ssh_profiles.names()),
+                                           default=config.get("transport", ssh_profiles.DEFAULT_PROFILE))
+        store.put(profile, method, config)
         click.echo(f"{Fore.GREEN}Tor SSH setup complete. Configure applications to use SOCKS proxy at localhost:9050.{Style.RESET_ALL}")
 
     elif method == "reverse-ssh":
-        config[method]["server_ip"] = click.prompt("Enter server IP")
-        config[method]["port"] = click.prompt("Enter reverse SSH port", type=int)
-        script = f"autossh -M 0 -R {config[method]['port']}:localhost:22 user@{config[method]['server_ip']}"
+        config["server_ip"] = click.prompt("Enter server IP")
+        config["port"] = click.prompt("Enter reverse SSH port", type=int)
+        config["transport"] = click.prompt("SSH transport profile", type=click.Choice(ssh_profiles.names()),
+                                           default=config.get("transport", ssh_profiles.DEFAULT_PROFILE))
+        options = ssh_profiles.option_string(config["transport"], tunnel=True)
+        script = f"autossh -M 0 -N {options} -R {config['port']}:localhost:22 user@{config['server_ip']}"
         with open("reverse_ssh.sh", "w") as f:
             f.write(script)
-        save_config(config)
+        store.put(profile, method, config)
         click.echo(f"{Fore.GREEN}Reverse SSH setup complete. Transfer 'reverse_ssh.sh' to the jump box with: scp reverse_ssh.sh user@<jump-box-ip>:~/ && ssh user@<jump-box-ip> 'bash reverse_ssh.sh'{Style.RESET_ALL}")
 
     elif method == "openvpn":
-        config[method]["port"] = click.prompt("Enter OpenVPN port", type=int, default=1194)
-        open_firewall_port(config[method]["port"])
-        save_config(config)
+        config["port"] = click.prompt("Enter OpenVPN port", type=int, default=1194)
+        open_firewall_port(config["port"])
+        store.put(profile, method, config)
         click.echo(f"{Fore.GREEN}OpenVPN setup complete. Configure OpenVPN server and transfer client config to the jump box.{Style.RESET_ALL}")
 
     elif method == "wireguard":
-        config[method]["port"] = click.prompt("Enter WireGuard port", type=int, default=51820)
-        open_firewall_port(config[method]["port"])
-        save_config(config)
+        config["port"] = click.prompt("Enter WireGuard port", type=int, default=51820)
+        open_firewall_port(config["port"])
+        store.put(profile, method, config)
         click.echo(f"{Fore.GREEN}WireGuard setup complete. Configure WireGuard keys and transfer peer config to the jump box.{Style.RESET_ALL}")
 
 # Start Command
 @cli.command()
 @click.option("--method", type=click.Choice(["tor-ssh", "reverse-ssh", "openvpn", "wireguard"]), prompt="Choose connection method")
-def start(method):
+@click.option("--profile", help="Profile name (defaults to the method name)")
+def start(method, profile):
     """Start a connection."""
     if not check_dependencies(method):
         return
-    config = load_config()
-    if method not in config:
-        click.echo(f"{Fore.RED}Please run 'setup {method}' first.{Style.RESET_ALL}")
+    config = load_profile(profile or method, method)
+    if config is None:
         return
 
     if method == "tor-ssh":
-        run_command(f"ssh -D 9050 -p {config[method]['port']} user@{config[method]['server_ip']} -N &")
-        click.echo(f"{Fore.GREEN}Tor SSH tunnel started. Use SOCKS proxy at localhost:9050.{Style.RESET_ALL}")
+        transport = config.get("transport", ssh_profiles.DEFAULT_PROFILE)
+        argv = ["ssh", "-N", *ssh_profiles.options(transport, tunnel=True),
+                "-D", "9050", "-p", str(config["port"]), f"user@{config['server_ip']}"]
+        response = tunnel_supervisor.start_tunnel(f"jump-secure:{profile or method}", argv)
+        if not response["ok"]:
+            click.echo(f"{Fore.RED}Error: {response['error']}{Style.RESET_ALL}")
+        elif response.get("already"):
+            click.echo(f"{Fore.YELLOW}Tor SSH tunnel is already running.{Style.RESET_ALL}")
+        else:
+            click.echo(f"{Fore.GREEN}Tor SSH tunnel started. Use SOCKS proxy at localhost:9050.{Style.RESET_ALL}")
 
     # Add start logic for other methods as needed
 
-# Stop and Test Commands (placeholders)
+# Stop Command
 @cli.command()
 @click.option("--method", type=click.Choice(["tor-ssh", "reverse-ssh", "openvpn", "wireguard"]), prompt="Choose connection method")
-def stop(method):
+@click.option("--profile", help="Profile name (defaults to the method name)")
+def stop(method, profile):
     """Stop a connection."""
-    click.echo(f"Stopping {method} (not fully implemented yet).")
+    response = tunnel_supervisor.stop_tunnel(f"jump-secure:{profile or method}")
+    if response["ok"]:
+        click.echo(f"{Fore.GREEN}Stopped {profile or method}.{Style.RESET_ALL}")
+    else:
+        click.echo(f"{Fore.YELLOW}{response['error']}{Style.RESET_ALL}")
 
+# Test Command
 @cli.command()
 @click.option("--method", type=click.Choice(["tor-ssh", "reverse-ssh", "openvpn", "wireguard"]), prompt="Choose connection method")
-def test(method):
+@click.option("--profile", help="Profile name (defaults to the method name)")
+@click.option("--target", default="icanhazip.com:80", help="host:port to reach through the tunnel")
+@click.option("--rounds", default=3, help="Probes to send")
+@click.option("--timeout", default=10.0, help="Seconds allowed per probe phase")
+def test(method, profile, target="icanhazip.com:80", rounds=3, timeout=10.0):
     """Test a connection."""
-    click.echo(f"Testing {method} (not fully implemented yet).")
+    if method != "tor-ssh":
+        click.echo(f"Testing {profile or method} (not fully implemented yet).")
+        return
+    import socks_probe
+    results = socks_probe.run([(profile or method, "127.0.0.1", 9050)], target=socks_probe.parse_target(target),
+                              rounds=rounds, timeout=timeout)
+    stats = results[profile or method]
+    if stats.ok:
+        click.echo(f"{Fore.GREEN}Exit IP via Tor: {stats.body}{Style.RESET_ALL}")
+    else:
+        click.echo(f"{Fore.RED}Probe failed ({stats.last_error}). Ensure the tunnel is running.{Style.RESET_ALL}")
+    click.echo(socks_probe.format_report(results))
+
+# Status Command
+@cli.command()
+def status():
+    """Show supervised tunnels."""
+    tunnels = [t for t in tunnel_supervisor.tunnel_status()["tunnels"] if t["name"].startswith("jump-secure:")]
+    click.echo(tunnel_supervisor.format_status(tunnels))
+
+# Profile listing
+@cli.command()
+@click.option("--method", type=click.Choice(["tor-ssh", "reverse-ssh", "openvpn", "wireguard"]), help="Only this method")
+@click.option("--host", help="Only profiles for this server IP")
+@click.option("--port", type=int, help="Only profiles using this port")
+def profiles(method, host, port):
+    """List saved tunnel profiles."""
+    store = profile_store()
+    index = store.index()
+    for name in store.find(method, host, port):
+        entry = index[name]
+        click.echo(f"{name:<24} {entry['method']:<12} {entry['host'] or '-':<20} {entry['port'] or '-'}")
 
 if __name__ == "__main__":
     cli()
\ No newline at end of file
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+import argparse
+import base64
+import hashlib
+import os
+import pwd
+import sys
+import bundle_writer
+import host_state
+import run_trace
+from profile_store import atomic_write
+
+# One file per key, named by fingerprint: /etc/jumpsecure/authorized_keys/<user>/<fingerprint>
+REGISTRY_DIR = "/etc/jumpsecure/authorized_keys"
+
+# sshd runs the helper as this user, so entries are world-readable (they hold public keys only)
+COMMAND_USER = "nobody"
+HELPER_PATH = "/usr/local/libexec/jumpsecure-authorized-keys"
+SSHD_DROPIN = "/etc/ssh/sshd_config.d/50-jumpsecure-keys.conf"
+
+# Standalone helper sshd runs on every public key authentication: -I -S keeps start-up to the
+# interpreter itself, and the lookup is a single open() whatever the fleet size
+HELPER_TEMPLATE = '''#!$python -IS
+import os
+import sys
+
+root = "$root"
+# Called as: helper %u %f
+if len(sys.argv) == 3 and "/" not in sys.argv[1] and not sys.argv[1].startswith("."):
+    name = sys.argv[2].partition(":")[2].replace("/", "_").replace("+", "-")
+    try:
+        with open(os.path.join(root, sys.argv[1], name)) as f:
+            sys.stdout.write(f.read())
+    except OSError:
+        pass
+'''
+
+SSHD_TEMPLATE = '''# Jump box keys are looked up by fingerprint in $root
+AuthorizedKeysCommand $helper %u %f
+AuthorizedKeysCommandUser $command_user
+'''
+
+def parse_key(line):
+    """(key type, base64 blob, comment) of an OpenSSH public key line."""
+    fields = line.split()
+    if len(fields) < 2:
+        raise ValueError("Not an OpenSSH public key.")
+    try:
+        base64.b64decode(fields[1], validate=True)
+    except ValueError:
+        raise ValueError("Not an OpenSSH public key (bad base64).")
+    return fields[0], fields[1], " ".join(fields[2:])
+
+def fingerprint(public_key):
+    """SHA256 fingerprint as sshd passes it to AuthorizedKeysCommand (%f), e.g. 'SHA256:abc...'."""
+    _, blob, _ = parse_key(public_key)
+    digest = hashlib.sha256(base64.b64decode(blob)).digest()
+    return "SHA256:" + base64.b64encode(digest).decode().rstrip("=")
+
+def _file_name(fp):
+    # Base64 may contain '/' and '+'; the helper applies the same mapping
+    return fp.partition(":")[2].replace("/", "_").replace("+", "-")
+
+def entry_line(public_key, port, name):
+    """authorized_keys line allowing only a reverse tunnel on port (ssh -N -R port:...)."""
+    key_type, blob, _ = parse_key(public_key)
+    if not name or any(c.isspace() for c in name):
+        raise ValueError(f"Jump box name '{name}' may not be empty or contain whitespace.")
+    return f'restrict,port-forwarding,permitlisten="{int(port)}" {key_type} {blob} {name}\n'
+
+def _user_dir(user, root):
+    if not user or "/" in user or user.startswith("."):
+        raise ValueError(f"Invalid user name '{user}'.")
+    return os.path.join(root, user)
+
+def add(user, public_key, port, name, root=REGISTRY_DIR):
+    """Register a jump box key restricted to its tunnel port; return (fingerprint, whether it changed)."""
+    fp = fingerprint(public_key)
+    directory = _user_dir(user, root)
+    path = os.path.join(directory, _file_name(fp))
+    line = entry_line(public_key, port, name)
+    try:
+        with open(path) as f:
+            if f.read() == line:
+                return fp, False
+    except FileNotFoundError:
+        pass
+    os.makedirs(directory, mode=0o755, exist_ok=True)
+    atomic_write(path, line, 0o644)
+    os.chmod(path, 0o644)  # The umask may have narrowed the mode at creation
+    return fp, True
+
+def lookup(user, fp, root=REGISTRY_DIR):
+    """The authorized_keys line for fingerprint fp, or None."""
+    try:
+        with open(os.path.join(_user_dir(user, root), _file_name(fp))) as f:
+            return f.read()
+    except (OSError, ValueError):
+        return None
+
+def entries(user, root=REGISTRY_DIR):
+    """{fingerprint: authorized_keys line} of every key registered for user."""
+    directory = _user_dir(user, root)
+    found = {}
+    for file_name in sorted(os.listdir(directory)) if os.path.isdir(directory) else []:
+        if not file_name.startswith("."):
+            with open(os.path.join(directory, file_name)) as f:
+                found["SHA256:" + file_name.replace("_", "/").replace("-", "+")] = f.read()
+    return found
+
+def remove(user, key, root=REGISTRY_DIR):
+    """Unregister keys by fingerprint or box name (the entry comment); return the removed fingerprints."""
+    removed = []
+    for fp, line in entries(user, root).items():
+        if key == fp or line.split()[-1] == key:
+            os.remove(os.path.join(_user_dir(user, root), _file_name(fp)))
+            removed.append(fp)
+    return removed
+
+def drop_from_authorized_keys(path, public_key):
+    """Remove a key from an authorized_keys file, so an old unrestricted line cannot bypass the registry."""
+    _, blob, _ = parse_key(public_key)
+    try:
+        with open(path) as f:
+            lines = f.readlines()
+    except FileNotFoundError:
+        return False
+    kept = [line for line in lines if blob not in line.split()]
+    if len(kept) == len(lines):
+        return False
+    st = os.stat(path)
+    atomic_write(path, "".join(kept), st.st_mode & 0o7777)
+    os.chown(path, st.st_uid, st.st_gid)
+    return True
+
+def install(run=run_trace.run, root=REGISTRY_DIR):
+    """Install the lookup helper and the sshd drop-in; validate and reload sshd only if they changed."""
+    helper = host_state.File(HELPER_PATH, bundle_writer.render(HELPER_TEMPLATE, python=sys.executable, root=root), 0o755)
+    dropin = host_state.File(SSHD_DROPIN, bundle_writer.render(SSHD_TEMPLATE, helper=HELPER_PATH, root=root,
+                                                               command_user=COMMAND_USER), 0o644)
+    changes = host_state.apply_steps([helper, dropin], run)
+    if changes:
+        run("sshd -t")  # Never reload into a config that would lock everyone out
+        run("systemctl reload sshd")  # ssh.service on Debian, aliased as sshd
+    return changes
+
+def main():
+    parser = argparse.ArgumentParser(description="Registry of jump box SSH keys served to sshd by fingerprint.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("add", help="Register a jump box key restricted to its tunnel port")
+    p.add_argument("user")
+    p.add_argument("public_key_file")
+    p.add_argument("--port", type=int, required=True, help="Reverse tunnel port the box may listen on")
+    p.add_argument("--name", required=True, help="Jump box name, stored as the key comment")
+    p = sub.add_parser("remove", help="Unregister keys by fingerprint or box name")
+    p.add_argument("user")
+    p.add_argument("keys", nargs="+")
+    p = sub.add_parser("list", help="List registered keys")
+    p.add_argument("user")
+    p = sub.add_parser("lookup", help="Print the entry for a fingerprint (what sshd sees)")
+    p.add_argument("user")
+    p.add_argument("fingerprint")
+    sub.add_parser("install", help="Install the AuthorizedKeysCommand helper and sshd drop-in")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "add":
+            pwd.getpwnam(args.user)
+            with open(args.public_key_file) as f:
+                fp, changed = add(args.user, f.read(), args.port, args.name)
+            print(f"{fp} {'registered' if changed else 'already registered'} for {args.name} (port {args.port}).")
+        elif args.command == "remove":
+            for key in args.keys:
+                print(f"{key}: {', '.join(remove(args.user, key)) or 'not registered'}")
+        elif args.command == "list":
+            for fp, line in entries(args.user).items():
+                print(f"{fp}  {line.split()[0]}  {line.split()[-1]}")
+        elif args.command == "lookup":
+            print(lookup(args.user, args.fingerprint) or "", end="")
+        else:
+            print(host_state.format_changes([HELPER_PATH, SSHD_DROPIN], install()))
+    except KeyError:
+        parser.error(f"No such user '{args.user}'.")
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+if __name__ == "__main__":
+    main()
@@ -1,58 +1,116 @@
 import os
-import subprocess
 import getpass
 import shutil
+import apt_plan
+import bundle_writer
+import dh_pool
+import firewall
+import host_state
+import ipam
+import ovpn_tuning
+import pki_ca
+import task_graph
 
-def run_command(command):
-    """Run a shell command and handle errors."""
+# easy-rsa style PKI directory of the built-in CA
+PKI_DIR = "/etc/easy-rsa/pki"
+
+# VPN network and the client-config-dir that pins the jump box to its leased address
+VPN_NETWORK = "10.8.0.0/24"
+CCD_DIR = "/etc/openvpn/server/ccd"
+
+def run_tasks(graph):
+    """Run a provisioning task graph, exiting with the failed task's captured output on error."""
     try:
-        subprocess.run(command, shell=True, check=True)
-    except subprocess.CalledProcessError as e:
-        print(f"Error running command: {e}")
+        graph.run()
+    except task_graph.TaskFailed as e:
+        print(e)
+        print("".join(e.task.output), end="")
+        print(graph.report())
         exit(1)
+    print(graph.report())
 
 def setup_easyrsa():
-    """Set up Easy-RSA for certificate generation."""
-    if not os.path.exists("/usr/share/easy-rsa"):
-        run_command("sudo apt update && sudo apt install -y easy-rsa")
-    if not os.path.exists("/etc/easy-rsa"):
-        run_command("sudo mkdir -p /etc/easy-rsa")
-        run_command("sudo ln -s /usr/share/easy-rsa/* /etc/easy-rsa/")
-    os.chdir("/etc/easy-rsa")
-    if not os.path.exists("pki"):
-        run_command("./easyrsa init-pki")
-        run_command("./easyrsa build-ca nopass")
-        run_command("./easyrsa gen-dh")
-        run_command("./easyrsa build-server-full server nopass")
-        run_command("./easyrsa build-client-full jumpbox nopass")
-
-def generate_jump_box_script(central_ip, vpn_port, ca_cert, client_cert, client_key):
-    """Generate the preconfigured jump box setup script."""
-    jump_box_script = f"""#!/usr/bin/env python3
+    """Set up the easy-rsa style PKI with the built-in CA and return it."""
+    ca = pki_ca.CertificateAuthority.init(PKI_DIR)
+    if not ca.exists("server"):
+        ca.issue("server", "server")
+    if not ca.exists("jumpbox"):
+        ca.issue("jumpbox", "client")
+    return ca
+
+def allocate_addresses(network=VPN_NETWORK):
+    """Lease the server and the jump box fixed addresses from the static half of the VPN network."""
+    static, _ = ipam.openvpn_ranges(network)
+    with ipam.Pool("openvpn", static) as pool:
+        return pool.allocate_many(["server", "jumpbox"])
+
+def take_dh(ecdh_only=False):
+    """Take DH parameters from the pool unless present or ECDH only; return the source or None."""
+    if ecdh_only or os.path.exists(f"{PKI_DIR}/dh.pem"):
+        return None
+    return dh_pool.take(f"{PKI_DIR}/dh.pem")
+
+def render_server_config(vpn_port, ecdh_only, data_channel, network=VPN_NETWORK):
+    """The OpenVPN server config."""
+    dh_line = "dh none" if ecdh_only else f"dh {PKI_DIR}/dh.pem"
+    addressing = "\n".join(ipam.openvpn_server_directives(network, CCD_DIR))
+    return f"""port {vpn_port}
+proto udp
+dev tun
+ca {PKI_DIR}/ca.crt
+cert {PKI_DIR}/issued/server.crt
+key {PKI_DIR}/private/server.key
+{dh_line}
+{addressing}
+keepalive 10 120
+{data_channel}
+persist-key
+persist-tun
+verb 3
+"""
+
+def apply_server(server_config, ecdh_only, jumpbox_ip, run, network=VPN_NETWORK):
+    """Write the config, the jump box's address and the certificates, enable IP forwarding and start OpenVPN.
+
+    Only what differs is touched; the server is restarted only when one of its files changed.
+    """
+    files = [host_state.File("/etc/openvpn/server/server.conf", server_config)]
+    pki_files = ["ca.crt", "issued/server.crt", "private/server.key"] + ([] if ecdh_only else ["dh.pem"])
+    for name in pki_files:
+        with open(f"{PKI_DIR}/{name}") as f:
+            files.append(host_state.File(f"/etc/openvpn/server/{os.path.basename(name)}", f.read()))
+    ccd = host_state.File(f"{CCD_DIR}/jumpbox", ipam.ccd_entry(jumpbox_ip, network), mode=0o644)
+    steps = files + [ccd, host_state.Sysctl({"net.ipv4.ip_forward": 1}),
+                     host_state.Service("openvpn-server@server", watches=files)]
+    return host_state.format_changes(steps, host_state.apply_steps(steps, run))
+
+# Preconfigured jump box setup script template
+JUMP_BOX_SCRIPT = '''#!/usr/bin/env python3
 import os
 import subprocess
-
+import time
+$install_packages
 def run_command(command):
-    \"\"\"Run a shell command and handle errors.\"\"\"
+    """Run a shell command and handle errors."""
     try:
         subprocess.run(command, shell=True, check=True)
     except subprocess.CalledProcessError as e:
-        print(f"Error running command: {{e}}")
+        print(f"Error running command: {e}")
         exit(1)
 
 def main():
     print("=== Jump Box OpenVPN Setup ===")
     
     # Preconfigured details
-    central_ip = "{central_ip}"
-    vpn_port = "{vpn_port}"
-    ca_cert = \"\"\"{ca_cert}\"\"\"
-    client_cert = \"\"\"{client_cert}\"\"\"
-    client_key = \"\"\"{client_key}\"\"\"
+    central_ip = "$central_ip"
+    vpn_port = "$vpn_port"
+    ca_cert = """$ca_cert"""
+    client_cert = """$client_cert"""
+    client_key = """$client_key"""
     
     # Install OpenVPN
     print("Installing OpenVPN if not present...")
-    run_command("sudo apt update && sudo apt install -y openvpn")
+    install_packages(["openvpn"])
     
     # Write certificates and keys
     os.makedirs("/etc/openvpn/client", exist_ok=True)
@@ -65,10 +123,10 @@ def main():
     run_command("sudo chmod 600 /etc/openvpn/client/*")
     
     # Write OpenVPN client config
-    client_config = f\"\"\"client
+    client_config = f"""client
 dev tun
 proto udp
-remote {{central_ip}} {{vpn_port}}
+remote {central_ip} {vpn_port}
 resolv-retry infinite
 nobind
 persist-key
@@ -77,9 +135,9 @@ ca /etc/openvpn/client/ca.crt
 cert /etc/openvpn/client/jumpbox.crt
 key /etc/openvpn/client/jumpbox.key
 remote-cert-tls server
-cipher AES-256-CBC
+$data_channel
 verb 3
-\"\"\"
+"""
     with open("/etc/openvpn/client/jumpbox.conf", "w") as f:
         f.write(client_config)
     
@@ -90,7 +148,7 @@ verb 3
     # Output instructions
     print("\\nSetup complete! To access the jump box:")
     print("1. Connect to the VPN from your client using the same server details.")
-    print("2. SSH to the jump box at 10.8.0.2 (e.g., ssh user@10.8.0.2)")
+    print("2. SSH to the jump box at $jumpbox_ip (e.g., ssh user@$jumpbox_ip)")
     print("Note: Ensure your client is also an OpenVPN client of the central server.")
 
 if __name__ == "__main__":
@@ -98,16 +156,24 @@ if __name__ == "__main__":
         print("This script must run as root (use sudo).")
         exit(1)
     main()
-"""
-    with open("setup_jump_box_openvpn.py", "w") as f:
-        f.write(jump_box_script.format(
-            central_ip=central_ip,
-            vpn_port=vpn_port,
-            ca_cert=ca_cert,
-            client_cert=client_cert,
-            client_key=client_key
-        ))
-    run_command("chmod +x setup_jump_box_openvpn.py")
+'''
+
+def generate_jump_box_script(central_ip, vpn_port, ca_cert, client_cert, client_key, jumpbox_ip, performance=True):
+    """Generate the preconfigured jump box setup script, unless it is already up to date."""
+    values = {
+        "central_ip": central_ip,
+        "jumpbox_ip": jumpbox_ip,
+        "vpn_port": vpn_port,
+        "ca_cert": ca_cert,
+        "client_cert": client_cert,
+        "client_key": client_key,
+        "data_channel": "\n".join(ovpn_tuning.client_directives(performance)),
+        "install_packages": apt_plan.INSTALL_SNIPPET,
+    }
+    artifact = bundle_writer.Artifact("setup_jump_box_openvpn.py", JUMP_BOX_SCRIPT, values, mode=0o755)
+    written, _ = bundle_writer.BundleWriter(".").write([artifact])
+    if not written:
+        print("setup_jump_box_openvpn.py is already up to date.")
 
 def main():
     print("=== Central Server OpenVPN Setup ===")
@@ -115,69 +181,60 @@ def main():
     # Prompt for user inputs
     central_ip = input("Enter the central server public IP address: ")
     vpn_port = input("Enter the OpenVPN port (e.g., 1194): ")
-    
-    # Install OpenVPN and Easy-RSA
-    print("Installing OpenVPN and Easy-RSA if not present...")
-    run_command("sudo apt update && sudo apt install -y openvpn easy-rsa")
-    
-    # Set up Easy-RSA and generate certificates
-    setup_easyrsa()
-    
-    # Read generated certificates and keys
-    with open("/etc/easy-rsa/pki/ca.crt", "r") as f:
-        ca_cert = f.read()
-    with open("/etc/easy-rsa/pki/issued/jumpbox.crt", "r") as f:
-        client_cert = f.read()
-    with open("/etc/easy-rsa/pki/private/jumpbox.key", "r") as f:
-        client_key = f.read()
-    
-    # Write OpenVPN server config
-    server_config = f"""port {vpn_port}
-proto udp
-dev tun
-ca /etc/easy-rsa/pki/ca.crt
-cert /etc/easy-rsa/pki/issued/server.crt
-key /etc/easy-rsa/pki/private/server.key
-dh /etc/easy-rsa/pki/dh.pem
-server 10.8.0.0 255.255.255.0
-ifconfig-pool-persist ipp.txt
-keepalive 10 120
-cipher AES-256-CBC
-persist-key
-persist-tun
-verb 3
-"""
-    config_path = "/etc/openvpn/server/server.conf"
-    os.makedirs("/etc/openvpn/server", exist_ok=True)
-    with open(config_path, "w") as f:
-        f.write(server_config)
-    run_command(f"chmod 600 {config_path}")
-    
-    # Copy certificates to OpenVPN directory
-    run_command("sudo cp /etc/easy-rsa/pki/ca.crt /etc/openvpn/server/")
-    run_command("sudo cp /etc/easy-rsa/pki/issued/server.crt /etc/openvpn/server/")
-    run_command("sudo cp /etc/easy-rsa/pki/private/server.key /etc/openvpn/server/")
-    run_command("sudo cp /etc/easy-rsa/pki/dh.pem /etc/openvpn/server/")
-    run_command("sudo chmod 600 /etc/openvpn/server/*")
-    
-    # Enable IP forwarding
-    run_command("sudo sysctl -w net.ipv4.ip_forward=1")
-    run_command("echo 'net.ipv4.ip_forward=1' | sudo tee -a /etc/sysctl.conf")
-    
-    # Start OpenVPN
-    run_command("sudo systemctl enable openvpn-server@server")
-    run_command("sudo systemctl start openvpn-server@server")
-    
-    # Open firewall (if ufw is used)
-    run_command(f"sudo ufw allow {vpn_port}/udp")
-    
+    ecdh_only = input("Use ECDH only and skip DH parameters? (y/N): ").lower() == "y"
+    performance = input("Performance mode: AEAD ciphers, larger socket buffers, fast-io, DCO (Y/n): ").lower() != "n"
+    offline_bundle = input("Build an offline .deb bundle for the jump box? (y/N): ").lower() == "y"
+    # The "openvpn" pool is shared with server-n-jumpbox.py, which may have grown it for a larger
+    # fleet; keep its network rather than fail partway through the setup
+    try:
+        network = ipam.openvpn_network(VPN_NETWORK)
+    except ValueError as e:
+        print(e)
+        exit(1)
+
+    def server(run):
+        data_channel = "\n".join(ovpn_tuning.server_directives(performance, graph.result("dco")))
+        return apply_server(render_server_config(vpn_port, ecdh_only, data_channel, network), ecdh_only,
+                            graph.result("addresses")[1], run, network)
+
+    def script(run):
+        ca = graph.result("pki")
+        client_cert, client_key = ca.read("jumpbox")
+        generate_jump_box_script(central_ip, vpn_port, ca.ca_cert_pem.decode(), client_cert, client_key,
+                                 graph.result("addresses")[1], performance)
+
+    # Independent steps (packages, certificates, DH, DCO, firewall, offline bundle) run concurrently
+    graph = task_graph.TaskGraph()
+    # Install OpenVPN, refreshing package lists only if they are stale
+    graph.add("packages", lambda run: apt_plan.ensure_packages(apt_plan.packages_for(["openvpn"]), run))
+    graph.add("pki", lambda run: setup_easyrsa())
+    graph.add("addresses", lambda run: allocate_addresses(network))
+    graph.add("dh", lambda run: take_dh(ecdh_only))
+    # Load the kernel data-channel offload module when the kernel ships it
+    graph.add("dco", lambda run: ovpn_tuning.enable_dco() if performance else None)
+    # Open the VPN port in one firewall transaction (skipped if already open)
+    graph.add("firewall", lambda run: firewall.open_ports([(vpn_port, "udp")], run))
+    graph.add("server", server, deps=["packages", "pki", "dh", "dco", "addresses"])
     # Generate the jump box script
-    generate_jump_box_script(central_ip, vpn_port, ca_cert, client_cert, client_key)
+    graph.add("script", script, deps=["pki", "addresses"])
+    if offline_bundle:
+        graph.add("offline-bundle", lambda run: apt_plan.build_bundle(apt_plan.packages_for(["openvpn"], "jumpbox"), "debs", run))
+    run_tasks(graph)
+
+    print(firewall.describe(graph.result("firewall")))
+    if graph.result("dh"):
+        print(f"DH parameters: {graph.result('dh')}.")
+    if performance:
+        print(f"Data channel offload: {graph.result('dco') or 'not available, using the userspace data channel'}.")
+    print(graph.result("server"))
+    if offline_bundle:
+        print(f"Bundled {len(graph.result('offline-bundle'))} packages in 'debs/'. Copy it next to the jump box script.")
     
     # Output instructions
     print("\nCentral Server setup complete!")
-    print("Server VPN IP: 10.8.0.1")
-    print("Jump Box VPN IP: 10.8.0.2")
+    server_ip, jumpbox_ip = graph.result("addresses")
+    print(f"Server VPN IP: {server_ip}")
+    print(f"Jump Box VPN IP: {jumpbox_ip}")
     print("\nNext steps:")
     print("1. Transfer 'setup_jump_box_openvpn.py' to the jump box (e.g., via SCP or USB).")
     print("2. Run it on the jump box with: sudo python3 setup_jump_box_openvpn.py")
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+import argparse
+import collections
+import datetime
+import fcntl
+import os
+import time
+import run_trace
+
+# Certificate lifetimes, matching the easy-rsa defaults
+CA_DAYS = 3650
+CERT_DAYS = 825
+
+# Per-process CA material, loaded once by _init_worker in each pool worker
+_worker_ca = None
+
+def _crypto():
+    """Import the 'cryptography' modules used for certificate issuance."""
+    try:
+        from cryptography import x509
+        from cryptography.hazmat.primitives import hashes, serialization
+        from cryptography.hazmat.primitives.asymmetric import ec, rsa
+        from cryptography.x509.oid import ExtendedKeyUsageOID, NameOID
+    except ImportError:
+        raise SystemExit("Error: Python package 'cryptography' is required for the built-in CA. "
+                         "Install it with 'pip3 install cryptography'.")
+    return x509, hashes, serialization, ec, rsa, ExtendedKeyUsageOID, NameOID
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+def _index_time(when):
+    """Format a timestamp the way OpenSSL writes it in index.txt (UTCTime)."""
+    return when.strftime("%y%m%d%H%M%SZ")
+
+def _generate_key(key_type):
+    _, _, _, ec, rsa, _, _ = _crypto()
+    if key_type == "ec":
+        return ec.generate_private_key(ec.SECP384R1())
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+def _key_pem(key):
+    _, _, serialization, _, _, _, _ = _crypto()
+    return key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                             serialization.NoEncryption())
+
+def _sign(ca_key, ca_cert, name, kind, key_type, days):
+    """Generate a key pair for name and sign a server or client certificate with the CA."""
+    x509, hashes, serialization, _, _, ExtendedKeyUsageOID, NameOID = _crypto()
+    key = _generate_key(key_type)
+    now = _now()
+    usage = ExtendedKeyUsageOID.SERVER_AUTH if kind == "server" else ExtendedKeyUsageOID.CLIENT_AUTH
+    builder = (
+        x509.CertificateBuilder()
+        .subject_name(x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, name)]))
+        .issuer_name(ca_cert.subject)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=5))
+        .not_valid_after(now + datetime.timedelta(days=days))
+        .add_extension(x509.BasicConstraints(ca=False, path_length=None), critical=False)
+        .add_extension(x509.SubjectKeyIdentifier.from_public_key(key.public_key()), critical=False)
+        .add_extension(x509.AuthorityKeyIdentifier.from_issuer_public_key(ca_key.public_key()), critical=False)
+        .add_extension(x509.ExtendedKeyUsage([usage]), critical=False)
+        .add_extension(x509.KeyUsage(
+            digital_signature=True, key_encipherment=(kind == "server"), content_commitment=False,
+            data_encipherment=False, key_agreement=False, key_cert_sign=False, crl_sign=False,
+            encipher_only=False, decipher_only=False), critical=False)
+    )
+    if kind == "server":
+        builder = builder.add_extension(x509.SubjectAlternativeName([x509.DNSName(name)]), critical=False)
+    cert = builder.sign(ca_key, hashes.SHA256())
+    return {
+        "name": name,
+        "serial": _serial_hex(cert.serial_number),
+        "expires": _index_time(cert.not_valid_after_utc),
+        "key_pem": _key_pem(key),
+        "cert_pem": cert.public_bytes(serialization.Encoding.PEM),
+    }
+
+def _serial_hex(serial):
+    """Serial as index.txt and 'openssl ca' write it: upper-case hex padded to whole bytes."""
+    return f"{serial:0{2 * max(1, (serial.bit_length() + 7) // 8)}X}"
+
+def _init_worker(ca_key_pem, ca_cert_pem):
+    """Load the CA key and certificate once per pool worker."""
+    global _worker_ca
+    x509, _, serialization, _, _, _, _ = _crypto()
+    _worker_ca = (serialization.load_pem_private_key(ca_key_pem, password=None),
+                  x509.load_pem_x509_certificate(ca_cert_pem))
+
+def _worker_sign(args):
+    name, kind, key_type, days = args
+    return _sign(_worker_ca[0], _worker_ca[1], name, kind, key_type, days)
+
+def _write_private(path, data):
+    """Write key material with owner-only permissions."""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+
+class CertificateAuthority:
+    """Issue and revoke certificates in-process against an easy-rsa style pki/ directory."""
+
+    def __init__(self, pki_dir):
+        x509, _, serialization, _, _, _, _ = _crypto()
+        self.pki_dir = pki_dir
+        with open(os.path.join(pki_dir, "ca.crt"), "rb") as f:
+            self.ca_cert_pem = f.read()
+        with open(os.path.join(pki_dir, "private", "ca.key"), "rb") as f:
+            self.ca_key_pem = f.read()
+        self.ca_cert = x509.load_pem_x509_certificate(self.ca_cert_pem)
+        self.ca_key = serialization.load_pem_private_key(self.ca_key_pem, password=None)
+
+    @classmethod
+    def init(cls, pki_dir, common_name="JumpSecure CA", key_type="rsa"):
+        """Create the pki/ layout and a self-signed CA if missing, then load it."""
+        for sub in ("private", "issued", "reqs", "certs_by_serial", "revoked"):
+            os.makedirs(os.path.join(pki_dir, sub), exist_ok=True)
+        os.chmod(os.path.join(pki_dir, "private"), 0o700)
+        for name, content in (("index.txt", ""), ("index.txt.attr", "unique_subject = no\n")):
+            path = os.path.join(pki_dir, name)
+            if not os.path.exists(path):
+                with open(path, "w") as f:
+                    f.write(content)
+
+        if not os.path.exists(os.path.join(pki_dir, "ca.crt")):
+            x509, hashes, serialization, _, _, _, NameOID = _crypto()
+            key = _generate_key(key_type)
+            subject = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, common_name)])
+            now = _now()
+            cert = (
+                x509.CertificateBuilder()
+                .subject_name(subject)
+                .issuer_name(subject)
+                .public_key(key.public_key())
+                .serial_number(x509.random_serial_number())
+                .not_valid_before(now - datetime.timedelta(minutes=5))
+                .not_valid_after(now + datetime.timedelta(days=CA_DAYS))
+                .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+                .add_extension(x509.SubjectKeyIdentifier.from_public_key(key.public_key()), critical=False)
+                .add_extension(x509.KeyUsage(
+                    digital_signature=False, key_encipherment=False, content_commitment=False,
+                    data_encipherment=False, key_agreement=False, key_cert_sign=True, crl_sign=True,
+                    encipher_only=False, decipher_only=False), critical=False)
+                .sign(key, hashes.SHA256())
+            )
+            _write_private(os.path.join(pki_dir, "private", "ca.key"), _key_pem(key))
+            with open(os.path.join(pki_dir, "ca.crt"), "wb") as f:
+                f.write(cert.public_bytes(serialization.Encoding.PEM))
+        return cls(pki_dir)
+
+    def _record(self, issued):
+        """Write issued keys and certs and append their index.txt entries in one locked write."""
+        lines = []
+        for item in issued:
+            name = item["name"]
+            _write_private(os.path.join(self.pki_dir, "private", f"{name}.key"), item["key_pem"])
+            with open(os.path.join(self.pki_dir, "issued", f"{name}.crt"), "wb") as f:
+                f.write(item["cert_pem"])
+            with open(os.path.join(self.pki_dir, "certs_by_serial", f"{item['serial']}.pem"), "wb") as f:
+                f.write(item["cert_pem"])
+            lines.append(f"V\t{item['expires']}\t\t{item['serial']}\tunknown\t/CN={name}\n")
+        with open(os.path.join(self.pki_dir, "index.txt"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.write("".join(lines))
+
+    def exists(self, name):
+        """Return True if a certificate has already been issued for name."""
+        return os.path.exists(os.path.join(self.pki_dir, "issued", f"{name}.crt"))
+
+    def issue(self, name, kind="client", key_type="rsa", days=CERT_DAYS):
+        """Issue a single server or client certificate (same as easy-rsa build-*-full)."""
+        return self.issue_batch([name], kind, key_type, days, workers=1)[0]
+
+    def issue_batch(self, names, kind="client", key_type="rsa", days=CERT_DAYS, workers=None):
+        """Issue certificates for many names, spreading key generation across a process pool.
+
+        workers=1 signs in this process; None uses one worker per CPU. Raises ValueError if a
+        name already has a valid certificate (revoke it first) or appears twice.
+        """
+        valid = {entry[5][len("/CN="):] for entry in self._index_entries() if entry[0] == "V"}
+        twice = {name for name, count in collections.Counter(names).items() if count > 1}
+        taken = sorted(valid.intersection(names) | twice)
+        if taken:
+            raise ValueError(f"Already issued or requested twice: {', '.join(taken)}. Revoke a certificate before reissuing it.")
+        jobs = [(name, kind, key_type, days) for name in names]
+        with run_trace.step(f"issue {len(jobs)} {kind} certificate(s)"):
+            if workers == 1 or len(jobs) < 2:
+                issued = [_sign(self.ca_key, self.ca_cert, *job) for job in jobs]
+            else:
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+                # Callers run this on task_graph worker threads; a fork could copy a lock another thread holds
+                with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("forkserver"),
+                                         initializer=_init_worker, initargs=(self.ca_key_pem, self.ca_cert_pem)) as pool:
+                    issued = list(pool.map(_worker_sign, jobs, chunksize=max(1, len(jobs) // 64)))
+            self._record(issued)
+        return issued
+
+    def _index_entries(self):
+        with open(os.path.join(self.pki_dir, "index.txt")) as f:
+            return [line.rstrip("\n").split("\t") for line in f if line.strip()]
+
+    def revoke(self, name):
+        """Mark the valid certificate for name as revoked in index.txt and refresh crl.pem."""
+        entries = self._index_entries()
+        revoked = False
+        for entry in entries:
+            if entry[0] == "V" and entry[5] == f"/CN={name}":
+                entry[0] = "R"
+                entry[2] = _index_time(_now())
+                revoked = True
+        if not revoked:
+            raise ValueError(f"No valid certificate found for '{name}'.")
+        path = os.path.join(self.pki_dir, "index.txt")
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            f.write("".join("\t".join(entry) + "\n" for entry in entries))
+        os.replace(tmp, path)
+        issued = os.path.join(self.pki_dir, "issued", f"{name}.crt")
+        if os.path.exists(issued):
+            os.replace(issued, os.path.join(self.pki_dir, "revoked", f"{name}.crt"))
+        self.gen_crl()
+
+    def gen_crl(self, days=180):
+        """Write pki/crl.pem from the revoked entries in index.txt (same as easy-rsa gen-crl)."""
+        x509, hashes, serialization, _, _, _, _ = _crypto()
+        now = _now()
+        builder = (x509.CertificateRevocationListBuilder()
+                   .issuer_name(self.ca_cert.subject)
+                   .last_update(now)
+                   .next_update(now + datetime.timedelta(days=days)))
+        for entry in self._index_entries():
+            if entry[0] != "R":
+                continue
+            when = datetime.datetime.strptime(entry[2].split(",")[0], "%y%m%d%H%M%SZ")
+            builder = builder.add_revoked_certificate(
+                x509.RevokedCertificateBuilder()
+                .serial_number(int(entry[3], 16))
+                .revocation_date(when.replace(tzinfo=datetime.timezone.utc))
+                .build())
+        crl = builder.sign(self.ca_key, hashes.SHA256())
+        with open(os.path.join(self.pki_dir, "crl.pem"), "wb") as f:
+            f.write(crl.public_bytes(serialization.Encoding.PEM))
+
+    def read(self, name):
+        """Return (cert_pem, key_pem) text for an issued certificate."""
+        with open(os.path.join(self.pki_dir, "issued", f"{name}.crt")) as f:
+            cert = f.read()
+        with open(os.path.join(self.pki_dir, "private", f"{name}.key")) as f:
+            key = f.read()
+        return cert, key
+
+def main():
+    parser = argparse.ArgumentParser(description="Built-in certificate authority for OpenVPN jump boxes.")
+    parser.add_argument("--pki", default="/etc/openvpn/easy-rsa/pki", help="easy-rsa style pki directory")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("init", help="Create the pki layout and CA")
+    issue = sub.add_parser("issue", help="Issue client or server certificates")
+    issue.add_argument("names", nargs="*", help="Common names to issue")
+    issue.add_argument("--count", type=int, default=0, help="Issue <prefix>1..<prefix>N instead of explicit names")
+    issue.add_argument("--prefix", default="jumpbox", help="Name prefix used with --count")
+    issue.add_argument("--server", action="store_true", help="Issue server certificates")
+    issue.add_argument("--key-type", choices=["rsa", "ec"], default="rsa", help="Key algorithm")
+    issue.add_argument("--workers", type=int, default=None, help="Process pool size (1 disables the pool)")
+    revoke = sub.add_parser("revoke", help="Revoke a certificate and refresh the CRL")
+    revoke.add_argument("name")
+    sub.add_parser("gen-crl", help="Regenerate crl.pem")
+    args = parser.parse_args()
+
+    ca = CertificateAuthority.init(args.pki)
+    if args.command == "issue":
+        names = args.names + [f"{args.prefix}{i}" for i in range(1, args.count + 1)]
+        started = time.perf_counter()
+        try:
+            ca.issue_batch(names, "server" if args.server else "client", args.key_type, workers=args.workers)
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"Issued {len(names)} certificates in {time.perf_counter() - started:.2f}s.")
+    elif args.command == "revoke":
+        ca.revoke(args.name)
+        print(f"Revoked '{args.name}' and updated crl.pem.")
+    elif args.command == "gen-crl":
+        ca.gen_crl()
+        print("Updated crl.pem.")
+    else:
+        print(f"CA ready in {args.pki}.")
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,68 @@
 #!/usr/bin/env python3
 
 import click
+import depprobe
 import os
+import shlex
+import ssh_key_pool
+import ssh_profiles
 import subprocess
-import yaml
+import time
 import sys
+import tunnel_supervisor
+from remote_exec import RemoteError, RemoteSession, format_latency
 
 # Configuration directory and files
 CONFIG_DIR = os.path.expanduser('~/.jumpsecure')
 CONFIG_FILE = os.path.join(CONFIG_DIR, 'config.yaml')
-PID_FILE = os.path.join(CONFIG_DIR, 'pid')
+CIRCUIT_DIR = os.path.join(CONFIG_DIR, 'circuits')
+
+# First local SOCKS port; hosts without an explicit local_port get consecutive ports from here
+BASE_LOCAL_PORT = 1080
+
+# Tor SOCKS ports on the Kali box: circuit i listens on TOR_SOCKS_PORT + i. Tor never shares
+# circuits between streams arriving on different SocksPorts, so each port is an isolated circuit set.
+TOR_SOCKS_PORT = 9050
+TORRC = "/etc/tor/torrc"
+TORRC_BEGIN = "# BEGIN jumpsecure circuits"
+TORRC_END = "# END jumpsecure circuits"
+
+# Commands to run on each Kali box
+SETUP_COMMANDS = [
+    "dpkg -s tor >/dev/null 2>&1 || (sudo apt update && sudo apt install tor -y)",  # Install Tor if not present
+    "sudo systemctl enable tor",  # Enable Tor on boot
+    "sudo systemctl start tor"    # Start Tor service
+]
+
+# Setup commands for a box, adding one SocksPort per circuit when more than one is requested
+def setup_commands(circuits):
+    if circuits <= 1:
+        return SETUP_COMMANDS
+    block = [TORRC_BEGIN] + [f"SocksPort {TOR_SOCKS_PORT + i}" for i in range(circuits)] + [TORRC_END]
+    return [
+        SETUP_COMMANDS[0],
+        f"sudo sed -i '/^{TORRC_BEGIN}$/,/^{TORRC_END}$/d' {TORRC}",  # Drop a previous block so re-runs stay idempotent
+        f"printf '%s\\n' {' '.join(shlex.quote(line) for line in block)} | sudo tee -a {TORRC} >/dev/null",
+        "sudo systemctl enable tor",
+        "sudo systemctl restart tor",  # Restart so the new SocksPorts are bound
+    ]
 
 # Ensure configuration directory exists
 def ensure_config_dir():
     os.makedirs(CONFIG_DIR, exist_ok=True)
 
 # Save configuration to file
-def save_config(kali_ip, kali_user):
+def save_config(hosts):
     ensure_config_dir()
-    config = {'kali_ip': kali_ip, 'kali_user': kali_user}
+    if len(hosts) == 1:
+        config = {'kali_ip': hosts[0]['ip'], 'kali_user': hosts[0]['user']}
+        if hosts[0]['circuits'] > 1:
+            config['circuits'] = hosts[0]['circuits']
+        if hosts[0]['transport'] != ssh_profiles.DEFAULT_PROFILE:
+            config['transport'] = hosts[0]['transport']
+    else:
+        config = {'hosts': hosts}
+    import yaml
     with open(CONFIG_FILE, 'w') as f:
         yaml.dump(config, f)
 
@@ -27,12 +71,53 @@ def load_config():
     if not os.path.exists(CONFIG_FILE):
         click.echo("Error: Configuration not found. Run 'jumpsecure setup' first.")
         sys.exit(1)
+    import yaml
     with open(CONFIG_FILE, 'r') as f:
         return yaml.safe_load(f)
 
+# Normalise a host inventory (list of dicts with ip, user and optional name, port, local_port, circuits, transport)
+def normalize_hosts(entries, circuits=1, transport=ssh_profiles.DEFAULT_PROFILE):
+    hosts = []
+    for i, entry in enumerate(entries):
+        if 'ip' not in entry or 'user' not in entry:
+            raise click.ClickException(f"Inventory entry {i + 1} needs both 'ip' and 'user'.")
+        if entry.get('transport', transport) not in ssh_profiles.PROFILES:
+            raise click.ClickException(f"Inventory entry {i + 1} has unknown transport '{entry['transport']}'.")
+        hosts.append({
+            'name': str(entry.get('name', entry['ip'])),
+            'ip': str(entry['ip']),
+            'user': str(entry['user']),
+            'port': int(entry.get('port', 22)),
+            'local_port': int(entry.get('local_port', BASE_LOCAL_PORT + i)),
+            'circuits': int(entry.get('circuits', circuits)),
+            'transport': entry.get('transport', transport),
+        })
+    return hosts
+
+# Load a host inventory file (YAML list, or a mapping with a 'hosts' list)
+def load_inventory(path, circuits=1, transport=ssh_profiles.DEFAULT_PROFILE):
+    import yaml
+    with open(path, 'r') as f:
+        data = yaml.safe_load(f) or []
+    if isinstance(data, dict):
+        data = data.get('hosts', [])
+    return normalize_hosts(data, circuits, transport)
+
+# Hosts from the saved configuration (single-host configs become a one-entry inventory)
+def config_hosts(config):
+    if config.get('hosts'):
+        return normalize_hosts(config['hosts'])
+    return normalize_hosts([{'name': config['kali_ip'], 'ip': config['kali_ip'], 'user': config['kali_user'],
+                             'circuits': config.get('circuits', 1),
+                             'transport': config.get('transport', ssh_profiles.DEFAULT_PROFILE)}])
+
+# Supervisor tunnel name for one host
+def tunnel_name(host):
+    return f"private-connect:{host['name']}"
+
 # Check if a system tool is installed
 def is_tool_installed(tool):
-    return subprocess.call(f"which {tool}", shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE) == 0
+    return depprobe.which(tool) is not None
 
 # Check if a Python module is installed
 def is_module_installed(module):
@@ -42,15 +127,58 @@ def is_module_installed(module):
     except ImportError:
         return False
 
-# Setup SSH keys if not already configured
-def setup_ssh_keys(kali_user, kali_ip):
+# Give the user a default SSH identity if they have none; existing keys (RSA included) are kept
+def ensure_ssh_key():
     ssh_dir = os.path.expanduser('~/.ssh')
-    key_file = os.path.join(ssh_dir, 'id_rsa')
-    if not os.path.exists(key_file):
-        click.echo("SSH key not found. Generating a new key pair...")
-        subprocess.run("ssh-keygen -t rsa -b 4096", shell=True, check=True)
-    click.echo("Copying SSH public key to the Kali box...")
-    subprocess.run(f"ssh-copy-id {kali_user}@{kali_ip}", shell=True, check=True)
+    if any(os.path.exists(os.path.join(ssh_dir, name)) for name in ('id_ed25519', 'id_ecdsa', 'id_rsa')):
+        return
+    key_file = os.path.join(ssh_dir, 'id_ed25519')
+    source = ssh_key_pool.take(key_file)
+    click.echo(f"SSH key not found. Created {key_file} ({'from the key pool' if source == 'pool' else 'generated'}); "
+               f"add a passphrase with 'ssh-keygen -p -f {key_file}' if you want one.")
+
+# Copy the SSH public key to a Kali box over its master connection
+def setup_ssh_keys(session):
+    click.echo(f"Copying SSH public key to {session.target}...")
+    subprocess.run(["ssh-copy-id", "-p", str(session.port)] + session.ssh_options() + [session.target], check=True)
+
+# Run every hosts entry through func on a bounded thread pool, reporting each host as it finishes
+def run_on_hosts(hosts, func, parallel):
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    started = time.perf_counter()
+    failures = 0
+    with ThreadPoolExecutor(max_workers=max(1, parallel)) as pool:
+        futures = {pool.submit(func, host): (host, time.perf_counter()) for host in hosts}
+        for future in as_completed(futures):
+            host, submitted = futures[future]
+            elapsed = time.perf_counter() - submitted
+            try:
+                message = future.result()
+                click.echo(f"[ok]   {host['name']} ({elapsed:.1f}s) {message or ''}".rstrip())
+            except Exception as e:
+                failures += 1
+                click.echo(f"[FAIL] {host['name']} ({elapsed:.1f}s) {e}")
+    wall = time.perf_counter() - started
+    click.echo(f"\n{len(hosts) - failures} succeeded, {failures} failed, {len(hosts)} host(s) in {wall:.1f}s.")
+    return failures
+
+# Configure one Kali box: open a master connection and pipeline the setup commands over it
+def configure_host(host, batch_mode):
+    session = RemoteSession(host['user'], host['ip'], host['port'],
+                            options=["-o", "BatchMode=yes"] if batch_mode else None)
+    try:
+        session.open()
+        if not batch_mode:
+            setup_ssh_keys(session)
+            click.echo(f"Configuring Kali box at {host['ip']}...")
+        session.run_batch(setup_commands(host['circuits']))
+    except RemoteError as e:
+        raise click.ClickException(f"Error executing '{e.result.command}': {e.result.output}")
+    except subprocess.CalledProcessError as e:
+        raise click.ClickException(f"Failed to connect to {session.target} (ssh exited with {e.returncode}).")
+    finally:
+        session.close()
+    return session.results
 
 # Define CLI group
 @click.group()
@@ -60,10 +188,16 @@ def cli():
 
 # Setup command
 @cli.command()
-@click.option('--kali-ip', prompt='Kali box IP address', help='IP address of the Kali box')
-@click.option('--kali-user', prompt='Kali box username', help='Username for SSH access to Kali box')
-def setup(kali_ip, kali_user):
-    """Set up the Kali box and save configuration."""
+@click.option('--kali-ip', help='IP address of the Kali box')
+@click.option('--kali-user', help='Username for SSH access to Kali box')
+@click.option('--inventory', type=click.Path(exists=True, dir_okay=False), help='YAML host inventory to configure concurrently')
+@click.option('--parallel', default=8, show_default=True, help='Maximum hosts configured at once')
+@click.option('--copy-keys', is_flag=True, help='Run ssh-copy-id for every inventory host first (one at a time)')
+@click.option('--circuits', default=1, show_default=True, help='Isolated Tor SOCKS ports per box (inventory entries may override)')
+@click.option('--transport', type=click.Choice(ssh_profiles.names()), default=ssh_profiles.DEFAULT_PROFILE, show_default=True,
+              help='SSH transport profile for the tunnels (inventory entries may override)')
+def setup(kali_ip, kali_user, inventory, parallel, copy_keys, circuits, transport):
+    """Set up the Kali box (or every box in an inventory) and save configuration."""
     # Check for required tools and modules
     if not is_tool_installed('ssh'):
         click.echo("Error: 'ssh' is not installed. Please install it with 'sudo apt install openssh-client -y'.")
@@ -75,103 +209,172 @@ def setup(kali_ip, kali_user):
         click.echo("Error: Python package 'pyyaml' is not installed. Please install it with 'pip3 install pyyaml'.")
         sys.exit(1)
 
-    # Setup SSH keys
-    setup_ssh_keys(kali_user, kali_ip)
+    ensure_ssh_key()
 
-    click.echo(f"Configuring Kali box at {kali_ip}...")
-    # Commands to run on Kali box
-    commands = [
-        "dpkg -l tor || sudo apt update && sudo apt install tor -y",  # Install Tor if not present
-        "sudo systemctl enable tor",  # Enable Tor on boot
-        "sudo systemctl start tor"    # Start Tor service
-    ]
-    # Execute commands via SSH
-    for cmd in commands:
+    if not inventory:
+        kali_ip = kali_ip or click.prompt('Kali box IP address')
+        kali_user = kali_user or click.prompt('Kali box username')
+        hosts = normalize_hosts([{'ip': kali_ip, 'user': kali_user, 'circuits': circuits, 'transport': transport}])
         try:
-            subprocess.run(
-                f"ssh {kali_user}@{kali_ip} '{cmd}'",
-                shell=True,
-                check=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
-            )
-        except subprocess.CalledProcessError as e:
-            click.echo(f"Error executing '{cmd}': {e.stderr.decode()}")
+            results = configure_host(hosts[0], batch_mode=False)
+        except click.ClickException as e:
+            click.echo(e.message)
+            sys.exit(1)
+        click.echo(format_latency(results))
+    else:
+        hosts = load_inventory(inventory, circuits, transport)
+        if copy_keys:
+            for host in hosts:
+                session = RemoteSession(host['user'], host['ip'], host['port'])
+                try:
+                    setup_ssh_keys(session)
+                except subprocess.CalledProcessError as e:
+                    click.echo(f"Failed to copy key to {session.target}: {e}")
+        click.echo(f"Configuring {len(hosts)} Kali boxes, up to {parallel} at a time...")
+        failures = run_on_hosts(hosts, lambda host: _total_latency(configure_host(host, batch_mode=True)), parallel)
+        if hosts and failures == len(hosts):
             sys.exit(1)
     # Save configuration
-    save_config(kali_ip, kali_user)
+    save_config(hosts)
     click.echo("Setup completed successfully.")
 
+# Summarise remote time spent for one host
+def _total_latency(results):
+    return f"{len(results)} steps, {sum(r.seconds for r in results) * 1000:.0f} ms remote"
+
+# Local Unix socket that forwards circuit i of a host
+def circuit_socket(host, i):
+    return os.path.join(CIRCUIT_DIR, f"{host['name']}-{i}.sock")
+
+# Balancer statistics file for a host
+def circuit_stats(host):
+    return os.path.join(CIRCUIT_DIR, f"{host['name']}.stats.json")
+
+def _supervise(name, argv):
+    try:
+        response = tunnel_supervisor.start_tunnel(name, argv)
+    except (OSError, RuntimeError) as e:
+        raise click.ClickException(f"Failed to start tunnel: {e}")
+    if not response['ok']:
+        raise click.ClickException(f"Failed to start tunnel: {response['error']}")
+    return response.get('already', False)
+
+# Hand one host's tunnel to the supervisor, which owns the ssh process and restarts it with backoff.
+# With several circuits, every Tor SocksPort is forwarded to a local Unix socket and a SOCKS
+# balancer on local_port spreads new connections across them.
+def start_tunnel(host, policy='least-conn'):
+    argv = ["ssh", "-N", *ssh_profiles.options(host['transport'], tunnel=True), "-o", "BatchMode=yes"]
+    if host['circuits'] <= 1:
+        argv += ["-L", f"{host['local_port']}:localhost:{TOR_SOCKS_PORT}"]
+    else:
+        os.makedirs(CIRCUIT_DIR, mode=0o700, exist_ok=True)
+        argv += ["-o", "StreamLocalBindUnlink=yes"]
+        for i in range(host['circuits']):
+            argv += ["-L", f"{circuit_socket(host, i)}:localhost:{TOR_SOCKS_PORT + i}"]
+    argv += ["-p", str(host['port']), f"{host['user']}@{host['ip']}"]
+    already = _supervise(tunnel_name(host), argv)
+
+    if host['circuits'] > 1:
+        balancer = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'socks_balancer.py'),
+                    'serve', '--listen', f"127.0.0.1:{host['local_port']}", '--policy', policy,
+                    '--stats', circuit_stats(host)]
+        for i in range(host['circuits']):
+            balancer += ['--backend', f"unix:{circuit_socket(host, i)}"]
+        already = _supervise(f"{tunnel_name(host)}:balancer", balancer) and already
+    if already:
+        return "already running"
+    suffix = f" across {host['circuits']} circuits" if host['circuits'] > 1 else ""
+    return f"SOCKS proxy at localhost:{host['local_port']}{suffix}"
+
 # Start command
 @cli.command()
-def start():
-    """Start the SSH tunnel to the Kali box."""
-    # Check for autossh
-    if not is_tool_installed('autossh'):
-        click.echo("Error: 'autossh' is not installed. Please install it with 'sudo apt install autossh -y'.")
+@click.option('--inventory', type=click.Path(exists=True, dir_okay=False), help='YAML host inventory (defaults to the saved configuration)')
+@click.option('--parallel', default=8, show_default=True, help='Maximum tunnels started at once')
+@click.option('--policy', type=click.Choice(['least-conn', 'latency']), default='least-conn', show_default=True,
+              help='How the balancer picks a circuit for each new connection (multi-circuit hosts only)')
+def start(inventory, parallel, policy):
+    """Start the SSH tunnel to the Kali box (or one tunnel per inventory host)."""
+    if not is_tool_installed('ssh'):
+        click.echo("Error: 'ssh' is not installed. Please install it with 'sudo apt install openssh-client -y'.")
         sys.exit(1)
-    config = load_config()
-    kali_user = config['kali_user']
-    kali_ip = config['kali_ip']
-    # Check if tunnel is already running
-    if os.path.exists(PID_FILE):
-        with open(PID_FILE, 'r') as f:
-            pid = f.read().strip()
-        if subprocess.call(f"kill -0 {pid}", shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE) == 0:
+    hosts = load_inventory(inventory) if inventory else config_hosts(load_config())
+    ensure_config_dir()
+    if len(hosts) == 1:
+        try:
+            message = start_tunnel(hosts[0], policy)
+        except click.ClickException as e:
+            click.echo(e.message)
+            sys.exit(1)
+        if message == "already running":
             click.echo("Tunnel is already running.")
-            return
         else:
-            os.remove(PID_FILE)  # Remove stale PID file
-    # Start autossh tunnel
-    tunnel_cmd = f"autossh -M 0 -L 1080:localhost:9050 {kali_user}@{kali_ip} -f -N"
-    try:
-        subprocess.run(tunnel_cmd, shell=True, check=True)
-        # Find autossh PID
-        pid = subprocess.check_output(
-            f"pgrep -f 'autossh -M 0 -L 1080:localhost:9050 {kali_user}@{kali_ip}'",
-            shell=True
-        ).decode().strip().split('\n')[0]  # Take first PID if multiple
-        with open(PID_FILE, 'w') as f:
-            f.write(pid)
-        click.echo("Tunnel started. Configure applications to use SOCKS proxy at localhost:1080.")
-    except subprocess.CalledProcessError as e:
-        click.echo(f"Failed to start tunnel: {e}")
+            click.echo(f"Tunnel started. Configure applications to use {message}.")
+        return
+    if run_on_hosts(hosts, lambda host: start_tunnel(host, policy), parallel) == len(hosts):
         sys.exit(1)
 
 # Stop command
 @cli.command()
 def stop():
-    """Stop the SSH tunnel."""
-    if not os.path.exists(PID_FILE):
+    """Stop the SSH tunnel(s)."""
+    running = [t['name'] for t in tunnel_supervisor.tunnel_status()['tunnels']
+               if t['name'].startswith('private-connect:') and t['state'] in ('running', 'backoff')]
+    if not running:
         click.echo("No tunnel is running.")
         return
-    with open(PID_FILE, 'r') as f:
-        pid = f.read().strip()
-    try:
-        subprocess.run(f"kill {pid}", shell=True, check=True)
-        os.remove(PID_FILE)
-        click.echo("Tunnel stopped.")
-    except subprocess.CalledProcessError:
-        click.echo("Failed to stop tunnel. It may have already terminated.")
-        if os.path.exists(PID_FILE):
-            os.remove(PID_FILE)
+    for name in running:
+        response = tunnel_supervisor.stop_tunnel(name)
+        if response['ok']:
+            click.echo(f"Tunnel {name.split(':', 1)[1]} stopped.")
+        else:
+            click.echo(f"Failed to stop tunnel: {response['error']}")
+
+# Status command
+@cli.command()
+def status():
+    """Show the supervised tunnels, their state and restart counts."""
+    tunnels = [t for t in tunnel_supervisor.tunnel_status()['tunnels'] if t['name'].startswith('private-connect:')]
+    click.echo(tunnel_supervisor.format_status(tunnels))
+
+# Circuits command
+@cli.command()
+@click.option('--inventory', type=click.Path(exists=True, dir_okay=False), help='YAML host inventory (defaults to the saved configuration)')
+def circuits(inventory):
+    """Show per-circuit connections, latency and throughput for multi-circuit hosts."""
+    import socks_balancer
+    hosts = load_inventory(inventory) if inventory else config_hosts(load_config())
+    pooled = [host for host in hosts if host['circuits'] > 1]
+    if not pooled:
+        click.echo("No host uses more than one circuit. Re-run setup with --circuits N.")
+        return
+    for host in pooled:
+        click.echo(f"{host['name']} (localhost:{host['local_port']}):")
+        click.echo(socks_balancer.format_stats(socks_balancer.read_stats(circuit_stats(host))))
 
 # Test command
 @cli.command()
-def test():
-    """Test the tunnel by retrieving the exit IP."""
-    # Check for curl
-    if not is_tool_installed('curl'):
-        click.echo("Error: 'curl' is not installed. Please install it with 'sudo apt install curl -y'.")
+@click.option('--inventory', type=click.Path(exists=True, dir_okay=False), help='YAML host inventory (defaults to the saved configuration)')
+@click.option('--target', default='icanhazip.com:80', show_default=True, help='host:port to reach through each tunnel')
+@click.option('--rounds', default=1, show_default=True, help='Probes per tunnel')
+@click.option('--timeout', default=10.0, show_default=True, help='Seconds allowed per probe phase')
+@click.option('--histograms', is_flag=True, help='Print connect/handshake/first-byte latency histograms')
+def test(inventory, target, rounds, timeout, histograms):
+    """Test the tunnel(s) by retrieving the exit IP through each SOCKS proxy concurrently."""
+    import socks_probe
+    hosts = load_inventory(inventory) if inventory else config_hosts(load_config())
+    proxies = [(host['name'], '127.0.0.1', host['local_port']) for host in hosts]
+    results = socks_probe.run(proxies, target=socks_probe.parse_target(target), rounds=rounds, timeout=timeout)
+    failed = 0
+    for stats in results.values():
+        if stats.ok:
+            click.echo(f"Exit IP via Tor ({stats.name}): {stats.body}")
+        else:
+            failed += 1
+            click.echo(f"Failed to retrieve IP for {stats.name} ({stats.last_error}). Ensure the tunnel is running and Tor is active.")
+    if rounds > 1 or histograms:
+        click.echo(socks_probe.format_report(results, histograms))
+    if failed:
         sys.exit(1)
-    try:
-        ip = subprocess.check_output(
-            "curl --socks5 localhost:1080 http://icanhazip.com",
-            shell=True
-        ).decode().strip()
-        click.echo(f"Exit IP via Tor: {ip}")
-    except subprocess.CalledProcessError:
-        click.echo("Failed to retrieve IP. Ensure the tunnel is running and Tor is active.")
 
 if __name__ == '__main__':
-    cli()
\ No newline at end of file
+    cli()
@@ -0,0 +1,157 @@
+import fcntl
+import json
+import os
+import re
+
+# Default store location and the legacy single-file configuration it migrates from
+PROFILE_DIR = "profiles"
+LEGACY_CONFIG = "config.yaml"
+
+# Profile names become file names, so keep them to a safe character set
+NAME_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]{0,127}$")
+
+# Parsed-file cache: path -> (mtime_ns, size, value)
+_cache = {}
+
+def _stamp(path):
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+def _cached(path, parse):
+    """Return the parsed contents of path, re-parsing only when its mtime or size changed."""
+    try:
+        stamp = _stamp(path)
+    except FileNotFoundError:
+        _cache.pop(path, None)
+        return None
+    hit = _cache.get(path)
+    if hit and hit[:2] == stamp:
+        return hit[2]
+    with open(path) as f:
+        value = parse(f)
+    _cache[path] = stamp + (value,)
+    return value
+
+def _parse_index(f):
+    """Parse index.json and build the host and port lookup tables alongside it."""
+    entries = json.load(f)
+    by_host, by_port = {}, {}
+    for name, entry in entries.items():
+        by_host.setdefault(entry["host"], set()).add(name)
+        by_port.setdefault(entry["port"], set()).add(name)
+    return entries, by_host, by_port
+
+def _parse_yaml(f):
+    import yaml
+    return yaml.safe_load(f) or {}
+
+def atomic_write(path, text, mode=0o600):
+    """Write text to path via a temp file in the same directory, fsync and rename."""
+    directory = os.path.dirname(path) or "."
+    tmp = os.path.join(directory, f".{os.path.basename(path)}.{os.getpid()}.tmp")
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+class ProfileStore:
+    """Named tunnel profiles, one small YAML file each, plus a JSON index by method, host and port.
+
+    Looking up one profile by name reads only that profile's file; the index is read for
+    listings and host/port queries. Both are cached in-process and invalidated by mtime.
+    """
+
+    def __init__(self, root=PROFILE_DIR, legacy_config=LEGACY_CONFIG):
+        self.root = root
+        self.index_path = os.path.join(root, "index.json")
+        if not os.path.isdir(root):
+            os.makedirs(root, mode=0o700, exist_ok=True)
+            if legacy_config and os.path.exists(legacy_config):
+                self._migrate(legacy_config)
+
+    def _profile_path(self, name):
+        if not NAME_RE.match(name):
+            raise ValueError(f"Invalid profile name '{name}' (use letters, digits, '.', '_' and '-').")
+        return os.path.join(self.root, f"{name}.yaml")
+
+    def _migrate(self, legacy_config):
+        """Import a legacy config.yaml (one section per method) as profiles named after the method."""
+        with open(legacy_config) as f:
+            legacy = _parse_yaml(f)
+        for method, data in legacy.items():
+            if isinstance(data, dict):
+                self.put(method, method, data)
+
+    def _index(self):
+        return _cached(self.index_path, _parse_index) or ({}, {}, {})
+
+    def index(self):
+        """Return {name: {"method", "host", "port"}} for every profile."""
+        return self._index()[0]
+
+    def get(self, name):
+        """Return a copy of the profile dict for name (including its 'method'), or None."""
+        profile = _cached(self._profile_path(name), _parse_yaml)
+        return dict(profile) if profile is not None else None
+
+    def put(self, name, method, data):
+        """Create or replace a profile and update the index atomically."""
+        import yaml
+        path = self._profile_path(name)
+        profile = dict(data, method=method)
+        with self._locked():
+            atomic_write(path, yaml.safe_dump(profile))
+            index = dict(self.index())
+            index[name] = {"method": method, "host": profile.get("server_ip"), "port": profile.get("port")}
+            atomic_write(self.index_path, json.dumps(index, sort_keys=True))
+        return profile
+
+    def delete(self, name):
+        """Remove a profile. Returns False if it did not exist."""
+        path = self._profile_path(name)
+        with self._locked():
+            index = dict(self.index())
+            existed = index.pop(name, None) is not None or os.path.exists(path)
+            if os.path.exists(path):
+                os.remove(path)
+            atomic_write(self.index_path, json.dumps(index, sort_keys=True))
+        return existed
+
+    def find(self, method=None, host=None, port=None):
+        """Return profile names matching every given field, using the host/port lookup tables."""
+        entries, by_host, by_port = self._index()
+        names = None
+        if host is not None:
+            names = set(by_host.get(host, ()))
+        if port is not None:
+            matches = by_port.get(port, set())
+            names = set(matches) if names is None else names & matches
+        if names is None:
+            names = set(entries)
+        if method is not None:
+            names = {name for name in names if entries[name]["method"] == method}
+        return sorted(names)
+
+    def _locked(self):
+        return _Lock(os.path.join(self.root, ".lock"))
+
+class _Lock:
+    """Exclusive flock held while a writer updates a profile and the index."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __enter__(self):
+        self.f = open(self.path, "w")
+        fcntl.flock(self.f, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        self.f.close()
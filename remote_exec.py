@@ -0,0 +1,137 @@
+import os
+import subprocess
+import time
+
+# Directory for ControlMaster sockets (kept short, socket paths are limited to ~108 bytes)
+CONTROL_DIR = os.path.expanduser("~/.jumpsecure/cm")
+
+# Markers used to split batched output back into per-command results
+_BEGIN = "__JUMPSECURE_BEGIN"
+_END = "__JUMPSECURE_END"
+
+class CommandResult:
+    """Outcome of one remote command."""
+
+    def __init__(self, command, returncode, output, seconds):
+        self.command = command
+        self.returncode = returncode
+        self.output = output
+        self.seconds = seconds
+
+    @property
+    def ok(self):
+        return self.returncode == 0
+
+class RemoteError(Exception):
+    """Raised when a remote command fails and check is enabled."""
+
+    def __init__(self, result):
+        super().__init__(f"'{result.command}' exited with {result.returncode}: {result.output.strip()}")
+        self.result = result
+
+class RemoteSession:
+    """Run many commands on one host over a single multiplexed SSH master connection."""
+
+    def __init__(self, user, host, port=22, persist="10m", options=None):
+        self.user = user
+        self.host = host
+        self.port = port
+        self.persist = persist
+        self.options = list(options or [])
+        self.control_path = os.path.join(CONTROL_DIR, f"{user}@{host}:{port}")
+        self.results = []
+
+    @property
+    def target(self):
+        return f"{self.user}@{self.host}"
+
+    def ssh_options(self):
+        """Options that route an ssh/scp/ssh-copy-id invocation through the master connection."""
+        opts = ["-o", "ControlMaster=auto", "-o", f"ControlPath={self.control_path}",
+                "-o", f"ControlPersist={self.persist}"]
+        return opts + self.options
+
+    def ssh_argv(self, *remote):
+        """Full ssh command line for running remote over the master connection."""
+        return ["ssh", "-p", str(self.port)] + self.ssh_options() + [self.target] + list(remote)
+
+    def is_open(self):
+        return subprocess.run(["ssh", "-O", "check", "-o", f"ControlPath={self.control_path}", self.target],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0
+
+    def open(self):
+        """Establish the master connection (prompting for a password once if needed)."""
+        os.makedirs(CONTROL_DIR, mode=0o700, exist_ok=True)
+        if self.is_open():
+            return self
+        started = time.perf_counter()
+        subprocess.run(["ssh", "-p", str(self.port), "-M", "-N", "-f"] + self.ssh_options() + [self.target], check=True)
+        self.results.append(CommandResult("<connect>", 0, "", time.perf_counter() - started))
+        return self
+
+    def close(self):
+        """Tear down the master connection."""
+        subprocess.run(["ssh", "-O", "exit", "-o", f"ControlPath={self.control_path}", self.target],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def run(self, command, check=True):
+        """Run a single command over the master connection and time it."""
+        started = time.perf_counter()
+        proc = subprocess.run(self.ssh_argv(command), stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        result = CommandResult(command, proc.returncode, proc.stdout.decode(errors="replace"),
+                               time.perf_counter() - started)
+        self.results.append(result)
+        if check and not result.ok:
+            raise RemoteError(result)
+        return result
+
+    def run_batch(self, commands, check=True):
+        """Pipeline several commands through one remote shell in a single round trip.
+
+        Each command is timed on the remote side; execution stops at the first failure.
+        """
+        lines = []
+        for i, command in enumerate(commands):
+            lines.append(f"printf '\\n{_BEGIN} {i} %s\\n' \"$(date +%s%N)\"")
+            lines.append(f"( {command} ) </dev/null 2>&1; rc=$?")
+            lines.append(f"printf '\\n{_END} {i} %s %s\\n' \"$rc\" \"$(date +%s%N)\"")
+            lines.append('[ "$rc" -eq 0 ] || exit "$rc"')
+        script = "\n".join(lines) + "\n"
+        proc = subprocess.run(self.ssh_argv("sh -s"), input=script.encode(),
+                              stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+
+        results = []
+        begun, buffer = None, []
+        for line in proc.stdout.decode(errors="replace").splitlines():
+            fields = line.split()
+            if fields[:1] == [_BEGIN] and len(fields) == 3:
+                begun, buffer = int(fields[2]), []
+            elif fields[:1] == [_END] and len(fields) == 4 and begun is not None:
+                index = int(fields[1])
+                results.append(CommandResult(commands[index], int(fields[2]), "\n".join(buffer).strip("\n"),
+                                             (int(fields[3]) - begun) / 1e9))
+                begun = None
+            elif begun is not None:
+                buffer.append(line)
+        if len(results) < len(commands) and (not results or results[-1].ok):
+            # The shell died before reporting (e.g. connection loss); record the command that was in flight
+            failed = commands[len(results)]
+            results.append(CommandResult(failed, proc.returncode or 255, "\n".join(buffer), 0.0))
+        self.results.extend(results)
+        if check and results and not results[-1].ok:
+            raise RemoteError(results[-1])
+        return results
+
+def format_latency(results):
+    """Render a per-command latency table."""
+    width = max([len(r.command) for r in results] + [7])
+    rows = [f"{'command'.ljust(width)}  {'exit':>4}  {'ms':>9}"]
+    for r in results:
+        rows.append(f"{r.command.ljust(width)}  {r.returncode:>4}  {r.seconds * 1000:>9.1f}")
+    return "\n".join(rows)
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+import argparse
+import atexit
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# When set, a Chrome trace of every command and step is written to this path at exit
+TRACE_ENV = "JUMPSECURE_TRACE"
+
+class Span:
+    """One timed command or Python step."""
+
+    def __init__(self, name, kind, start, thread):
+        self.name = name
+        self.kind = kind  # "command" or "step"
+        self.start = start
+        self.thread = thread
+        self.duration = None
+        self.exit_code = None
+        self.output_bytes = 0
+        self.error = None
+
+class Tracer:
+    """Records a span for every shell command and Python step, from any thread."""
+
+    def __init__(self):
+        self.spans = []
+        self.origin = time.perf_counter()
+        self.epoch = time.time()
+        self._lock = threading.Lock()
+        self._threads = {}
+
+    def _begin(self, name, kind):
+        with self._lock:
+            thread = self._threads.setdefault(threading.get_ident(), len(self._threads) + 1)
+            span = Span(name, kind, time.perf_counter(), thread)
+            self.spans.append(span)
+        return span
+
+    @contextmanager
+    def step(self, name):
+        """Time a block of Python work as a span."""
+        span = self._begin(name, "step")
+        try:
+            yield span
+        except BaseException as e:
+            span.error = type(e).__name__
+            raise
+        finally:
+            span.duration = time.perf_counter() - span.start
+
+    def run(self, command, check=True, capture=False):
+        """Run a shell command as a span and return the CompletedProcess.
+
+        stderr is merged into stdout, which is passed through to the terminal as it arrives
+        (so long apt runs still show progress) or, with capture, returned as text. Raises
+        CalledProcessError on a non-zero exit when check is set.
+        """
+        span = self._begin(command, "command")
+        try:
+            if capture:
+                proc = subprocess.run(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+                span.output_bytes = len(proc.stdout)
+                proc.stdout = proc.stdout.decode(errors="replace")
+            else:
+                with subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT) as popen:
+                    sink = sys.stdout.buffer
+                    for chunk in iter(lambda: popen.stdout.read1(65536), b""):
+                        span.output_bytes += len(chunk)
+                        sink.write(chunk)
+                        sink.flush()
+                proc = subprocess.CompletedProcess(command, popen.returncode)
+            span.exit_code = proc.returncode
+        finally:
+            span.duration = time.perf_counter() - span.start
+        if check and proc.returncode != 0:
+            raise subprocess.CalledProcessError(proc.returncode, command, proc.stdout)
+        return proc
+
+    def chrome_trace(self):
+        """The finished spans as a Chrome trace (chrome://tracing, ui.perfetto.dev)."""
+        events = []
+        with self._lock:
+            spans = [span for span in self.spans if span.duration is not None]
+        for span in spans:
+            args = {"output_bytes": span.output_bytes}
+            if span.exit_code is not None:
+                args["exit_code"] = span.exit_code
+            if span.error:
+                args["error"] = span.error
+            events.append({"name": span.name, "cat": span.kind, "ph": "X", "pid": os.getpid(), "tid": span.thread,
+                           "ts": round((span.start - self.origin) * 1e6), "dur": round(span.duration * 1e6),
+                           "args": args})
+        return {"traceEvents": events, "displayTimeUnit": "ms",
+                "otherData": {"argv": sys.argv, "started": self.epoch}}
+
+    def export(self, path):
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+
+def summarize(events):
+    """Aggregate trace events by kind and name: [(kind, name, total_us, count, max_us, exit codes, bytes)], costliest first."""
+    rows = {}
+    for event in events:
+        key = (event.get("cat", ""), event["name"])
+        total, count, longest, codes, output = rows.get(key, (0, 0, 0, set(), 0))
+        args = event.get("args", {})
+        if "exit_code" in args:
+            codes = codes | {args["exit_code"]}
+        elif "error" in args:
+            codes = codes | {"error"}
+        rows[key] = (total + event["dur"], count + 1, max(longest, event["dur"]), codes, output + args.get("output_bytes", 0))
+    ranked = sorted(rows.items(), key=lambda item: item[1][0], reverse=True)
+    return [(kind, name, *values) for (kind, name), values in ranked]
+
+def format_summary(events, limit=20):
+    """Summary table of the costliest commands and steps; share is of the traced wall time."""
+    if not events:
+        return "No spans recorded."
+    wall = max(e["ts"] + e["dur"] for e in events) - min(e["ts"] for e in events) or 1
+    lines = [f"{len(events)} spans over {wall / 1e6:.2f}s",
+             f"{'total':>9} {'share':>6} {'count':>5} {'max':>9} {'exit':>6} {'output':>9}  {'kind':<7} name"]
+    rows = summarize(events)
+    for kind, name, total, count, longest, codes, output in rows[:limit]:
+        exit_codes = ",".join(str(code) for code in sorted(codes, key=str)) or "-"
+        label = name if len(name) <= 70 else name[:67] + "..."
+        lines.append(f"{total / 1e6:8.2f}s {100 * total / wall:5.1f}% {count:5} {longest / 1e6:8.2f}s "
+                     f"{exit_codes:>6} {output:>8}B  {kind:<7} {label}")
+    if len(rows) > limit:
+        lines.append(f"... {len(rows) - limit} more")
+    return "\n".join(lines)
+
+# Process-wide tracer shared by every script and module
+TRACER = Tracer()
+run = TRACER.run
+step = TRACER.step
+
+def run_command(command, capture=False):
+    """Run a shell command as a span; on failure print the error and exit(1), as the setup scripts always have."""
+    try:
+        return run(command, capture=capture)
+    except subprocess.CalledProcessError as e:
+        print(f"Command failed: {e}")
+        if capture and e.output:
+            print(e.output, end="")
+        exit(1)
+
+def _export_at_exit():
+    path = os.environ.get(TRACE_ENV)
+    if not path or not TRACER.spans:
+        return
+    TRACER.export(path)
+    print(format_summary(TRACER.chrome_trace()["traceEvents"]), file=sys.stderr)
+    print(f"Trace written to {path} (open it in chrome://tracing or ui.perfetto.dev).", file=sys.stderr)
+
+atexit.register(_export_at_exit)
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarise a JumpSecure trace file, costliest steps first.")
+    parser.add_argument("trace", help=f"Chrome trace JSON written via {TRACE_ENV}")
+    parser.add_argument("--limit", type=int, default=20, help="Rows to show")
+    args = parser.parse_args()
+    with open(args.trace) as f:
+        print(format_summary(json.load(f)["traceEvents"], args.limit))
+
+if __name__ == "__main__":
+    main()
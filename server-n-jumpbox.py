@@ -1,83 +1,68 @@
+import argparse
+import ipaddress
 import os
-import subprocess
-from colorama import Fore, Style, init
-from pyfiglet import Figlet
-
-# Initialize colorama for colored output
-init()
-
-# Check for root privileges
-if os.geteuid() != 0:
-    print(Fore.RED + "This script must be run as root. Please use 'sudo'." + Style.RESET_ALL)
-    exit(1)
-
-# Helper function to run shell commands with error handling
-def run_command(command):
+import apt_plan
+import bundle_writer
+import dh_pool
+import firewall
+import host_state
+import ipam
+import key_registry
+import ovpn_tuning
+import pki_ca
+import run_trace
+import ssh_key_pool
+import ssh_profiles
+import task_graph
+import tunnel_ports
+import wg_peers
+import wg_provision
+from colors import Fore, Style
+from run_trace import run_command
+
+# Print the outcome of a firewall transaction (yellow when there is no backend to load it)
+def report_firewall(result):
+    color = Fore.YELLOW if result is None else Fore.GREEN
+    print(color + firewall.describe(result) + Style.RESET_ALL)
+
+# Run a provisioning task graph, exiting with the failed task's captured output on error
+def run_tasks(graph):
     try:
-        subprocess.run(command, shell=True, check=True)
-    except subprocess.CalledProcessError as e:
-        print(Fore.RED + f"Command failed: {e}" + Style.RESET_ALL)
+        graph.run()
+    except task_graph.TaskFailed as e:
+        print(Fore.RED + str(e) + Style.RESET_ALL)
+        print("".join(e.task.output), end="")
+        print(graph.report())
         exit(1)
-
-# Function to open a firewall port using ufw
-def open_firewall_port(port, protocol='udp'):
-    try:
-        # Check if ufw is installed
-        subprocess.run("ufw --version", shell=True, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        # Open the port
-        run_command(f"ufw allow {port}/{protocol}")
-        run_command("ufw reload")
-        print(Fore.GREEN + f"Successfully opened port {port}/{protocol} on the firewall." + Style.RESET_ALL)
-    except subprocess.CalledProcessError as e:
-        if "not found" in str(e):
-            print(Fore.YELLOW + "ufw is not installed. Please install ufw or manually open the port." + Style.RESET_ALL)
-        else:
-            print(Fore.RED + f"Failed to open port {port}/{protocol}. Error: {e}" + Style.RESET_ALL)
-
-# Function to set up Reverse SSH on the central server
-def setup_central_reverse_ssh():
-    print(Fore.CYAN + "\nSetting up Central Server for Reverse SSH" + Style.RESET_ALL)
-    central_user = input(Fore.YELLOW + "Enter central server username: " + Style.RESET_ALL)
-    central_ip = input(Fore.YELLOW + "Enter central server IP: " + Style.RESET_ALL)
-    tunnel_port = input(Fore.YELLOW + "Enter tunnel port (e.g., 2222): " + Style.RESET_ALL)
-    ssh_key_path = input(Fore.YELLOW + "Enter path for SSH key (e.g., /root/jumpbox_key) [default: /root/jumpbox_key]: " + Style.RESET_ALL) or "/root/jumpbox_key"
-
-    # Generate SSH key if it doesn't exist
-    if not os.path.exists(ssh_key_path):
-        print(Fore.CYAN + "Generating SSH key pair..." + Style.RESET_ALL)
-        run_command(f"ssh-keygen -t rsa -b 4096 -f {ssh_key_path} -N ''")
-
-    # Add public key to authorized_keys
-    authorized_keys = f"/home/{central_user}/.ssh/authorized_keys"
-    os.makedirs(f"/home/{central_user}/.ssh", exist_ok=True)
-    with open(f"{ssh_key_path}.pub", "r") as pub_file:
-        pub_key = pub_file.read()
-    with open(authorized_keys, "a") as auth_file:
-        auth_file.write(pub_key)
-    run_command(f"chown {central_user}:{central_user} {authorized_keys}")
-    run_command(f"chmod 600 {authorized_keys}")
-    print(Fore.GREEN + "Public key added to authorized_keys." + Style.RESET_ALL)
-
-    # Read private key for embedding in the script
-    with open(ssh_key_path, "r") as key_file:
-        private_key = key_file.read().replace("\n", "\\n")
-
-    # Generate jump box script with hardcoded details
-    script_content = f'''#!/usr/bin/env python3
+    print(Fore.CYAN + graph.report() + Style.RESET_ALL)
+
+# Prompt for a count of at least 1, asking again until the answer is one
+def ask_count(prompt, default=1):
+    while True:
+        answer = input(Fore.YELLOW + f"{prompt} [default: {default}]: " + Style.RESET_ALL).strip() or str(default)
+        try:
+            if int(answer) >= 1:
+                return int(answer)
+        except ValueError:
+            pass
+        print(Fore.RED + f"'{answer}' is not a whole number of at least 1." + Style.RESET_ALL)
+
+# Jump box setup script template for a reverse SSH tunnel
+REVERSE_SSH_JUMPBOX_SCRIPT = '''#!/usr/bin/env python3
 import os
 import subprocess
 
 # Hardcoded configuration from central server
-central_ip = "{central_ip}"
-tunnel_port = "{tunnel_port}"
-private_key = r"""{private_key}"""
+central_ip = "$central_ip"
+tunnel_port = "$tunnel_port"
+private_key = r"""$private_key"""
 
 # Set up SSH key on jump box
 key_path = "/root/.ssh/jumpbox_key"
 os.makedirs("/root/.ssh", exist_ok=True)
 with open(key_path, "w") as f:
     f.write(private_key.replace("\\\\n", "\\n"))
-subprocess.run(f"chmod 600 {{key_path}}", shell=True, check=True)
+subprocess.run(f"chmod 600 {key_path}", shell=True, check=True)
 
 # Create systemd service for persistent reverse SSH tunnel
 service_content = f"""[Unit]
@@ -85,7 +70,7 @@ Description=Reverse SSH Tunnel
 After=network.target
 
 [Service]
-ExecStart=/usr/bin/ssh -i {{key_path}} -R {tunnel_port}:localhost:22 {central_user}@{{central_ip}} -N -o ServerAliveInterval=60
+ExecStart=/usr/bin/ssh -i {key_path} -R $tunnel_port:localhost:22 $central_user@{central_ip} -N $ssh_options
 Restart=always
 User=root
 
@@ -99,77 +84,88 @@ subprocess.run("systemctl enable reverse-ssh.service", shell=True, check=True)
 subprocess.run("systemctl start reverse-ssh.service", shell=True, check=True)
 print("Reverse SSH tunnel set up and started on the jump box.")
 '''
-    script_filename = "setup_jumpbox_reverse_ssh.py"
-    with open(script_filename, "w") as script_file:
-        script_file.write(script_content)
-    run_command(f"chmod +x {script_filename}")
-    print(Fore.GREEN + f"\nGenerated '{script_filename}'." + Style.RESET_ALL)
-    print(Fore.YELLOW + f"Transfer this file to the jump box and run it with 'sudo python3 {script_filename}'." + Style.RESET_ALL)
 
-# Function to set up OpenVPN on the central server
-def setup_central_openvpn():
-    print(Fore.CYAN + "\nSetting up Central Server for OpenVPN" + Style.RESET_ALL)
+# Function to set up Reverse SSH on the central server
+def setup_central_reverse_ssh():
+    print(Fore.CYAN + "\nSetting up Central Server for Reverse SSH" + Style.RESET_ALL)
+    central_user = input(Fore.YELLOW + "Enter central server username: " + Style.RESET_ALL)
     central_ip = input(Fore.YELLOW + "Enter central server IP: " + Style.RESET_ALL)
-    vpn_port = input(Fore.YELLOW + "Enter OpenVPN port (e.g., 1194): " + Style.RESET_ALL)
+    box_name = input(Fore.YELLOW + "Enter jump box name [default: jumpbox]: " + Style.RESET_ALL) or "jumpbox"
+    requested_port = input(Fore.YELLOW + f"Enter tunnel port [default: assign from {tunnel_ports.FIRST_PORT}-{tunnel_ports.LAST_PORT}]: " + Style.RESET_ALL)
+    try:
+        tunnel_port, new_port = tunnel_ports.allocate(box_name, requested_port or None)
+    except ValueError as e:
+        print(Fore.RED + str(e) + Style.RESET_ALL)
+        return
+    print(Fore.GREEN + f"Tunnel port {tunnel_port} {'assigned to' if new_port else 'already assigned to'} {box_name}." + Style.RESET_ALL)
+    # One key per box, so each key is restricted to its own tunnel port
+    default_key_path = "/root/jumpbox_key" if box_name == "jumpbox" else f"/root/jumpbox_key-{box_name}"
+    ssh_key_path = input(Fore.YELLOW + f"Enter path for SSH key [default: {default_key_path}]: " + Style.RESET_ALL) or default_key_path
+    transport = input(Fore.YELLOW + f"SSH transport profile ({', '.join(ssh_profiles.names())}) [default: {ssh_profiles.DEFAULT_PROFILE}]: " + Style.RESET_ALL) or ssh_profiles.DEFAULT_PROFILE
+    if transport not in ssh_profiles.PROFILES:
+        print(Fore.YELLOW + f"Unknown profile '{transport}', using {ssh_profiles.DEFAULT_PROFILE}." + Style.RESET_ALL)
+        transport = ssh_profiles.DEFAULT_PROFILE
+
+    # Take an Ed25519 key pair from the pre-generated pool if none exists (an existing RSA key is kept)
+    if not os.path.exists(ssh_key_path):
+        source = ssh_key_pool.take(ssh_key_path, comment=box_name)
+        print(Fore.CYAN + f"SSH key pair written to {ssh_key_path} ({'from the key pool' if source == 'pool' else 'generated'})." + Style.RESET_ALL)
 
-    # Open the specified port on the firewall
-    open_firewall_port(vpn_port, 'udp')
+    # Register the public key, restricted to this box's tunnel port; sshd looks it up by fingerprint
+    # through the AuthorizedKeysCommand helper instead of scanning authorized_keys
+    with open(f"{ssh_key_path}.pub", "r") as pub_file:
+        pub_key = pub_file.read()
+    fp, registered = key_registry.add(central_user, pub_key, tunnel_port, box_name)
+    key_registry.install(run_command)
+    # Raise sshd's MaxStartups with the fleet so a reconnect storm is not throttled
+    tunnel_ports.install_capacity(run_command)
+    # Earlier runs appended the key unrestricted; drop it so it cannot bypass permitlisten
+    key_registry.drop_from_authorized_keys(f"/home/{central_user}/.ssh/authorized_keys", pub_key)
+    state = "registered" if registered else "already registered"
+    print(Fore.GREEN + f"Public key {fp} {state} for tunnel port {tunnel_port}." + Style.RESET_ALL)
 
-    # Install OpenVPN and Easy-RSA
-    run_command("apt-get update && apt-get install -y openvpn easy-rsa")
+    # Read private key for embedding in the script
+    with open(ssh_key_path, "r") as key_file:
+        private_key = key_file.read().replace("\n", "\\n")
 
-    # Set up Easy-RSA for certificate management
-    easy_rsa_dir = "/etc/openvpn/easy-rsa"
-    os.makedirs(easy_rsa_dir, exist_ok=True)
-    run_command(f"cp -r /usr/share/easy-rsa/* {easy_rsa_dir}/")
-    os.chdir(easy_rsa_dir)
-    run_command("./easyrsa --batch init-pki")
-    run_command("./easyrsa --batch build-ca nopass")
-    run_command("./easyrsa --batch gen-req server nopass")
-    run_command("./easyrsa --batch sign-req server server")
-    run_command("./easyrsa --batch gen-req jumpbox nopass")
-    run_command("./easyrsa --batch sign-req client jumpbox")
-    run_command("./easyrsa --batch gen-dh")
-
-    # Create OpenVPN server configuration
-    server_config = f"""
-port {vpn_port}
-proto udp
-dev tun
-ca {easy_rsa_dir}/pki/ca.crt
-cert {easy_rsa_dir}/pki/issued/server.crt
-key {easy_rsa_dir}/pki/private/server.key
-dh {easy_rsa_dir}/pki/dh.pem
-server 10.8.0.0 255.255.255.0
-push "redirect-gateway def1"
-keepalive 10 120
-cipher AES-256-CBC
-persist-key
-persist-tun
-status openvpn-status.log
-verb 3
-"""
-    with open("/etc/openvpn/server.conf", "w") as f:
-        f.write(server_config)
-
-    # Enable IP forwarding
-    run_command("sysctl -w net.ipv4.ip_forward=1")
-    run_command("sed -i 's/#net.ipv4.ip_forward=1/net.ipv4.ip_forward=1/' /etc/sysctl.conf")
-
-    # Start OpenVPN server
-    run_command("systemctl enable openvpn@server")
-    run_command("systemctl start openvpn@server")
-
-    # Read certificates and keys for client config
-    with open(f"{easy_rsa_dir}/pki/ca.crt", "r") as f:
-        ca_cert = f.read()
-    with open(f"{easy_rsa_dir}/pki/issued/jumpbox.crt", "r") as f:
-        client_cert = f.read()
-    with open(f"{easy_rsa_dir}/pki/private/jumpbox.key", "r") as f:
-        client_key = f.read()
-
-    # Generate client configuration with inline certificates
-    client_config = f"""
+    # Generate jump box script with hardcoded details
+    values = {"central_ip": central_ip, "tunnel_port": tunnel_port, "central_user": central_user,
+              "private_key": private_key, "ssh_options": ssh_profiles.option_string(transport, tunnel=True)}
+    script_filename = "setup_jumpbox_reverse_ssh.py" if box_name == "jumpbox" else f"setup_jumpbox_reverse_ssh-{box_name}.py"
+    written, _ = bundle_writer.BundleWriter(".").write(
+        [bundle_writer.Artifact(script_filename, REVERSE_SSH_JUMPBOX_SCRIPT, values, mode=0o755)])
+    if written:
+        print(Fore.GREEN + f"\nGenerated '{script_filename}'." + Style.RESET_ALL)
+    else:
+        print(Fore.GREEN + f"\n'{script_filename}' is already up to date." + Style.RESET_ALL)
+    print(Fore.YELLOW + f"Transfer this file to the jump box and run it with 'sudo python3 {script_filename}'." + Style.RESET_ALL)
+
+# Jump box setup script template for an OpenVPN client
+OPENVPN_JUMPBOX_SCRIPT = '''#!/usr/bin/env python3
+import os
+import subprocess
+import time
+$install_packages
+# Hardcoded client configuration
+client_config = r"""$client_config"""
+
+# Install OpenVPN if not present
+install_packages(["openvpn"])
+
+# Write client config to file
+with open("/etc/openvpn/jumpbox.conf", "w") as f:
+    f.write(client_config)
+
+# Enable and start OpenVPN client service
+subprocess.run("systemctl enable openvpn@jumpbox", shell=True, check=True)
+subprocess.run("systemctl start openvpn@jumpbox", shell=True, check=True)
+print("OpenVPN client set up and started on the jump box.")
+'''
+
+# Generate an OpenVPN client configuration with inline certificates
+def render_openvpn_client_config(central_ip, vpn_port, ca_cert, client_cert, client_key, performance=True):
+    data_channel = "\n".join(ovpn_tuning.client_directives(performance))
+    return f"""
 client
 dev tun
 proto udp
@@ -179,7 +175,7 @@ nobind
 persist-key
 persist-tun
 remote-cert-tls server
-cipher AES-256-CBC
+{data_channel}
 verb 3
 <ca>
 {ca_cert}
@@ -192,114 +188,237 @@ verb 3
 </key>
 """
 
-    # Generate jump box setup script
-    script_content = f'''#!/usr/bin/env python3
-import os
-import subprocess
-
-# Hardcoded client configuration
-client_config = r"""{client_config}"""
-
-# Install OpenVPN if not present
-subprocess.run("apt-get update && apt-get install -y openvpn", shell=True, check=True)
-
-# Write client config to file
-with open("/etc/openvpn/jumpbox.conf", "w") as f:
-    f.write(client_config)
+# Function to set up OpenVPN on the central server
+def setup_central_openvpn():
+    print(Fore.CYAN + "\nSetting up Central Server for OpenVPN" + Style.RESET_ALL)
+    central_ip = input(Fore.YELLOW + "Enter central server IP: " + Style.RESET_ALL)
+    vpn_port = input(Fore.YELLOW + "Enter OpenVPN port (e.g., 1194): " + Style.RESET_ALL)
+    box_count = ask_count("Enter number of jump boxes")
+    ecdh_only = input(Fore.YELLOW + "Use ECDH only and skip DH parameters? (y/N): " + Style.RESET_ALL).lower() == 'y'
+    performance = input(Fore.YELLOW + "Performance mode: AEAD ciphers, larger socket buffers, fast-io, DCO (Y/n): " + Style.RESET_ALL).lower() != 'n'
+    offline_bundle = input(Fore.YELLOW + "Build an offline .deb bundle for the jump boxes? (y/N): " + Style.RESET_ALL).lower() == 'y'
 
-# Enable and start OpenVPN client service
-subprocess.run("systemctl enable openvpn@jumpbox", shell=True, check=True)
-subprocess.run("systemctl start openvpn@jumpbox", shell=True, check=True)
-print("OpenVPN client set up and started on the jump box.")
-'''
-    script_filename = "setup_jumpbox_openvpn.py"
-    with open(script_filename, "w") as script_file:
-        script_file.write(script_content)
-    run_command(f"chmod +x {script_filename}")
-    print(Fore.GREEN + f"\nGenerated '{script_filename}'." + Style.RESET_ALL)
-    print(Fore.YELLOW + f"Transfer this file to the jump box and run it with 'sudo python3 {script_filename}'." + Style.RESET_ALL)
+    easy_rsa_dir = "/etc/openvpn/easy-rsa"
+    pki_dir = f"{easy_rsa_dir}/pki"
+    dh_path = f"{pki_dir}/dh.pem"
+    box_names = ["jumpbox"] if box_count == 1 else [f"jumpbox{i}" for i in range(1, box_count + 1)]
+    out_dir = "." if box_count == 1 else "openvpn_bundles"
+    ccd_dir = "/etc/openvpn/ccd"
+    # The address pool is widened in place when the fleet outgrows it and never shrinks, so
+    # every jump box keeps its address; checked here, before any task runs
+    try:
+        network = ipam.openvpn_network("10.8.0.0/24" if box_count <= 125 else "10.8.0.0/16")
+    except ValueError as e:
+        print(Fore.RED + str(e) + Style.RESET_ALL)
+        return
+
+    # Lease the server and every jump box a fixed address from the static half of the network
+    def allocate_addresses(run):
+        static, _ = ipam.openvpn_ranges(network)
+        with ipam.Pool("openvpn", static) as pool:
+            return dict(zip(box_names, pool.allocate_many(["server"] + box_names)[1:]))
+
+    # Set up the built-in CA in an easy-rsa compatible pki/ layout; returns the CA and the newly issued names
+    def issue_certificates(run):
+        ca = pki_ca.CertificateAuthority.init(pki_dir)
+        if not ca.exists("server"):
+            ca.issue("server", "server")
+        new_names = [name for name in box_names if not ca.exists(name)]
+        if new_names:
+            ca.issue_batch(new_names, "client")
+        return ca, new_names
+
+    # Take pre-computed DH parameters from the pool, or use ECDH only
+    def take_dh(run):
+        if ecdh_only or os.path.exists(dh_path):
+            return None
+        return dh_pool.take(dh_path)
+
+    # Write the config, enable IP forwarding and start the server, touching only what differs;
+    # the server is restarted only when its config changed
+    def apply_server(run):
+        dh_line = "dh none" if ecdh_only else f"dh {dh_path}"
+        addressing = "\n".join(ipam.openvpn_server_directives(network, ccd_dir))
+        data_channel = "\n".join(ovpn_tuning.server_directives(performance, graph.result("dco")))
+        server_config = f"""
+port {vpn_port}
+proto udp
+dev tun
+ca {pki_dir}/ca.crt
+cert {pki_dir}/issued/server.crt
+key {pki_dir}/private/server.key
+{dh_line}
+{addressing}
+push "redirect-gateway def1"
+keepalive 10 120
+{data_channel}
+persist-key
+persist-tun
+status openvpn-status.log
+verb 3
+"""
+        config = host_state.File("/etc/openvpn/server.conf", server_config, mode=0o644)
+        # Pin each jump box to its leased address; OpenVPN reads these at connect time, no restart needed
+        ccd = [host_state.File(f"{ccd_dir}/{name}", ipam.ccd_entry(address, network), mode=0o644)
+               for name, address in graph.result("addresses").items()]
+        steps = [config] + ccd + [host_state.Sysctl({"net.ipv4.ip_forward": 1}),
+                                  host_state.Service("openvpn@server", watches=[config])]
+        return host_state.format_changes(steps, host_state.apply_steps(steps, run))
+
+    # Generate one jump box setup script per certificate
+    def write_scripts(run):
+        ca, _ = graph.result("pki")
+        ca_cert = ca.ca_cert_pem.decode()
+        artifacts = []
+        for name in box_names:
+            client_cert, client_key = ca.read(name)
+            client_config = render_openvpn_client_config(central_ip, vpn_port, ca_cert, client_cert, client_key, performance)
+            suffix = "" if box_count == 1 else f"_{name}"
+            values = {"client_config": client_config, "install_packages": apt_plan.INSTALL_SNIPPET}
+            artifacts.append(bundle_writer.Artifact(f"setup_jumpbox_openvpn{suffix}.py", OPENVPN_JUMPBOX_SCRIPT, values, mode=0o755))
+        written, unchanged = bundle_writer.BundleWriter(out_dir).write(artifacts)
+        return os.path.join(out_dir, artifacts[0].name), written, unchanged
+
+    # Independent steps (firewall, packages, certificates, DH, DCO, offline bundle) run concurrently
+    graph = task_graph.TaskGraph()
+    graph.add("firewall", lambda run: firewall.open_ports([(vpn_port, "udp")], run))
+    graph.add("packages", lambda run: apt_plan.ensure_packages(apt_plan.packages_for(["openvpn"]), run))
+    graph.add("pki", issue_certificates)
+    graph.add("dh", take_dh)
+    # Load the kernel data-channel offload module when the kernel ships it
+    graph.add("dco", lambda run: ovpn_tuning.enable_dco() if performance else None)
+    graph.add("addresses", allocate_addresses)
+    graph.add("server", apply_server, deps=["packages", "pki", "dh", "dco", "addresses"])
+    graph.add("scripts", write_scripts, deps=["pki"])
+    # Ship the jump box packages as local .debs so air-gapped boxes install without network access
+    debs_dir = os.path.join(out_dir, "debs")
+    if offline_bundle:
+        graph.add("offline-bundle", lambda run: apt_plan.build_bundle(apt_plan.packages_for(["openvpn"], "jumpbox"), debs_dir, run))
+    run_tasks(graph)
+
+    report_firewall(graph.result("firewall"))
+    new_names = graph.result("pki")[1]
+    if new_names:
+        print(Fore.CYAN + f"Issued {len(new_names)} jump box certificate(s)." + Style.RESET_ALL)
+    if graph.result("dh"):
+        print(Fore.CYAN + f"DH parameters: {graph.result('dh')}." + Style.RESET_ALL)
+    if performance:
+        print(Fore.GREEN + f"Data channel offload: {graph.result('dco') or 'not available, using the userspace data channel'}." + Style.RESET_ALL)
+    print(Fore.GREEN + graph.result("server") + Style.RESET_ALL)
+    script_filename, written, unchanged = graph.result("scripts")
+    if box_count == 1:
+        print(Fore.GREEN + f"\nGenerated '{script_filename}'. The jump box will connect as {graph.result('addresses')['jumpbox']}." + Style.RESET_ALL)
+        print(Fore.YELLOW + f"Transfer this file to the jump box and run it with 'sudo python3 {script_filename}'." + Style.RESET_ALL)
+    else:
+        print(Fore.GREEN + f"\nGenerated {len(box_names)} jump box scripts in '{out_dir}/' "
+              f"({len(written)} written, {len(unchanged)} unchanged). List their addresses with 'python3 ipam.py list openvpn'." + Style.RESET_ALL)
+        print(Fore.YELLOW + "Transfer each script to its jump box and run it with 'sudo python3 <script>'." + Style.RESET_ALL)
+    if offline_bundle:
+        print(Fore.GREEN + f"Bundled {len(graph.result('offline-bundle'))} packages in '{debs_dir}/'. Copy it next to the jump box scripts." + Style.RESET_ALL)
 
 # Function to set up WireGuard on the central server
 def setup_central_wireguard():
     print(Fore.CYAN + "\nSetting up Central Server for WireGuard" + Style.RESET_ALL)
     central_ip = input(Fore.YELLOW + "Enter central server IP: " + Style.RESET_ALL)
     wg_port = input(Fore.YELLOW + "Enter WireGuard port (e.g., 51820): " + Style.RESET_ALL)
+    peer_count = ask_count("Enter number of jump boxes")
+    default_network = "10.0.0.0/24" if peer_count <= 253 else "10.0.0.0/16"
+    # An existing wg0 pool at least that large stays as it is; it never shrinks or moves
+    existing_network = ipam.existing_network("wg0")
+    if existing_network and existing_network.num_addresses >= ipaddress.ip_network(default_network).num_addresses:
+        default_network = str(existing_network)
+    network = input(Fore.YELLOW + f"Enter tunnel network [default: {default_network}]: " + Style.RESET_ALL) or default_network
+    probe_host = input(Fore.YELLOW + "Host across the jump boxes' uplink to probe the path MTU against [default: none, MTU 1420]: " + Style.RESET_ALL)
+    split = input(Fore.YELLOW + "Networks to route through the tunnel, comma-separated CIDRs [default: all traffic]: " + Style.RESET_ALL)
+    offline_bundle = input(Fore.YELLOW + "Build an offline .deb bundle for the jump boxes? (y/N): " + Style.RESET_ALL).lower() == 'y'
 
-    # Open the specified port on the firewall
-    open_firewall_port(wg_port, 'udp')
-
-    # Install WireGuard
-    run_command("apt-get update && apt-get install -y wireguard")
-
-    # Generate server keys
-    server_private_key = subprocess.check_output("wg genkey", shell=True).decode().strip()
-    server_public_key = subprocess.check_output(f"echo '{server_private_key}' | wg pubkey", shell=True).decode().strip()
-
-    # Generate client keys
-    client_private_key = subprocess.check_output("wg genkey", shell=True).decode().strip()
-    client_public_key = subprocess.check_output(f"echo '{client_private_key}' | wg pubkey", shell=True).decode().strip()
-
-    # Create server configuration
-    server_config = f"""
-[Interface]
-PrivateKey = {server_private_key}
-Address = 10.0.0.1/24
-ListenPort = {wg_port}
-
-[Peer]
-PublicKey = {client_public_key}
-AllowedIPs = 10.0.0.2/32
-"""
-    with open("/etc/wireguard/wg0.conf", "w") as f:
-        f.write(server_config)
-
-    # Enable and start WireGuard
-    run_command("systemctl enable wg-quick@wg0")
-    run_command("systemctl start wg-quick@wg0")
-
-    # Generate client configuration
-    client_config = f"""
-[Interface]
-PrivateKey = {client_private_key}
-Address = 10.0.0.2/24
-DNS = 8.8.8.8
-
-[Peer]
-PublicKey = {server_public_key}
-Endpoint = {central_ip}:{wg_port}
-AllowedIPs = 0.0.0.0/0
-PersistentKeepalive = 25
-"""
-
-    # Generate jump box setup script
-    script_content = f'''#!/usr/bin/env python3
-import os
-import subprocess
-
-# Hardcoded client configuration
-client_config = r"""{client_config}"""
-
-# Install WireGuard if not present
-subprocess.run("apt-get update && apt-get install -y wireguard", shell=True, check=True)
-
-# Write client config to file
-with open("/etc/wireguard/wg0.conf", "w") as f:
-    f.write(client_config)
-
-# Start WireGuard client
-subprocess.run("wg-quick up wg0", shell=True, check=True)
-subprocess.run("systemctl enable wg-quick@wg0", shell=True, check=True)
-print("WireGuard client set up and started on the jump box.")
-'''
-    script_filename = "setup_jumpbox_wireguard.py"
-    with open(script_filename, "w") as script_file:
-        script_file.write(script_content)
-    run_command(f"chmod +x {script_filename}")
-    print(Fore.GREEN + f"\nGenerated '{script_filename}'." + Style.RESET_ALL)
-    print(Fore.YELLOW + f"Transfer this file to the jump box and run it with 'sudo python3 {script_filename}'." + Style.RESET_ALL)
+    try:
+        allowed_ips = wg_provision.collapse_cidrs(n.strip() for n in split.split(",") if n.strip()) if split.strip() else None
+        # Fail before any task runs if the pool cannot become this network; a larger one is grown into
+        fitted = str(ipam.fit_network("wg0", network))
+    except ValueError as e:
+        print(Fore.RED + str(e) + Style.RESET_ALL)
+        exit(1)
+    if fitted != network:
+        print(Fore.YELLOW + f"The wg0 address pool already covers {fitted}; keeping it." + Style.RESET_ALL)
+        network = fitted
+    out_dir = "." if peer_count == 1 else "wireguard_bundles"
+
+    # Size the tunnel MTU from a DF-bit probe so encapsulated packets are not fragmented on PPPoE/LTE uplinks;
+    # each jump box script probes again and lowers its own MTU if its uplink is narrower still
+    def size_mtu(run):
+        path_mtu = wg_provision.probe_path_mtu(probe_host) if probe_host else None
+        return path_mtu, wg_provision.tunnel_mtu(path_mtu, central_ip) if path_mtu else 1420
+
+    # Generate keys in-process and render every config in one pass. A re-run keeps the server key and the
+    # existing peers from wg0.conf and only provisions new jump boxes, with addresses from the wg0 pool
+    def provision(run):
+        return wg_peers.provision("/etc/wireguard/wg0.conf", peer_count, central_ip, wg_port, network,
+                                  mtu=graph.result("mtu")[1], allowed_ips=allowed_ips)
+
+    # Write wg0.conf and start WireGuard; an [Interface] change restarts it, peer changes are applied
+    # to the running interface as a delta so the other jump boxes keep their sessions
+    def apply_server(run):
+        server_config = graph.result("keys")[0]
+        interface = wg_peers.Interface("/etc/wireguard/wg0.conf", server_config)
+        config = host_state.File("/etc/wireguard/wg0.conf", server_config, mode=0o600)
+        steps = [interface, config, host_state.Service("wg-quick@wg0", watches=[interface]),
+                 wg_peers.Peers("wg0", server_config)]
+        return host_state.format_changes(steps, host_state.apply_steps(steps, run))
+
+    # Generate setup scripts for the new jump boxes (existing ones keep theirs)
+    def write_scripts(run):
+        bundles = graph.result("keys")[1]
+        if not bundles:
+            return []
+        if peer_count == 1:
+            bundle_writer.BundleWriter(out_dir).write([bundle_writer.Artifact(
+                "setup_jumpbox_wireguard.py", wg_provision.JUMPBOX_SCRIPT_TEMPLATE,
+                wg_provision.script_values(bundles[0]["client_config"]), mode=0o755)])
+            return ["setup_jumpbox_wireguard.py"]
+        return wg_provision.write_bundles(bundles, out_dir)
+
+    # Independent steps (firewall, packages, MTU probe, offline bundle) run concurrently
+    graph = task_graph.TaskGraph()
+    graph.add("firewall", lambda run: firewall.open_ports([(wg_port, "udp")], run))
+    graph.add("packages", lambda run: apt_plan.ensure_packages(apt_plan.packages_for(["wireguard"]), run))
+    graph.add("mtu", size_mtu)
+    graph.add("keys", provision, deps=["mtu"])
+    graph.add("server", apply_server, deps=["packages", "keys"])
+    graph.add("scripts", write_scripts, deps=["keys"])
+    # Ship the jump box packages as local .debs so air-gapped boxes install without network access
+    debs_dir = os.path.join(out_dir, "debs")
+    if offline_bundle:
+        graph.add("offline-bundle", lambda run: apt_plan.build_bundle(apt_plan.packages_for(["wireguard"], "jumpbox"), debs_dir, run))
+    run_tasks(graph)
+
+    report_firewall(graph.result("firewall"))
+    path_mtu, mtu = graph.result("mtu")
+    if probe_host and path_mtu is None:
+        print(Fore.YELLOW + f"Path MTU probe to {probe_host} got no replies; using MTU {mtu}." + Style.RESET_ALL)
+    elif probe_host:
+        print(Fore.GREEN + f"Path MTU to {probe_host} is {path_mtu}; tunnel MTU {mtu}." + Style.RESET_ALL)
+    print(Fore.GREEN + graph.result("server") + Style.RESET_ALL)
+    paths = graph.result("scripts")
+    if not paths:
+        print(Fore.GREEN + "\nEvery jump box already has its script; no new keys were generated." + Style.RESET_ALL)
+    elif peer_count == 1:
+        print(Fore.GREEN + f"\nGenerated '{paths[0]}'." + Style.RESET_ALL)
+        print(Fore.YELLOW + f"Transfer this file to the jump box and run it with 'sudo python3 {paths[0]}'." + Style.RESET_ALL)
+    else:
+        print(Fore.GREEN + f"\nGenerated {len(paths)} jump box scripts in '{out_dir}/'." + Style.RESET_ALL)
+        print(Fore.YELLOW + "Transfer each script to its jump box and run it with 'sudo python3 <script>'." + Style.RESET_ALL)
+    if offline_bundle:
+        print(Fore.GREEN + f"Bundled {len(graph.result('offline-bundle'))} packages in '{debs_dir}/'. Copy it next to the jump box scripts." + Style.RESET_ALL)
 
 # Menu functions
 def print_banner():
+    # pyfiglet is slow to import and only draws the banner, so load it here and fall back to plain text
+    try:
+        from pyfiglet import Figlet
+    except ImportError:
+        print(Fore.GREEN + "=== Secure Setup ===" + Style.RESET_ALL)
+        return
     fig = Figlet(font='slant')
     print(Fore.GREEN + fig.renderText('Secure Setup') + Style.RESET_ALL)
 
@@ -318,7 +437,21 @@ def setup_type_menu():
 
 # Main function to run the CLI tool
 def main():
-    print_banner()
+    parser = argparse.ArgumentParser(description="Set up a central server and generate jump box scripts.")
+    parser.add_argument("--no-banner", action="store_true", help="Skip the ASCII banner (also JUMPSECURE_NO_BANNER=1)")
+    parser.add_argument("--trace", metavar="FILE", help="Write a Chrome trace of every command and step to FILE "
+                        "and print the costliest ones at exit (also JUMPSECURE_TRACE=FILE)")
+    args = parser.parse_args()
+    if args.trace:
+        os.environ[run_trace.TRACE_ENV] = args.trace
+
+    # Check for root privileges
+    if os.geteuid() != 0:
+        print(Fore.RED + "This script must be run as root. Please use 'sudo'." + Style.RESET_ALL)
+        exit(1)
+
+    if not args.no_banner and not os.environ.get("JUMPSECURE_NO_BANNER"):
+        print_banner()
     method = main_menu()
     setup_type = setup_type_menu()
     if setup_type == '1':
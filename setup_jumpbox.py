@@ -1,14 +1,8 @@
 import os
-import subprocess
 import getpass
-
-def run_command(command):
-    """Run a shell command and handle errors."""
-    try:
-        subprocess.run(command, shell=True, check=True)
-    except subprocess.CalledProcessError as e:
-        print(f"Error running command: {e}")
-        exit(1)
+import apt_plan
+import ssh_profiles
+from run_trace import run_command
 
 def main():
     print("=== Jump Box Reverse SSH Setup ===")
@@ -16,16 +10,25 @@ def main():
     # Prompt for user inputs
     jump_user = input("Enter the username on the jump box (e.g., pi): ")
     central_ip = input("Enter the central server IP address: ")
-    tunnel_port = input("Enter the tunnel port on the central server (e.g., 2222): ")
+    central_user = input("Enter the username on the central server: ")
+    # Ports are assigned on the central server so no two boxes collide ('python3 tunnel_ports.py allocate NAME')
+    tunnel_port = input("Enter the tunnel port assigned on the central server (e.g., 20000): ")
+    while not tunnel_port.isdigit() or not 0 < int(tunnel_port) < 65536:
+        tunnel_port = input("Enter a port number between 1 and 65535: ")
     ssh_key_path = input("Enter path to store the central server’s private key (e.g., /home/{}/central_key): ".format(jump_user))
     
+    transport = input(f"SSH transport profile ({', '.join(ssh_profiles.names())}) [{ssh_profiles.DEFAULT_PROFILE}]: ") or ssh_profiles.DEFAULT_PROFILE
+    if transport not in ssh_profiles.PROFILES:
+        print(f"Unknown profile '{transport}', using {ssh_profiles.DEFAULT_PROFILE}.")
+        transport = ssh_profiles.DEFAULT_PROFILE
+
     # Default SSH key path if empty
     if not ssh_key_path:
         ssh_key_path = f"/home/{jump_user}/central_key"
     
     # Ensure SSH client is installed
     print("Installing OpenSSH client if not present...")
-    run_command("sudo apt update && sudo apt install -y openssh-client")
+    apt_plan.ensure_packages(apt_plan.packages_for(["reverse-ssh"], "jumpbox"), run_command)
     
     # Create .ssh directory and set permissions
     ssh_dir = f"/home/{jump_user}/.ssh"
@@ -61,7 +64,7 @@ Description=Reverse SSH Tunnel to Central Server
 After=network-online.target
 
 [Service]
-ExecStart=/usr/bin/ssh -i {ssh_key_path} -R {tunnel_port}:localhost:22 {central_user}@{central_ip} -N -o ServerAliveInterval=60
+ExecStart=/usr/bin/ssh -i {ssh_key_path} -R {tunnel_port}:localhost:22 {central_user}@{central_ip} -N {ssh_profiles.option_string(transport, tunnel=True)}
 Restart=always
 User={jump_user}
 
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import json
+import os
+import time
+
+# Weight of the newest sample in the per-circuit latency average
+LATENCY_ALPHA = 0.3
+
+# Seconds between stats snapshots
+STATS_INTERVAL = 2.0
+
+# Relay buffer size
+CHUNK = 65536
+
+class Backend:
+    """One upstream SOCKS port (a Tor SocksPort reached over a TCP or Unix forward)."""
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.active = 0
+        self.total = 0
+        self.failures = 0
+        self.latency = None
+        self.bytes_up = 0
+        self.bytes_down = 0
+        self._last = (time.monotonic(), 0, 0)
+        self.rate_up = 0.0
+        self.rate_down = 0.0
+
+    async def open(self):
+        if self.spec.startswith("unix:"):
+            return await asyncio.open_unix_connection(self.spec[5:])
+        host, _, port = self.spec.rpartition(":")
+        return await asyncio.open_connection(host or "127.0.0.1", int(port))
+
+    def observe(self, seconds):
+        self.latency = seconds if self.latency is None else (1 - LATENCY_ALPHA) * self.latency + LATENCY_ALPHA * seconds
+
+    def sample_rates(self):
+        now = time.monotonic()
+        then, up, down = self._last
+        elapsed = max(now - then, 1e-6)
+        self.rate_up = (self.bytes_up - up) / elapsed
+        self.rate_down = (self.bytes_down - down) / elapsed
+        self._last = (now, self.bytes_up, self.bytes_down)
+
+    def snapshot(self):
+        return {
+            "backend": self.spec,
+            "active": self.active,
+            "total": self.total,
+            "failures": self.failures,
+            "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "bytes_up": self.bytes_up,
+            "bytes_down": self.bytes_down,
+            "rate_up": round(self.rate_up),
+            "rate_down": round(self.rate_down),
+        }
+
+class _ReplyTimer:
+    """Times the upstream's reply to the client's request (SOCKS5 CONNECT, or the single SOCKS4 request).
+
+    Tor answers the SOCKS5 method negotiation locally, so that reply only measures the forward to
+    the Tor port; its bytes are skipped and the clock starts when the request goes upstream.
+    """
+
+    def __init__(self, greeting, sent):
+        methods_end = 2 + greeting[1] if len(greeting) >= 2 and greeting[0] == 5 else 0
+        self.skip = 2 if methods_end else 0
+        # Clients that send the request together with the greeting start the clock at once
+        self.started = sent if len(greeting) > methods_end else None
+        self.done = False
+
+    def request_sent(self):
+        if self.started is None:
+            self.started = time.perf_counter()
+
+    def received(self, size):
+        """Seconds from request to reply if these size bytes carry the reply, else None."""
+        if self.done:
+            return None
+        if size <= self.skip:
+            self.skip -= size
+            return None
+        self.skip = 0
+        if self.started is None:
+            return None
+        self.done = True
+        return time.perf_counter() - self.started
+
+class Balancer:
+    """SOCKS5 front-end that splices each client connection onto one of several upstream SOCKS ports.
+
+    The upstreams speak SOCKS5 themselves, so the client's handshake is relayed untouched;
+    the balancer only chooses the upstream and counts bytes. The time from relaying the client's
+    CONNECT request to the upstream's reply (the circuit building the stream) is the latency signal.
+    """
+
+    def __init__(self, backends, policy="least-conn"):
+        self.backends = [Backend(spec) for spec in backends]
+        self.policy = policy
+        # asyncio only holds weak references to tasks; keep live connections from being collected
+        self._tasks = set()
+
+    def ranked(self):
+        """Backends in preference order for the next connection."""
+        if self.policy == "latency":
+            # Unmeasured backends first so every circuit gets sampled
+            key = lambda b: (b.latency is not None, (b.latency or 0) * (1 + b.active), b.failures)
+        else:
+            key = lambda b: (b.active, b.failures, b.total)
+        return sorted(self.backends, key=key)
+
+    async def _pump(self, reader, writer, backend, upstream, timer):
+        try:
+            while True:
+                data = await reader.read(CHUNK)
+                if not data:
+                    break
+                if upstream:
+                    backend.bytes_up += len(data)
+                else:
+                    backend.bytes_down += len(data)
+                    seconds = timer.received(len(data))
+                    if seconds is not None:
+                        backend.observe(seconds)
+                writer.write(data)
+                await writer.drain()
+                if upstream:
+                    timer.request_sent()
+        except (OSError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            if writer.can_write_eof():
+                try:
+                    writer.write_eof()
+                except OSError:
+                    pass
+
+    async def handle(self, client_reader, client_writer):
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        try:
+            await self._relay(client_reader, client_writer)
+        finally:
+            self._tasks.discard(task)
+
+    async def _relay(self, client_reader, client_writer):
+        try:
+            greeting = await client_reader.read(CHUNK)
+        except OSError:
+            greeting = b""  # Client reset before sending anything
+        if not greeting:
+            client_writer.close()
+            return
+        for backend in self.ranked():
+            try:
+                up_reader, up_writer = await backend.open()
+                break
+            except OSError:
+                backend.failures += 1
+        else:
+            client_writer.close()
+            return
+
+        backend.active += 1
+        backend.total += 1
+        try:
+            up_writer.write(greeting)
+            backend.bytes_up += len(greeting)
+            timer = _ReplyTimer(greeting, time.perf_counter())
+            await asyncio.gather(
+                self._pump(client_reader, up_writer, backend, upstream=True, timer=timer),
+                self._pump(up_reader, client_writer, backend, upstream=False, timer=timer),
+            )
+        finally:
+            backend.active -= 1
+            up_writer.close()
+            client_writer.close()
+
+    def snapshot(self):
+        for backend in self.backends:
+            backend.sample_rates()
+        return {"policy": self.policy, "time": time.time(), "circuits": [b.snapshot() for b in self.backends]}
+
+def write_stats(path, stats):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(stats, f)
+    os.replace(tmp, path)
+
+def read_stats(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _rate(value):
+    for unit in ("B/s", "KiB/s", "MiB/s"):
+        if value < 1024:
+            return f"{value:.0f} {unit}"
+        value /= 1024
+    return f"{value:.1f} GiB/s"
+
+def format_stats(stats):
+    """Render a per-circuit table from a stats snapshot."""
+    if not stats:
+        return "No balancer statistics (is the balancer running?)"
+    lines = [f"policy {stats['policy']}, updated {time.time() - stats['time']:.0f}s ago"]
+    for i, c in enumerate(stats["circuits"]):
+        latency = f"{c['latency_ms']:.0f} ms" if c["latency_ms"] is not None else "-"
+        lines.append(f"  circuit {i}: {c['active']:>3} active {c['total']:>6} total {c['failures']:>3} failed  "
+                     f"latency {latency:>7}  up {_rate(c['rate_up']):>10}  down {_rate(c['rate_down']):>10}  "
+                     f"({c['bytes_down'] / 1048576:.1f} MiB received)")
+    return "\n".join(lines)
+
+async def serve(listen, backends, policy, stats_path):
+    balancer = Balancer(backends, policy)
+    host, _, port = listen.rpartition(":")
+    server = await asyncio.start_server(balancer.handle, host or "127.0.0.1", int(port))
+    async with server:
+        while True:
+            await asyncio.sleep(STATS_INTERVAL)
+            if stats_path:
+                write_stats(stats_path, balancer.snapshot())
+
+def main():
+    parser = argparse.ArgumentParser(description="Spread SOCKS5 connections across several upstream SOCKS ports.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("serve", help="Run the balancer in the foreground")
+    run.add_argument("--listen", default="127.0.0.1:1080", help="host:port to accept SOCKS5 clients on")
+    run.add_argument("--backend", action="append", required=True,
+                     help="Upstream SOCKS port as host:port or unix:/path (repeat for each circuit)")
+    run.add_argument("--policy", choices=["least-conn", "latency"], default="least-conn")
+    run.add_argument("--stats", help="Write per-circuit statistics to this JSON file")
+    show = sub.add_parser("stats", help="Print per-circuit statistics")
+    show.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        try:
+            asyncio.run(serve(args.listen, args.backend, args.policy, args.stats))
+        except KeyboardInterrupt:
+            pass
+    else:
+        print(format_stats(read_stats(args.path)))
+
+if __name__ == "__main__":
+    main()
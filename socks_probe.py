@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import ipaddress
+import struct
+import time
+
+# Default probe target: plain HTTP service that answers with the caller's (Tor exit) IP
+DEFAULT_TARGET = ("icanhazip.com", 80)
+
+# Histogram bucket upper bounds in milliseconds (the last bucket is open-ended)
+BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+# Largest HTTP response read while looking for the exit IP
+MAX_RESPONSE = 65536
+
+class ProbeError(Exception):
+    """A probe failed at a named phase (connect, handshake, first-byte, read)."""
+
+    def __init__(self, phase, message):
+        super().__init__(f"{phase}: {message}")
+        self.phase = phase
+
+class Histogram:
+    """Latency samples bucketed on BUCKETS_MS, with exact percentiles from the kept samples."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.samples = []
+
+    def add(self, seconds):
+        ms = seconds * 1000
+        self.samples.append(ms)
+        for i, bound in enumerate(BUCKETS_MS):
+            if ms <= bound:
+                self.counts[i] += 1
+                return
+        self.counts[-1] += 1
+
+    def percentile(self, p):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+    def summary(self):
+        if not self.samples:
+            return "no samples"
+        return (f"n={len(self.samples)} min {min(self.samples):.1f} p50 {self.percentile(50):.1f} "
+                f"p95 {self.percentile(95):.1f} max {max(self.samples):.1f} ms")
+
+    def render(self, width=30):
+        peak = max(self.counts) or 1
+        lines = []
+        labels = [f"<={b}" for b in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}"]
+        for label, count in zip(labels, self.counts):
+            if count:
+                lines.append(f"  {label:>7} ms {'#' * max(1, count * width // peak):<{width}} {count}")
+        return "\n".join(lines)
+
+class TunnelStats:
+    """Per-tunnel phase histograms, error counts and the last body seen."""
+
+    def __init__(self, name):
+        self.name = name
+        self.connect = Histogram()
+        self.handshake = Histogram()
+        self.first_byte = Histogram()
+        self.errors = {}
+        self.body = None
+        self.last_error = None
+
+    @property
+    def ok(self):
+        return len(self.first_byte.samples)
+
+    def record_error(self, error):
+        self.errors[error.phase] = self.errors.get(error.phase, 0) + 1
+        self.last_error = str(error)
+
+def _address(host):
+    """SOCKS5 ATYP and address bytes for an IP literal or a hostname (resolved by the proxy)."""
+    try:
+        ip = ipaddress.ip_address(host)
+    except ValueError:
+        encoded = host.encode("idna")
+        return b"\x03" + bytes([len(encoded)]) + encoded
+    return (b"\x01" if ip.version == 4 else b"\x04") + ip.packed
+
+async def _handshake(reader, writer, target_host, target_port):
+    """No-auth SOCKS5 greeting and CONNECT request."""
+    writer.write(b"\x05\x01\x00")
+    await writer.drain()
+    version, method = await reader.readexactly(2)
+    if version != 5 or method != 0:
+        raise ProbeError("handshake", f"proxy refused no-auth (version {version}, method {method})")
+    writer.write(b"\x05\x01\x00" + _address(target_host) + struct.pack("!H", target_port))
+    await writer.drain()
+    version, reply, _, atyp = await reader.readexactly(4)
+    if reply != 0:
+        raise ProbeError("handshake", f"CONNECT rejected with SOCKS reply {reply}")
+    if atyp == 1:
+        await reader.readexactly(4 + 2)
+    elif atyp == 4:
+        await reader.readexactly(16 + 2)
+    else:
+        await reader.readexactly((await reader.readexactly(1))[0] + 2)
+
+async def _read_http(reader, first):
+    """Read an HTTP response through to EOF or Content-Length (at most MAX_RESPONSE); return the body.
+
+    A non-2xx status or an empty body is a failed probe.
+    """
+    response = first
+    while b"\r\n\r\n" not in response and len(response) < MAX_RESPONSE:
+        chunk = await reader.read(MAX_RESPONSE - len(response))
+        if not chunk:
+            break
+        response += chunk
+    head, separator, body = response.partition(b"\r\n\r\n")
+    if not separator:
+        raise ProbeError("read", "incomplete HTTP response headers")
+    status_line, *header_lines = head.decode("latin-1").split("\r\n")
+    status = status_line.split(" ", 2)
+    if len(status) < 2 or not status[0].startswith("HTTP/") or not status[1].startswith("2"):
+        raise ProbeError("read", f"HTTP status '{status_line}'")
+    length = None
+    for line in header_lines:
+        key, _, value = line.partition(":")
+        if key.strip().lower() == "content-length" and value.strip().isdigit():
+            length = int(value.strip())
+    limit = MAX_RESPONSE if length is None else min(length, MAX_RESPONSE)
+    while len(body) < limit:
+        chunk = await reader.read(limit - len(body))
+        if not chunk:
+            break
+        body += chunk
+    if not body.strip():
+        raise ProbeError("read", "empty HTTP response body")
+    return body
+
+def http_request(host):
+    return f"GET / HTTP/1.0\r\nHost: {host}\r\nUser-Agent: jumpsecure-probe\r\n\r\n".encode()
+
+async def probe(proxy_host, proxy_port, target=DEFAULT_TARGET, payload=None, timeout=5.0, stats=None):
+    """Run one probe through a SOCKS5 proxy, recording phase latencies into stats.
+
+    Returns the response body (HTTP body, or the echoed bytes when payload is given).
+    Each phase gets the full timeout; a phase that exceeds it raises ProbeError, as do a
+    non-2xx HTTP status and an empty HTTP body.
+    """
+    target_host, target_port = target
+    request = payload if payload is not None else http_request(target_host)
+    writer = None
+    phase = "connect"
+    try:
+        started = time.perf_counter()
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(proxy_host, proxy_port), timeout)
+        connected = time.perf_counter()
+
+        phase = "handshake"
+        await asyncio.wait_for(_handshake(reader, writer, target_host, target_port), timeout)
+        shaken = time.perf_counter()
+
+        phase = "first-byte"
+        writer.write(request)
+        await writer.drain()
+        first = await asyncio.wait_for(reader.read(1), timeout)
+        if not first:
+            raise ProbeError(phase, "connection closed before any data")
+        answered = time.perf_counter()
+
+        phase = "read"
+        if payload is not None:
+            body = first + await asyncio.wait_for(reader.readexactly(len(payload) - 1), timeout)
+        else:
+            body = await asyncio.wait_for(_read_http(reader, first), timeout)
+    except ProbeError as e:
+        if stats:
+            stats.record_error(e)
+        raise
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+        error = ProbeError(phase, "timed out" if isinstance(e, asyncio.TimeoutError) else str(e) or type(e).__name__)
+        if stats:
+            stats.record_error(error)
+        raise error from None
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if stats:
+        stats.connect.add(connected - started)
+        stats.handshake.add(shaken - connected)
+        stats.first_byte.add(answered - shaken)
+        stats.body = body.decode(errors="replace").strip()
+    return body
+
+async def probe_many(proxies, target=DEFAULT_TARGET, rounds=1, concurrency=64, timeout=5.0, payload=None):
+    """Probe every (name, host, port) proxy rounds times, at most concurrency probes in flight.
+
+    Returns {name: TunnelStats}.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    results = {name: TunnelStats(name) for name, _, _ in proxies}
+
+    async def one(name, host, port):
+        async with semaphore:
+            try:
+                await probe(host, port, target, payload, timeout, results[name])
+            except ProbeError:
+                pass
+
+    await asyncio.gather(*(one(*proxy) for proxy in proxies for _ in range(rounds)))
+    return results
+
+def run(proxies, **kwargs):
+    """Synchronous wrapper around probe_many for the CLIs."""
+    return asyncio.run(probe_many(proxies, **kwargs))
+
+def format_report(results, histograms=False):
+    lines = []
+    for stats in results.values():
+        attempts = stats.ok + sum(stats.errors.values())
+        status = f"{stats.ok}/{attempts} ok"
+        if stats.errors:
+            status += " (" + ", ".join(f"{n} {phase}" for phase, n in sorted(stats.errors.items())) + " failures)"
+        lines.append(f"{stats.name}: {status}")
+        for label, hist in (("connect", stats.connect), ("handshake", stats.handshake), ("first-byte", stats.first_byte)):
+            lines.append(f"  {label:<10} {hist.summary()}")
+            if histograms and hist.samples:
+                lines.append(hist.render())
+        if not stats.ok and stats.errors:
+            lines.append(f"  last error: {stats.last_error}")
+    return "\n".join(lines)
+
+# Local stand-in: a SOCKS5 server that accepts any CONNECT and echoes the stream back
+async def _stand_in_client(reader, writer, delay):
+    try:
+        greeting = await reader.readexactly(2)
+        await reader.readexactly(greeting[1])
+        writer.write(b"\x05\x00")
+        _, _, _, atyp = await reader.readexactly(4)
+        if atyp == 1:
+            await reader.readexactly(4)
+        elif atyp == 4:
+            await reader.readexactly(16)
+        else:
+            await reader.readexactly((await reader.readexactly(1))[0])
+        await reader.readexactly(2)
+        writer.write(b"\x05\x00\x00\x01\x7f\x00\x00\x01\x00\x00")
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            if delay:
+                await asyncio.sleep(delay)
+            writer.write(data)
+            await writer.drain()
+    except (OSError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+async def start_stand_in(host="127.0.0.1", port=0, delay=0.0):
+    """Start a SOCKS5 echo stand-in; returns the asyncio server (port 0 picks a free port)."""
+    return await asyncio.start_server(lambda r, w: _stand_in_client(r, w, delay), host, port)
+
+def parse_proxy(spec):
+    """Parse 'name=host:port', 'host:port' or 'port' into (name, host, port)."""
+    name, _, address = spec.rpartition("=")
+    host, _, port = address.rpartition(":")
+    host = host or "127.0.0.1"
+    return (name or f"{host}:{port}", host, int(port))
+
+def parse_target(spec):
+    host, _, port = spec.rpartition(":")
+    return (host, int(port)) if host else (spec, 80)
+
+async def _self_test(count, rounds, concurrency, timeout, delay, histograms):
+    servers = [await start_stand_in(delay=delay) for _ in range(count)]
+    proxies = [(f"stand-in-{i}", "127.0.0.1", s.sockets[0].getsockname()[1]) for i, s in enumerate(servers)]
+    started = time.perf_counter()
+    results = await probe_many(proxies, ("echo.invalid", 7), rounds, concurrency, timeout, payload=b"jumpsecure-probe\n")
+    wall = time.perf_counter() - started
+    for server in servers:
+        server.close()
+    print(format_report(results, histograms))
+    print(f"\n{count * rounds} probes across {count} stand-ins in {wall * 1000:.0f} ms.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Probe SOCKS5 tunnels concurrently and report latency histograms.")
+    parser.add_argument("proxies", nargs="*", help="Proxies as name=host:port, host:port or port")
+    parser.add_argument("--target", default=f"{DEFAULT_TARGET[0]}:{DEFAULT_TARGET[1]}", help="host:port to CONNECT to")
+    parser.add_argument("--echo", action="store_true", help="Target is an echo service: send a line and expect it back")
+    parser.add_argument("--rounds", type=int, default=3, help="Probes per proxy")
+    parser.add_argument("--concurrency", type=int, default=64, help="Probes in flight at once")
+    parser.add_argument("--timeout", type=float, default=5.0, help="Seconds allowed per phase")
+    parser.add_argument("--histograms", action="store_true", help="Print bucket histograms")
+    parser.add_argument("--stand-in", type=int, metavar="N", help="Probe N local echo stand-ins instead (offline self-test)")
+    parser.add_argument("--stand-in-delay", type=float, default=0.0, help="Artificial echo delay in seconds for stand-ins")
+    args = parser.parse_args()
+
+    if args.stand_in:
+        asyncio.run(_self_test(args.stand_in, args.rounds, args.concurrency, args.timeout, args.stand_in_delay, args.histograms))
+        return
+    if not args.proxies:
+        parser.error("give at least one proxy, or --stand-in N")
+    results = run([parse_proxy(p) for p in args.proxies], target=parse_target(args.target), rounds=args.rounds,
+                  concurrency=args.concurrency, timeout=args.timeout,
+                  payload=b"jumpsecure-probe\n" if args.echo else None)
+    print(format_report(results, args.histograms))
+    if not all(stats.ok for stats in results.values()):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+import argparse
+import fcntl
+import os
+import shutil
+import subprocess
+import sys
+import time
+import run_trace
+
+# Pool location (root) and per-user fallback; one subdirectory per key type
+POOL_DIR = "/var/lib/jumpsecure/ssh-key-pool"
+USER_POOL_DIR = os.path.join("~", ".cache", "jumpsecure", "ssh-key-pool")
+
+# Ed25519 keys are small and fast to use; RSA only for peers that cannot handle them
+KEY_TYPE = "ed25519"
+RSA_BITS = 4096
+
+# A take() that leaves fewer than LOW ready pairs starts a background refill up to HIGH
+LOW_WATERMARK = 2
+HIGH_WATERMARK = 8
+
+def default_pool_dir():
+    return POOL_DIR if os.geteuid() == 0 else os.path.expanduser(USER_POOL_DIR)
+
+def _type_dir(pool_dir, key_type):
+    path = os.path.join(pool_dir, key_type)
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    os.chmod(path, 0o700)  # Private keys live here; never rely on the umask
+    return path
+
+def _ready(type_dir):
+    """Finished private key files in the pool, oldest first (a pair is published private key last)."""
+    if not os.path.isdir(type_dir):
+        return []
+    entries = [e for e in os.scandir(type_dir)
+               if e.is_file() and not e.name.startswith(".") and not e.name.endswith(".pub")]
+    entries.sort(key=lambda e: e.stat().st_mtime)
+    return [e.path for e in entries]
+
+def generate(path, key_type=KEY_TYPE, comment="jumpsecure"):
+    """Generate an unencrypted key pair at path and path.pub, publishing both only once complete."""
+    directory, name = os.path.split(path)
+    tmp = os.path.join(directory or ".", f".{name}.{os.getpid()}.tmp")
+    bits = ["-b", str(RSA_BITS)] if key_type == "rsa" else []
+    try:
+        with run_trace.step(f"ssh-keygen {key_type}"):
+            subprocess.run(["ssh-keygen", "-q", "-t", key_type, *bits, "-N", "", "-C", comment, "-f", tmp],
+                           check=True, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        os.chmod(tmp, 0o600)
+        os.chmod(f"{tmp}.pub", 0o644)
+        os.replace(f"{tmp}.pub", f"{path}.pub")
+        os.replace(tmp, path)
+    finally:
+        for leftover in (tmp, f"{tmp}.pub"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+
+def refill(pool_dir=None, high=HIGH_WATERMARK, key_type=KEY_TYPE):
+    """Top the pool up to high pairs. Returns immediately if another refill holds the lock."""
+    type_dir = _type_dir(pool_dir or default_pool_dir(), key_type)
+    with open(os.path.join(type_dir, ".lock"), "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return 0
+        made = 0
+        while len(_ready(type_dir)) < high:
+            generate(os.path.join(type_dir, f"{key_type}-{time.time_ns()}"), key_type)
+            made += 1
+        return made
+
+def start_background_refill(pool_dir=None, high=HIGH_WATERMARK, key_type=KEY_TYPE):
+    """Refill the pool in a detached process so the caller never waits on key generation."""
+    subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--pool", pool_dir or default_pool_dir(), "--type", key_type,
+         "refill", "--high", str(high)],
+        stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True,
+        env={k: v for k, v in os.environ.items() if k != run_trace.TRACE_ENV})  # Keep the caller's trace file
+
+def take(dest, comment=None, pool_dir=None, key_type=KEY_TYPE, low=LOW_WATERMARK, high=HIGH_WATERMARK):
+    """Move one pre-generated key pair to dest and dest.pub; return "pool" or "generated".
+
+    Falls back to generating inline when the pool is empty. The private key is 0600 and its
+    directory is created 0700; comment replaces the pool's placeholder in dest.pub. A
+    background refill starts once fewer than low pairs are left.
+    """
+    pool_dir = pool_dir or default_pool_dir()
+    type_dir = _type_dir(pool_dir, key_type)
+    directory = os.path.dirname(dest) or "."
+    if not os.path.isdir(directory):
+        os.makedirs(directory, mode=0o700)
+    source = "generated"
+    for path in _ready(type_dir):
+        try:
+            shutil.move(f"{path}.pub", f"{dest}.pub")
+            shutil.move(path, dest)
+        except FileNotFoundError:
+            continue  # Another consumer took it first
+        source = "pool"
+        break
+    else:
+        generate(dest, key_type)
+    os.chmod(dest, 0o600)
+    if comment:
+        with open(f"{dest}.pub") as f:
+            key_type_field, blob = f.read().split()[:2]
+        with open(f"{dest}.pub", "w") as f:
+            f.write(f"{key_type_field} {blob} {comment}\n")
+    os.chmod(f"{dest}.pub", 0o644)
+    if len(_ready(type_dir)) < low:
+        start_background_refill(pool_dir, high, key_type)
+    return source
+
+def main():
+    parser = argparse.ArgumentParser(description="Pool of pre-generated SSH key pairs (Ed25519 by default).")
+    parser.add_argument("--pool", default=None, help=f"Pool directory (default: {POOL_DIR} as root, else {USER_POOL_DIR})")
+    parser.add_argument("--type", default=KEY_TYPE, choices=["ed25519", "rsa", "ecdsa"], help="Key type")
+    sub = parser.add_subparsers(dest="command", required=True)
+    refill_cmd = sub.add_parser("refill", help="Generate key pairs until the pool holds HIGH")
+    refill_cmd.add_argument("--high", type=int, default=HIGH_WATERMARK)
+    take_cmd = sub.add_parser("take", help="Move one key pair to DEST and DEST.pub")
+    take_cmd.add_argument("dest")
+    take_cmd.add_argument("--comment", help="Comment for DEST.pub")
+    take_cmd.add_argument("--low", type=int, default=LOW_WATERMARK, help="Refill in the background below this many pairs")
+    take_cmd.add_argument("--high", type=int, default=HIGH_WATERMARK, help="Pairs the background refill tops up to")
+    sub.add_parser("status", help="Show how many key pairs are ready")
+    args = parser.parse_args()
+    pool_dir = args.pool or default_pool_dir()
+    key_type = args.type
+
+    if args.command == "refill":
+        made = refill(pool_dir, args.high, key_type)
+        print(f"Generated {made} {key_type} key pair(s); {len(_ready(_type_dir(pool_dir, key_type)))} ready in {pool_dir}.")
+    elif args.command == "take":
+        source = take(args.dest, args.comment, pool_dir, key_type, args.low, args.high)
+        print(f"Wrote {args.dest} ({'from pool' if source == 'pool' else 'generated inline, pool was empty'}).")
+    else:
+        print(f"{len(_ready(_type_dir(pool_dir, key_type)))} {key_type} key pair(s) ready in {pool_dir}.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import shlex
+
+# Profile used when none is chosen
+DEFAULT_PROFILE = "low-latency"
+
+# Named SSH transport profiles: ssh_config options applied to every tunnel the tools start or generate.
+#   bulk-throughput: AES-GCM (AES-NI), no compression, throughput QoS, relaxed keepalives
+#   low-latency:     ChaCha20-Poly1305 (no AES-NI needed, small per-packet cost), lowdelay QoS, fast dead-peer detection
+#   lossy-link:      compression to cut retransmitted bytes, long keepalive tolerance so loss bursts do not kill the tunnel
+PROFILES = {
+    "bulk-throughput": {
+        "Ciphers": "aes128-gcm@openssh.com,aes256-gcm@openssh.com,chacha20-poly1305@openssh.com",
+        "MACs": "hmac-sha2-256-etm@openssh.com,umac-128-etm@openssh.com",
+        "Compression": "no",
+        "IPQoS": "throughput",
+        "ServerAliveInterval": "30",
+        "ServerAliveCountMax": "4",
+        "TCPKeepAlive": "no",
+        "ControlPersist": "30m",
+    },
+    "low-latency": {
+        "Ciphers": "chacha20-poly1305@openssh.com,aes128-gcm@openssh.com",
+        "MACs": "umac-128-etm@openssh.com,hmac-sha2-256-etm@openssh.com",
+        "Compression": "no",
+        "IPQoS": "lowdelay",
+        "ServerAliveInterval": "10",
+        "ServerAliveCountMax": "3",
+        "TCPKeepAlive": "no",
+        "ControlPersist": "10m",
+    },
+    "lossy-link": {
+        "Ciphers": "chacha20-poly1305@openssh.com,aes128-gcm@openssh.com",
+        "MACs": "umac-128-etm@openssh.com,hmac-sha2-256-etm@openssh.com",
+        "Compression": "yes",
+        "IPQoS": "throughput",
+        "ServerAliveInterval": "30",
+        "ServerAliveCountMax": "10",
+        "TCPKeepAlive": "no",
+        "ConnectTimeout": "30",
+        "ControlPersist": "10m",
+    },
+}
+
+# Connection reuse for short-lived commands (scp, admin shells, setup steps)
+CONTROL_PATH = "~/.ssh/cm-%C"
+
+def names():
+    return list(PROFILES)
+
+def settings(name, tunnel=False):
+    """Return the ssh_config settings for a profile.
+
+    Tunnels get ExitOnForwardFailure so a dead forward restarts the service, and no
+    ControlMaster: the tunnel is itself the long-lived connection, and a tunnel that
+    attached to someone else's master would exit with it. Other commands share a master.
+    """
+    if name not in PROFILES:
+        raise ValueError(f"Unknown SSH profile '{name}' (choose from {', '.join(PROFILES)}).")
+    options = dict(PROFILES[name])
+    persist = options.pop("ControlPersist")
+    if tunnel:
+        options["ExitOnForwardFailure"] = "yes"
+    else:
+        options.update({"ControlMaster": "auto", "ControlPath": CONTROL_PATH, "ControlPersist": persist})
+    return options
+
+def options(name, tunnel=False):
+    """ssh argv fragment ['-o', 'Key=Value', ...] for a profile."""
+    argv = []
+    for key, value in settings(name, tunnel).items():
+        argv += ["-o", f"{key}={value}"]
+    return argv
+
+def option_string(name, tunnel=False):
+    """The same options as a shell-quoted string, for generated scripts and systemd units."""
+    return " ".join(shlex.quote(arg) for arg in options(name, tunnel))
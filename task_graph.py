@@ -0,0 +1,144 @@
+import subprocess
+import threading
+import time
+import run_trace
+
+# Worker threads; the heavy steps are subprocesses or release the GIL (key generation, DH, downloads)
+WORKERS = 4
+
+class Cancelled(Exception):
+    """Raised by run() inside a task once another task has failed."""
+
+class TaskFailed(Exception):
+    """A task failed; nothing further was started and the remaining tasks were cancelled."""
+
+    def __init__(self, task):
+        super().__init__(f"Task '{task.name}' failed: {task.error}")
+        self.task = task
+
+class Task:
+    """One provisioning step: a shell command or a callable taking run(command)."""
+
+    def __init__(self, name, action, deps=()):
+        self.name = name
+        self.action = action
+        self.deps = list(deps)
+        self.status = "pending"  # pending, running, ok, failed, cancelled
+        self.result = None
+        self.error = None
+        self.output = []
+        self.started = None
+        self.finished = None
+
+    @property
+    def seconds(self):
+        if self.started is None or self.finished is None:
+            return 0.0
+        return self.finished - self.started
+
+class TaskGraph:
+    """Runs tasks on a worker pool as soon as their dependencies have succeeded.
+
+    Dependencies must be added before the tasks that need them, so the graph is acyclic by
+    construction and insertion order is a valid serial order. The first failure stops the
+    graph: no further task or command is started, while commands already running are left to
+    finish (killing apt or dpkg midway would leave the package database broken).
+    """
+
+    def __init__(self):
+        self.tasks = {}
+        self.wall = 0.0
+        self._started = None
+        self._cancel = threading.Event()
+
+    def add(self, name, action, deps=()):
+        if name in self.tasks:
+            raise ValueError(f"Duplicate task '{name}'.")
+        for dep in deps:
+            if dep not in self.tasks:
+                raise ValueError(f"Task '{name}' depends on unknown task '{dep}' (add it first).")
+        task = Task(name, action, deps)
+        self.tasks[name] = task
+        return task
+
+    def result(self, name):
+        return self.tasks[name].result
+
+    def _runner(self, task):
+        def run(command):
+            """Run a shell command, capturing its output into the task; raise CalledProcessError on failure."""
+            if self._cancel.is_set():
+                raise Cancelled(command)
+            proc = run_trace.run(command, check=False, capture=True)
+            task.output.append(f"$ {command}\n{proc.stdout}")
+            if proc.returncode != 0:
+                raise subprocess.CalledProcessError(proc.returncode, command, proc.stdout)
+            return proc.stdout
+        return run
+
+    def _execute(self, task):
+        task.status = "running"
+        task.started = time.perf_counter()
+        run = self._runner(task)
+        try:
+            with run_trace.step(f"task {task.name}"):
+                task.result = run(task.action) if isinstance(task.action, str) else task.action(run)
+            task.status = "ok"
+        except Cancelled:
+            task.status = "cancelled"
+        except (Exception, SystemExit) as e:
+            task.error = e
+            task.status = "failed"
+        task.finished = time.perf_counter()
+        return task
+
+    def run(self, workers=WORKERS):
+        """Run every task; raise TaskFailed for the first task that fails."""
+        from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+        self._started = time.perf_counter()
+        waiting = dict(self.tasks)
+        running = {}
+        failed = None
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while waiting or running:
+                if failed is None:
+                    for name, task in list(waiting.items()):
+                        if all(self.tasks[dep].status == "ok" for dep in task.deps):
+                            del waiting[name]
+                            running[pool.submit(self._execute, task)] = task
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = running.pop(future)
+                    if task.status == "failed" and failed is None:
+                        failed = task
+                        self._cancel.set()
+                if failed is not None:
+                    for task in waiting.values():
+                        task.status = "cancelled"
+                    waiting.clear()
+        self.wall = time.perf_counter() - self._started
+        if failed is not None:
+            raise TaskFailed(failed)
+
+    def critical_path(self):
+        """The longest chain of dependent tasks by measured time: (seconds, [task names])."""
+        longest = {}
+        for name, task in self.tasks.items():
+            before = max((longest[dep] for dep in task.deps), key=lambda chain: chain[0], default=(0.0, []))
+            longest[name] = (before[0] + task.seconds, before[1] + [name])
+        return max(longest.values(), key=lambda chain: chain[0], default=(0.0, []))
+
+    def report(self):
+        """Per-task timings, total work against wall time and the critical path."""
+        work = sum(task.seconds for task in self.tasks.values())
+        length, path = self.critical_path()
+        lines = [f"{len(self.tasks)} tasks: {work:.2f}s of work in {self.wall:.2f}s "
+                 f"({work / self.wall if self.wall else 0:.1f}x parallel), "
+                 f"critical path {length:.2f}s: {' -> '.join(path) or '-'}"]
+        for task in self.tasks.values():
+            offset = f"+{task.started - self._started:.2f}s" if task.started is not None else "-"
+            lines.append(f"  {task.name:<16} {task.status:<10} {task.seconds:7.2f}s  started {offset}")
+        return "\n".join(lines)
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+import argparse
+import contextlib
+import fcntl
+import json
+import os
+import socket
+import host_state
+import run_trace
+from profile_store import atomic_write
+
+# {box name: remote-forward port} for every jump box tunnelling into this central server
+PORTS_FILE = "/etc/jumpsecure/tunnel_ports.json"
+
+# Range new boxes are assigned from; explicit ports outside it (e.g. an existing 2222) are accepted
+FIRST_PORT = 20000
+LAST_PORT = 29999
+
+# sshd limits sized to the fleet, in a drop-in next to the key registry's
+CAPACITY_DROPIN = "/etc/ssh/sshd_config.d/51-jumpsecure-capacity.conf"
+
+# A reconnect storm is every box at once (the central server or its network came back);
+# sshd's default MaxStartups 10:30:100 starts dropping half-open logins at the 11th
+STORM_HEADROOM = 1.25
+# Sessions per connection: tunnels use none, but operators multiplex many over one master
+MAX_SESSIONS = 32
+
+CAPACITY_TEMPLATE = """# Sized for {boxes} reverse-SSH jump boxes reconnecting at once
+MaxStartups {start}:30:{full}
+MaxSessions {sessions}
+"""
+
+def _check_name(name):
+    if not name or any(c.isspace() for c in name):
+        raise ValueError(f"Jump box name '{name}' may not be empty or contain whitespace.")
+
+def load(path=PORTS_FILE):
+    try:
+        with open(path) as f:
+            return json.load(f)["ports"]
+    except (OSError, ValueError, KeyError):
+        return {}
+
+@contextlib.contextmanager
+def _locked(path):
+    """The port map, held under an exclusive lock and saved on exit if it changed."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        ports = load(path)
+        before = dict(ports)
+        yield ports
+        if ports != before:
+            atomic_write(path, json.dumps({"ports": ports}, indent=1, sort_keys=True), 0o644)
+
+def in_use(port):
+    """Whether something already listens on the loopback port (sshd binds remote forwards there)."""
+    with socket.socket() as s:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)  # TIME_WAIT is not a conflict
+        try:
+            s.bind(("127.0.0.1", port))
+        except OSError:
+            return True
+    return False
+
+def allocate(name, port=None, path=PORTS_FILE, first=FIRST_PORT, last=LAST_PORT):
+    """The tunnel port recorded for name, assigning one if it has none; return (port, whether it is new).
+
+    A requested port must not belong to another box or be bound by another process. Otherwise
+    the lowest port in the range that is neither recorded nor bound is assigned. A box's own
+    recorded port is returned without the bind check, since its tunnel may be up.
+    """
+    _check_name(name)
+    with _locked(path) as ports:
+        owners = {p: owner for owner, p in ports.items()}
+        if port is not None:
+            port = int(port)
+            if not 0 < port < 65536:
+                raise ValueError(f"Invalid tunnel port {port}.")
+            if ports.get(name) == port:
+                return port, False
+            if port in owners:
+                raise ValueError(f"Tunnel port {port} is already assigned to '{owners[port]}'.")
+            if in_use(port):
+                raise ValueError(f"Tunnel port {port} is already in use on this server.")
+        elif name in ports:
+            return ports[name], False
+        else:
+            port = next((p for p in range(first, last + 1) if p not in owners and not in_use(p)), None)
+            if port is None:
+                raise ValueError(f"No free tunnel port left in {first}-{last}.")
+        ports[name] = port
+        return port, True
+
+def release(name, path=PORTS_FILE):
+    """Forget name's port; return it, or None if name had none."""
+    with _locked(path) as ports:
+        return ports.pop(name, None)
+
+def capacity_settings(boxes):
+    """sshd limits for a fleet: (MaxStartups start, full, MaxSessions).
+
+    start admits the whole fleet plus headroom before sshd begins refusing unauthenticated
+    connections; full, where it refuses all of them, is twice that. Neither goes below
+    sshd's defaults.
+    """
+    start = max(10, int(boxes * STORM_HEADROOM) + 10)
+    return start, max(100, 2 * start), MAX_SESSIONS
+
+def capacity_config(boxes):
+    start, full, sessions = capacity_settings(boxes)
+    return CAPACITY_TEMPLATE.format(boxes=boxes, start=start, full=full, sessions=sessions)
+
+def install_capacity(run=run_trace.run, path=PORTS_FILE):
+    """Write the sshd capacity drop-in for the recorded fleet; validate and reload sshd only if it changed."""
+    dropin = host_state.File(CAPACITY_DROPIN, capacity_config(len(load(path))), 0o644)
+    changes = host_state.apply_steps([dropin], run)
+    if changes:
+        run("sshd -t")
+        run("systemctl reload sshd")
+    return changes
+
+def main():
+    parser = argparse.ArgumentParser(description="Assign reverse-SSH tunnel ports and size sshd for the fleet.")
+    parser.add_argument("command", choices=["allocate", "release", "list", "capacity"])
+    parser.add_argument("names", nargs="*", help="Jump box names (allocate and release commands)")
+    parser.add_argument("--port", type=int, help="Request this port (allocate with a single name)")
+    parser.add_argument("--install", action="store_true", help="Write the sshd drop-in and reload sshd (capacity command)")
+    args = parser.parse_args()
+
+    if args.command in ("allocate", "release") and not args.names:
+        parser.error(f"{args.command} needs at least one jump box name.")
+    if args.port is not None and (args.command != "allocate" or len(args.names) != 1):
+        parser.error("--port needs the allocate command and exactly one name.")
+    try:
+        if args.command == "allocate":
+            for name in args.names:
+                port, new = allocate(name, args.port)
+                print(f"{name} {port}{'' if new else ' (already assigned)'}")
+        elif args.command == "release":
+            for name in args.names:
+                print(f"{name} {release(name) or 'had no port'}")
+        elif args.command == "list":
+            for name, port in sorted(load().items(), key=lambda item: item[1]):
+                print(f"{port:<6} {'up  ' if in_use(port) else 'down'} {name}")
+        elif args.install:
+            print(host_state.format_changes([CAPACITY_DROPIN], install_capacity()))
+        else:
+            print(capacity_config(len(load())), end="")
+    except ValueError as e:
+        parser.error(str(e))
+
+if __name__ == "__main__":
+    main()
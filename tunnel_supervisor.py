@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+import argparse
+import fcntl
+import json
+import os
+import selectors
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+# Control socket and per-tunnel logs live next to the rest of the JumpSecure state
+STATE_DIR = os.path.expanduser("~/.jumpsecure")
+SOCKET_PATH = os.path.join(STATE_DIR, "supervisor.sock")
+LOG_DIR = os.path.join(STATE_DIR, "logs")
+
+# Restart backoff: doubles from MIN to MAX, reset once a child has stayed up for STABLE seconds
+BACKOFF_MIN = 1.0
+BACKOFF_MAX = 60.0
+STABLE_AFTER = 30.0
+
+# Seconds to wait after SIGTERM before sending SIGKILL
+STOP_GRACE = 5.0
+
+class Tunnel:
+    """One supervised child process and its restart state."""
+
+    def __init__(self, name, argv):
+        self.name = name
+        self.argv = argv
+        self.proc = None
+        self.pidfd = None
+        self.state = "stopped"
+        self.restarts = 0
+        self.backoff = BACKOFF_MIN
+        self.started_at = None
+        self.next_start = None
+        self.kill_at = None
+        self.last_exit = None
+
+    def status(self):
+        return {
+            "name": self.name,
+            "state": self.state,
+            "pid": self.proc.pid if self.proc and self.proc.returncode is None else None,
+            "restarts": self.restarts,
+            "uptime": round(time.monotonic() - self.started_at, 1) if self.state == "running" else None,
+            "last_exit": self.last_exit,
+            "argv": self.argv,
+        }
+
+class Supervisor:
+    """Owns tunnel children, reacts to their exit via pidfd (or SIGCHLD) and serves a control socket."""
+
+    def __init__(self, socket_path=SOCKET_PATH):
+        self.socket_path = socket_path
+        self.tunnels = {}
+        self.selector = selectors.DefaultSelector()
+        self.running = True
+        self.use_pidfd = hasattr(os, "pidfd_open")
+
+    # Child management
+    def _spawn(self, tunnel):
+        os.makedirs(LOG_DIR, exist_ok=True)
+        log = open(os.path.join(LOG_DIR, f"{tunnel.name.replace('/', '_')}.log"), "ab")
+        try:
+            tunnel.proc = subprocess.Popen(tunnel.argv, stdin=subprocess.DEVNULL, stdout=log, stderr=log,
+                                           start_new_session=True)
+        except OSError as e:
+            tunnel.last_exit = f"spawn failed: {e}"
+            self._schedule_restart(tunnel)
+            return
+        finally:
+            log.close()
+        tunnel.state = "running"
+        tunnel.started_at = time.monotonic()
+        tunnel.next_start = None
+        if self.use_pidfd:
+            try:
+                tunnel.pidfd = os.pidfd_open(tunnel.proc.pid)
+                self.selector.register(tunnel.pidfd, selectors.EVENT_READ, ("child", tunnel))
+            except OSError:
+                self.use_pidfd = False
+                self._install_sigchld()
+
+    def _schedule_restart(self, tunnel):
+        tunnel.state = "backoff"
+        tunnel.next_start = time.monotonic() + tunnel.backoff
+        tunnel.backoff = min(tunnel.backoff * 2, BACKOFF_MAX)
+
+    def _reaped(self, tunnel):
+        """Handle a child that has exited: restart with backoff unless it was being stopped."""
+        if tunnel.pidfd is not None:
+            self.selector.unregister(tunnel.pidfd)
+            os.close(tunnel.pidfd)
+            tunnel.pidfd = None
+        tunnel.last_exit = tunnel.proc.returncode
+        tunnel.kill_at = None
+        if tunnel.state == "stopping":
+            tunnel.state = "stopped"
+            return
+        if time.monotonic() - tunnel.started_at >= STABLE_AFTER:
+            tunnel.backoff = BACKOFF_MIN
+        tunnel.restarts += 1
+        self._schedule_restart(tunnel)
+
+    def _install_sigchld(self):
+        """Fallback for kernels without pidfd: wake the loop on SIGCHLD through a socketpair."""
+        if getattr(self, "_sigchld_r", None):
+            return
+        self._sigchld_r, self._sigchld_w = socket.socketpair()
+        self._sigchld_r.setblocking(False)
+        self._sigchld_w.setblocking(False)
+        signal.set_wakeup_fd(self._sigchld_w.fileno(), warn_on_full_buffer=False)
+        signal.signal(signal.SIGCHLD, lambda *args: None)
+        self.selector.register(self._sigchld_r, selectors.EVENT_READ, ("sigchld", None))
+
+    # Control commands
+    def cmd_start(self, request):
+        name, argv = request["name"], request["argv"]
+        tunnel = self.tunnels.get(name)
+        if tunnel and tunnel.state in ("running", "backoff"):
+            if tunnel.argv == argv:
+                return {"ok": True, "already": True, "tunnel": tunnel.status()}
+            return {"ok": False, "error": f"'{name}' is running with a different command; stop it first."}
+        if tunnel and tunnel.state == "stopping":
+            return {"ok": False, "error": f"'{name}' is still stopping."}
+        tunnel = Tunnel(name, argv)
+        self.tunnels[name] = tunnel
+        self._spawn(tunnel)
+        return {"ok": True, "tunnel": tunnel.status()}
+
+    def cmd_stop(self, request):
+        tunnel = self.tunnels.get(request["name"])
+        if tunnel is None or tunnel.state == "stopped":
+            return {"ok": False, "error": f"No tunnel named '{request['name']}' is running."}
+        if tunnel.state == "backoff":
+            tunnel.state = "stopped"
+            tunnel.next_start = None
+        elif tunnel.state == "running":
+            tunnel.state = "stopping"
+            tunnel.kill_at = time.monotonic() + STOP_GRACE
+            os.killpg(tunnel.proc.pid, signal.SIGTERM)
+        return {"ok": True, "tunnel": tunnel.status()}
+
+    def cmd_status(self, request):
+        if request.get("name"):
+            tunnel = self.tunnels.get(request["name"])
+            return {"ok": tunnel is not None, "tunnels": [tunnel.status()] if tunnel else [],
+                    "error": None if tunnel else f"No tunnel named '{request['name']}'."}
+        return {"ok": True, "tunnels": [t.status() for t in self.tunnels.values()]}
+
+    def cmd_shutdown(self, request):
+        for tunnel in self.tunnels.values():
+            if tunnel.state == "running":
+                self.cmd_stop({"name": tunnel.name})
+        self.running = False
+        return {"ok": True}
+
+    def handle(self, request):
+        handler = getattr(self, f"cmd_{request.get('cmd')}", None)
+        if handler is None:
+            return {"ok": False, "error": f"Unknown command '{request.get('cmd')}'."}
+        try:
+            return handler(request)
+        except (KeyError, TypeError) as e:
+            return {"ok": False, "error": f"Bad request: {e}"}
+
+    # Event loop
+    def _accept(self, server):
+        conn, _ = server.accept()
+        conn.settimeout(2.0)
+        try:
+            data = b""
+            while not data.endswith(b"\n"):
+                chunk = conn.recv(65536)
+                if not chunk:
+                    break
+                data += chunk
+            try:
+                response = self.handle(json.loads(data or b"{}"))
+            except ValueError:
+                response = {"ok": False, "error": "Malformed request."}
+            conn.sendall(json.dumps(response).encode() + b"\n")
+        except OSError:
+            pass
+        finally:
+            conn.close()
+
+    def _timers(self):
+        """Fire due restarts and SIGKILL escalations; return seconds until the next timer."""
+        now = time.monotonic()
+        deadlines = []
+        for tunnel in self.tunnels.values():
+            if tunnel.state == "backoff" and tunnel.next_start is not None:
+                if tunnel.next_start <= now:
+                    self._spawn(tunnel)
+                else:
+                    deadlines.append(tunnel.next_start)
+            if tunnel.state == "stopping" and tunnel.kill_at is not None:
+                if tunnel.kill_at <= now:
+                    os.killpg(tunnel.proc.pid, signal.SIGKILL)
+                    tunnel.kill_at = None
+                else:
+                    deadlines.append(tunnel.kill_at)
+        return max(0.0, min(deadlines) - now) if deadlines else None
+
+    def serve(self, lock_fd=None):
+        """Serve until shutdown; return False without touching the socket if another supervisor owns it.
+
+        The supervisor holds an exclusive flock on the lock file next to the socket for its whole
+        life (lock_fd is one handed over by ensure_running). A socket that still accepts
+        connections is never removed, even if the lock was free.
+        """
+        os.makedirs(os.path.dirname(self.socket_path), mode=0o700, exist_ok=True)
+        if lock_fd is None:
+            lock_fd = os.open(lock_path(self.socket_path), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(lock_fd)
+            return False
+        if is_running(self.socket_path):
+            os.close(lock_fd)
+            return False
+        os.ftruncate(lock_fd, 0)
+        os.pwrite(lock_fd, f"{os.getpid()}\n".encode(), 0)
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)  # Stale: nothing answers on it and we hold the lock
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        old_umask = os.umask(0o177)
+        try:
+            server.bind(self.socket_path)
+        finally:
+            os.umask(old_umask)
+        server.listen(64)
+        self.selector.register(server, selectors.EVENT_READ, ("control", None))
+        if not self.use_pidfd:
+            self._install_sigchld()
+        signal.signal(signal.SIGTERM, lambda *args: self.cmd_shutdown({}))
+
+        while self.running or any(t.state == "stopping" for t in self.tunnels.values()):
+            timeout = self._timers()
+            for key, _ in self.selector.select(timeout):
+                kind, tunnel = key.data
+                if kind == "control":
+                    self._accept(server)
+                elif kind == "child":
+                    if tunnel.proc.poll() is not None:
+                        self._reaped(tunnel)
+                elif kind == "sigchld":
+                    try:
+                        while self._sigchld_r.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    for t in self.tunnels.values():
+                        if t.proc is not None and t.state in ("running", "stopping") and t.proc.poll() is not None:
+                            self._reaped(t)
+        server.close()
+        os.remove(self.socket_path)
+        os.close(lock_fd)  # Released only once the socket is gone
+        return True
+
+# Client side
+def call(request, socket_path=SOCKET_PATH, timeout=5.0):
+    """Send one request to the supervisor and return its response dict."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        conn.settimeout(timeout)
+        conn.connect(socket_path)
+        conn.sendall(json.dumps(request).encode() + b"\n")
+        data = b""
+        while not data.endswith(b"\n"):
+            chunk = conn.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+    return json.loads(data)
+
+def is_running(socket_path=SOCKET_PATH):
+    try:
+        return call({"cmd": "status"}, socket_path, timeout=1.0)["ok"]
+    except (OSError, ValueError):
+        return False
+
+def lock_path(socket_path=SOCKET_PATH):
+    """Lock (and pid) file held by the serving supervisor."""
+    return f"{socket_path}.lock"
+
+def ensure_running(socket_path=SOCKET_PATH, wait=3.0):
+    """Start the supervisor daemon in the background if it is not already serving.
+
+    Concurrent callers are serialized on the supervisor's lock: whoever takes it starts the
+    daemon and hands the locked descriptor over to it, everyone else waits for the socket.
+    """
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        if is_running(socket_path):
+            return
+        os.makedirs(os.path.dirname(socket_path), mode=0o700, exist_ok=True)
+        lock_fd = os.open(lock_path(socket_path), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            # Checked again under the lock: a supervisor may have finished starting meanwhile
+            if not is_running(socket_path):
+                subprocess.Popen([sys.executable, os.path.abspath(__file__), "--socket", socket_path,
+                                  "serve", "--lock-fd", str(lock_fd)],
+                                 stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                 start_new_session=True, pass_fds=[lock_fd])
+        except BlockingIOError:
+            pass  # A supervisor is serving or being started by another caller
+        finally:
+            os.close(lock_fd)
+        time.sleep(0.05)
+    if not is_running(socket_path):
+        raise RuntimeError(f"Tunnel supervisor did not start (socket {socket_path}).")
+
+def start_tunnel(name, argv, socket_path=SOCKET_PATH):
+    """Ask the supervisor (starting it if needed) to run argv as tunnel name."""
+    ensure_running(socket_path)
+    return call({"cmd": "start", "name": name, "argv": list(argv)}, socket_path)
+
+def stop_tunnel(name, socket_path=SOCKET_PATH):
+    """Ask the supervisor to stop tunnel name; reports an error if the supervisor is not running."""
+    if not is_running(socket_path):
+        return {"ok": False, "error": "The tunnel supervisor is not running."}
+    return call({"cmd": "stop", "name": name}, socket_path)
+
+def tunnel_status(name=None, socket_path=SOCKET_PATH):
+    """Return the supervisor's status for one tunnel or all tunnels (empty if it is not running)."""
+    if not is_running(socket_path):
+        return {"ok": True, "tunnels": []}
+    return call({"cmd": "status", "name": name}, socket_path)
+
+def format_status(tunnels):
+    """Render tunnel status rows for the CLIs."""
+    if not tunnels:
+        return "No supervised tunnels."
+    rows = []
+    for t in tunnels:
+        detail = f"pid {t['pid']}, up {t['uptime']}s" if t["state"] == "running" else f"last exit {t['last_exit']}"
+        rows.append(f"{t['name']:<40} {t['state']:<9} restarts {t['restarts']:<4} {detail}")
+    return "\n".join(rows)
+
+def main():
+    parser = argparse.ArgumentParser(description="Supervise JumpSecure tunnel processes.")
+    parser.add_argument("--socket", default=SOCKET_PATH, help="Control socket path")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve", help="Run the supervisor in the foreground")
+    serve.add_argument("--lock-fd", type=int, help=argparse.SUPPRESS)  # Locked by ensure_running
+    sub.add_parser("status", help="Show supervised tunnels")
+    stop = sub.add_parser("stop", help="Stop one tunnel")
+    stop.add_argument("name")
+    sub.add_parser("shutdown", help="Stop every tunnel and exit the supervisor")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        if not Supervisor(args.socket).serve(args.lock_fd):
+            print(f"Another tunnel supervisor is already serving {args.socket}.")
+            sys.exit(1)
+    elif args.command == "status":
+        print(format_status(tunnel_status(socket_path=args.socket)["tunnels"]))
+    elif args.command == "stop":
+        response = stop_tunnel(args.name, args.socket)
+        print("Stopping." if response["ok"] else response["error"])
+    elif is_running(args.socket):
+        call({"cmd": "shutdown"}, args.socket)
+        print("Supervisor shutting down.")
+    else:
+        print("The tunnel supervisor is not running.")
+
+if __name__ == "__main__":
+    main()
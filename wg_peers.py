@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+import argparse
+import ipaddress
+import os
+import shlex
+import tempfile
+import time
+import host_state
+import ipam
+import run_trace
+import wg_provision
+from profile_store import atomic_write
+
+# Peers per 'wg set' command, keeping the command line well below ARG_MAX
+SET_BATCH = 500
+
+def parse_config(text):
+    """Split a server wg0.conf into (interface section, [peer dicts]).
+
+    Each peer is {"name", "public_key", "allowed_ips", "extra"}: the '# name' comment that
+    precedes its [Peer] block (as render_server_config writes it) and any other settings verbatim.
+    """
+    interface, peers = [], []
+    target, pending = interface, None
+    for line in text.splitlines():
+        if line.strip() == "[Peer]":
+            peer = {"name": pending[1:].strip() if pending else None, "public_key": None, "allowed_ips": [], "extra": []}
+            peers.append(peer)
+            target, pending = peer["extra"], None
+            continue
+        if pending is not None:
+            target.append(pending)
+            pending = None
+        if line.startswith("#"):
+            pending = line  # A name if the next line opens a [Peer] block
+        elif not peers:
+            interface.append(line)
+        elif line.strip():
+            key, _, value = line.partition("=")
+            if key.strip() == "PublicKey":
+                peers[-1]["public_key"] = value.strip()
+            elif key.strip() == "AllowedIPs":
+                peers[-1]["allowed_ips"] = [ip.strip() for ip in value.split(",") if ip.strip()]
+            else:
+                target.append(line)
+    if pending is not None:
+        target.append(pending)
+    return "\n".join(interface).rstrip("\n") + "\n", peers
+
+def render_config(interface, peers):
+    """Inverse of parse_config(); matches the layout of wg_provision.render_server_config()."""
+    lines = [interface.rstrip("\n")]
+    for peer in peers:
+        lines.append("")
+        if peer["name"]:
+            lines.append(f"# {peer['name']}")
+        lines += ["[Peer]", f"PublicKey = {peer['public_key']}", f"AllowedIPs = {', '.join(peer['allowed_ips'])}"]
+        lines += peer["extra"]
+    return "\n".join(lines) + "\n"
+
+def _peer_settings(peer):
+    """{key: value} of a config peer's settings other than PublicKey and AllowedIPs."""
+    return {key.strip(): value.strip() for key, _, value in (line.partition("=") for line in peer["extra"]) if value}
+
+def peer_state(peer):
+    """What the running interface should hold for a config peer, comparable with live_peers() values.
+
+    An Endpoint is normalised to how 'wg show' prints it; a hostname cannot be compared with
+    the address wg resolved it to, so it is recorded as "host" and only checked for being set.
+    """
+    settings = _peer_settings(peer)
+    endpoint = settings.get("Endpoint")
+    if endpoint:
+        host, _, port = endpoint.rpartition(":")
+        try:
+            ip = ipaddress.ip_address(host.strip("[]"))
+        except ValueError:
+            endpoint = "host"
+        else:
+            endpoint = f"[{ip}]:{port}" if ip.version == 6 else f"{ip}:{port}"
+    keepalive = settings.get("PersistentKeepalive", "off")
+    return {"allowed_ips": sorted(peer["allowed_ips"]), "preshared_key": settings.get("PresharedKey"),
+            "endpoint": endpoint, "keepalive": 0 if keepalive == "off" else int(keepalive)}
+
+def live_peers(interface):
+    """{public key: peer state as peer_state() describes it} of the running interface, or None if it is down."""
+    proc = run_trace.run(f"wg show {interface} dump", check=False, capture=True)
+    if proc.returncode != 0:
+        return None
+    peers = {}
+    for line in proc.stdout.splitlines()[1:]:  # The first line describes the interface itself
+        fields = line.split("\t")
+        if len(fields) < 8:
+            continue
+        key, preshared_key, endpoint, ips, keepalive = fields[0], fields[1], fields[2], fields[3], fields[7]
+        peers[key] = {"allowed_ips": sorted(ip for ip in ips.split(",") if ip not in ("", "(none)")),
+                      "preshared_key": None if preshared_key == "(none)" else preshared_key,
+                      "endpoint": None if endpoint == "(none)" else endpoint,
+                      "keepalive": 0 if keepalive == "off" else int(keepalive)}
+    return peers
+
+def _differs(wanted, live):
+    if live is None:
+        return True
+    # Without an Endpoint in the config the live one is wherever the peer last roamed from
+    if wanted["endpoint"] == "host":
+        if live["endpoint"] is None:
+            return True
+    elif wanted["endpoint"] and wanted["endpoint"] != live["endpoint"]:
+        return True
+    return any(wanted[field] != live[field] for field in ("allowed_ips", "preshared_key", "keepalive"))
+
+def peer_delta(peers, live):
+    """(peers to add or update, public keys to remove) that bring live in line with peers."""
+    wanted = {peer["public_key"]: peer for peer in peers}
+    updates = [peer for key, peer in wanted.items() if _differs(peer_state(peer), live.get(key))]
+    removals = [key for key in live if key not in wanted]
+    return updates, removals
+
+def apply_delta(interface, updates, removals, run=run_trace.run):
+    """Apply a peer delta with batched 'wg set' commands; untouched peers keep their sessions.
+
+    Updated peers get every setting wg set takes (allowed IPs, preshared key, endpoint,
+    keepalive), so the interface matches the config as 'wg syncconf' would leave it.
+    """
+    clauses = [f"peer {key} remove" for key in removals]
+    with tempfile.TemporaryDirectory() as keys:  # wg set reads preshared keys from files; 0700 by default
+        for i, peer in enumerate(updates):
+            state = peer_state(peer)
+            clause = f"peer {peer['public_key']} allowed-ips {','.join(peer['allowed_ips'])}"
+            psk_path = "/dev/null"  # Clears a preshared key the config no longer has
+            if state["preshared_key"]:
+                psk_path = os.path.join(keys, str(i))
+                with open(os.open(psk_path, os.O_WRONLY | os.O_CREAT, 0o600), "w") as f:
+                    f.write(state["preshared_key"] + "\n")
+            clause += f" preshared-key {psk_path} persistent-keepalive {state['keepalive'] or 'off'}"
+            endpoint = _peer_settings(peer).get("Endpoint")
+            if endpoint:
+                clause += f" endpoint {shlex.quote(endpoint)}"
+            clauses.append(clause)
+        for i in range(0, len(clauses), SET_BATCH):
+            run(f"wg set {interface} {' '.join(clauses[i:i + SET_BATCH])}")
+    return len(clauses)
+
+class Interface(host_state.Step):
+    """The [Interface] section of a WireGuard config; changed only when it differs on disk.
+
+    A service watching this step restarts for interface changes (keys, address, port, MTU)
+    but not for peer changes, which Peers applies to the running interface instead.
+    """
+
+    def __init__(self, path, config):
+        self.name = f"{path} [Interface]"
+        self.path = path
+        self.section = parse_config(config)[0]
+
+    def differs(self):
+        try:
+            with open(self.path) as f:
+                current = parse_config(f.read())[0]
+        except OSError:
+            return "missing"
+        return None if current == self.section else "changed"
+
+    def apply(self, run):
+        pass  # Written by the config File step
+
+class Peers(host_state.Step):
+    """The peers of a config, applied to the running interface as a delta."""
+
+    def __init__(self, interface, config):
+        self.name = f"{interface} peers"
+        self.interface = interface
+        self.peers = parse_config(config)[1]
+        self._delta = None
+
+    def differs(self):
+        live = live_peers(self.interface)
+        if live is None:
+            return None  # Interface down; wg-quick loads every peer when it starts
+        self._delta = updates, removals = peer_delta(self.peers, live)
+        if not updates and not removals:
+            return None
+        return f"{len(updates)} to add or update, {len(removals)} to remove"
+
+    def apply(self, run):
+        apply_delta(self.interface, *self._delta, run)
+
+def update_peers(path, interface, add=(), remove=(), run=run_trace.run, pool=None):
+    """Add or replace peers and remove peers (by name or public key) in the config and the live interface.
+
+    The config is rewritten atomically; the running interface only receives the delta.
+    Removed peers' addresses are released back to pool. Returns (added peers, removed
+    peers, 'wg set' clauses applied).
+    """
+    with open(path) as f:
+        section, peers = parse_config(f.read())
+    remove = set(remove)
+    removed = [peer for peer in peers if peer["name"] in remove or peer["public_key"] in remove]
+    replaced = {peer["public_key"] for peer in add} | {peer["name"] for peer in add if peer["name"]}
+    peers = [peer for peer in peers if peer not in removed
+             and peer["public_key"] not in replaced and peer["name"] not in replaced]
+    peers += add
+    atomic_write(path, render_config(section, peers), 0o600)
+    live = live_peers(interface)
+    applied = 0
+    if live is not None:
+        applied = apply_delta(interface, *peer_delta(peers, live), run)
+    if pool is not None:
+        for peer in removed:
+            pool.release(peer["name"] or peer["public_key"])
+    return list(add), removed, applied
+
+def open_pool(interface, section, peers, state_dir=ipam.IPAM_DIR):
+    """The interface's address pool, with the addresses already in its config leased.
+
+    Configs written before the pool existed are adopted by leasing each peer's address under
+    its name (or public key); after that every name is a single dictionary lookup.
+    """
+    address = next(line.partition("=")[2].strip() for line in section.splitlines() if line.strip().startswith("Address"))
+    server = ipaddress.ip_interface(address.split(",")[0].strip())
+    pool = ipam.Pool(interface, server.network, state_dir)
+    try:
+        if pool.lookup("server") is None:
+            pool.reserve("server", str(server.ip))
+        for peer in peers:
+            name = peer["name"] or peer["public_key"]
+            if pool.lookup(name) is None and peer["allowed_ips"]:
+                ip = ipaddress.ip_interface(peer["allowed_ips"][0]).ip
+                if ip in server.network and pool.owner(ip) is None:
+                    pool.reserve(name, str(ip))
+    except BaseException:
+        pool.close()
+        raise
+    return pool
+
+def section_settings(section):
+    """{key: value} of an [Interface] section."""
+    settings = dict(line.partition("=")[::2] for line in section.splitlines() if "=" in line)
+    return {key.strip(): value.strip() for key, value in settings.items()}
+
+def new_peers(section, peers, names, endpoint, pool, allowed_ips=None):
+    """Generate keys and lease addresses from pool for new jump boxes; return [(peer, client config)]."""
+    taken = {peer["name"] for peer in peers}
+    for name in names:
+        if name in taken:
+            raise ValueError(f"Peer '{name}' already exists.")
+    settings = section_settings(section)
+    server_public = wg_provision.public_key(settings["PrivateKey"])
+    mtu = int(settings["MTU"]) if "MTU" in settings else None
+    addresses = pool.allocate_many(names)
+    created = []
+    for name, address, (private, public) in zip(names, addresses, wg_provision.generate_keypairs(len(names))):
+        peer = {"name": name, "public_key": public, "allowed_ips": [f"{address}/32"], "extra": []}
+        created.append((peer, wg_provision.render_client_config(
+            private, f"{address}/{pool.network.prefixlen}", server_public, f"{endpoint}:{settings['ListenPort']}", mtu,
+            allowed_ips or ("0.0.0.0/0",), None if allowed_ips else "8.8.8.8")))
+    return created
+
+def provision(path, count, endpoint, listen_port, network, mtu=None, allowed_ips=None, state_dir=ipam.IPAM_DIR):
+    """Server config and jump box bundles for a fleet of count, keeping what path already holds.
+
+    Without a config at path this is wg_provision.provision_peers(). Otherwise the server key
+    and every existing peer are reused, and only names not in the config yet get keys and
+    addresses, so a re-run with the same answers renders the same config and a larger fleet
+    only adds peers. Peers the config has beyond the fleet (added with 'wg_peers.py add')
+    are kept. Bundles cover the new peers only; existing jump box scripts stay valid.
+    """
+    interface = os.path.splitext(os.path.basename(path))[0]
+    try:
+        with open(path) as f:
+            section, peers = parse_config(f.read())
+    except FileNotFoundError:
+        network = ipam.fit_network(interface, network, state_dir)
+        with ipam.Pool(interface, network, state_dir) as pool:
+            return wg_provision.provision_peers(count, endpoint, listen_port, network, mtu=mtu,
+                                                allowed_ips=allowed_ips, pool=pool)
+    addresses = [value.strip() for value in section_settings(section)["Address"].split(",")]
+    server = ipaddress.ip_interface(addresses[0])
+    wanted_network = ipaddress.ip_network(network)
+    if server.network.network_address != wanted_network.network_address:
+        raise ValueError(f"{path} uses the tunnel network {server.network}, not {network}; "
+                         f"keep that network, or move the config aside to start over.")
+    # Like the pool, the network only grows: a larger one widens the server's prefix in place
+    network = ipam.fit_network(interface, max(server.network, wanted_network, key=lambda n: n.num_addresses), state_dir)
+    addresses[0] = f"{server.ip}/{network.prefixlen}"
+    # Only the port, MTU and network size come from the answers; the key and any hand-added lines are kept
+    wanted = {"Address": ", ".join(addresses), "ListenPort": str(listen_port), "MTU": str(mtu) if mtu else None}
+    lines = [line for line in section.rstrip("\n").splitlines() if line.partition("=")[0].strip() not in wanted]
+    section = "\n".join(lines + [f"{key} = {value}" for key, value in wanted.items() if value]) + "\n"
+    taken = {peer["name"] for peer in peers}
+    names = [name for name in wg_provision.peer_names(count) if name not in taken]
+    with open_pool(interface, section, peers, state_dir) as pool:
+        created = new_peers(section, peers, names, endpoint, pool, allowed_ips)
+    bundles = [{"name": peer["name"], "address": peer["allowed_ips"][0].split("/")[0], "public_key": peer["public_key"],
+                "client_config": client_config} for peer, client_config in created]
+    return render_config(section, peers + [peer for peer, _ in created]), bundles
+
+def main():
+    parser = argparse.ArgumentParser(description="Add or remove WireGuard peers without restarting the interface.")
+    parser.add_argument("command", choices=["add", "remove", "sync"])
+    parser.add_argument("names", nargs="*", help="Peer names to add, or names/public keys to remove")
+    parser.add_argument("--interface", default="wg0")
+    parser.add_argument("--config", help="Server config (default: /etc/wireguard/<interface>.conf)")
+    parser.add_argument("--endpoint", help="Public IP or hostname of the central server (add command)")
+    parser.add_argument("--out", default="wireguard_bundles", help="Directory for the jump box scripts (add command)")
+    parser.add_argument("--split", nargs="+", metavar="CIDR", help="Route only these networks through the tunnel")
+    parser.add_argument("--exclude", nargs="+", metavar="CIDR", default=[], help="Networks to keep off the tunnel")
+    args = parser.parse_args()
+    path = args.config or f"/etc/wireguard/{args.interface}.conf"
+
+    started = time.perf_counter()
+    if args.command == "sync":
+        with open(path) as f:
+            peers = parse_config(f.read())[1]
+        live = live_peers(args.interface)
+        if live is None:
+            parser.error(f"Interface {args.interface} is not up.")
+        updates, removals = peer_delta(peers, live)
+        apply_delta(args.interface, updates, removals)
+        print(f"{args.interface}: {len(updates)} peer(s) added or updated, {len(removals)} removed "
+              f"in {(time.perf_counter() - started) * 1000:.1f} ms.")
+        return
+    if not args.names:
+        parser.error(f"{args.command} needs at least one peer name.")
+    if args.command == "add" and not args.endpoint:
+        parser.error("add needs --endpoint.")
+    with open(path) as f:
+        section, peers = parse_config(f.read())
+    pool = open_pool(args.interface, section, peers)
+    if args.command == "remove":
+        with pool:
+            _, removed, _ = update_peers(path, args.interface, remove=args.names, pool=pool)
+        missing = set(args.names) - {peer["name"] for peer in removed} - {peer["public_key"] for peer in removed}
+        print(f"Removed {len(removed)} peer(s) in {(time.perf_counter() - started) * 1000:.1f} ms."
+              + (f" Not found: {', '.join(sorted(missing))}." if missing else ""))
+        return
+    allowed_ips = None
+    if args.split or args.exclude:
+        allowed_ips = wg_provision.collapse_cidrs(args.split or ["0.0.0.0/0"], args.exclude)
+    with pool:
+        try:
+            created = new_peers(section, peers, args.names, args.endpoint, pool, allowed_ips)
+        except ValueError as e:
+            parser.error(str(e))
+        update_peers(path, args.interface, add=[peer for peer, _ in created])
+    bundles = [{"name": peer["name"], "client_config": client_config} for peer, client_config in created]
+    paths = wg_provision.write_bundles(bundles, args.out)
+    print(f"Added {len(bundles)} peer(s) in {(time.perf_counter() - started) * 1000:.1f} ms; "
+          f"jump box scripts: {', '.join(paths)}.")
+
+if __name__ == "__main__":
+    main()
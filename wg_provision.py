@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+import argparse
+import base64
+import ipaddress
+import os
+import subprocess
+import time
+import apt_plan
+import bundle_writer
+import depprobe
+
+# Curve25519 field prime and the (A - 2) / 4 ladder constant from RFC 7748
+_P = 2 ** 255 - 19
+_A24 = 121665
+
+# Per-packet overhead of WireGuard encapsulation (outer IP + UDP + WireGuard header) by outer IP version
+WG_OVERHEAD = {4: 60, 6: 80}
+
+# Path MTU search range: 1280 is the smallest MTU IPv6 allows, 1500 plain Ethernet
+PROBE_MIN = 1280
+PROBE_MAX = 1500
+
+# Path MTU probe embedded in generated jump box scripts: lowers the client MTU if the jump box's
+# own uplink (PPPoE, LTE) is narrower than the path measured from the central server.
+MTU_PROBE_SNIPPET = '''
+# Largest packet that reaches host with the DF bit set, by binary search over ping -M do
+def probe_path_mtu(host, low=1280, high=1500):
+    header = 48 if ":" in host else 28
+    def fits(size):
+        return subprocess.run(["ping", "-M", "do", "-c", "1", "-W", "1", "-s", str(size - header), host],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0
+    try:
+        if not fits(low):
+            return None
+    except FileNotFoundError:
+        return None
+    while low < high:
+        mid = (low + high + 1) // 2
+        if fits(mid):
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+# Lower the MTU in a WireGuard config to fit the path to its endpoint (never raises it)
+def fit_mtu(config):
+    lines = config.splitlines()
+    endpoint = [l.split("=", 1)[1].strip() for l in lines if l.startswith("Endpoint")]
+    current = [int(l.split("=", 1)[1]) for l in lines if l.startswith("MTU")]
+    if not endpoint or not current:
+        return config
+    host = endpoint[0].rsplit(":", 1)[0].strip("[]")
+    path_mtu = probe_path_mtu(host)
+    if path_mtu is None:
+        print("Path MTU probe got no replies (ICMP blocked?); keeping MTU " + str(current[0]) + ".")
+        return config
+    fitted = path_mtu - (80 if ":" in host else 60)
+    if fitted >= current[0]:
+        return config
+    print("Path MTU to " + host + " is " + str(path_mtu) + "; lowering tunnel MTU to " + str(fitted) + ".")
+    return "\\n".join("MTU = " + str(fitted) if l.startswith("MTU") else l for l in lines) + "\\n"
+'''
+
+# Jump box setup script template for a single WireGuard client bundle
+JUMPBOX_SCRIPT_TEMPLATE = '''#!/usr/bin/env python3
+import os
+import subprocess
+import time
+$install_packages$mtu_probe
+# Hardcoded client configuration
+client_config = r"""$client_config"""
+
+# Install WireGuard if not present
+install_packages(["wireguard"])
+
+# Fit the tunnel MTU to this box's uplink
+client_config = fit_mtu(client_config)
+
+# Write client config to file
+with open("/etc/wireguard/wg0.conf", "w") as f:
+    f.write(client_config)
+
+# Start WireGuard client
+subprocess.run("wg-quick up wg0", shell=True, check=True)
+subprocess.run("systemctl enable wg-quick@wg0", shell=True, check=True)
+print("WireGuard client set up and started on the jump box.")
+'''
+
+# Pure Python X25519 scalar multiplication (RFC 7748), used when 'cryptography' is missing
+def _x25519(scalar, u):
+    k = bytearray(scalar)
+    k[0] &= 248
+    k[31] &= 127
+    k[31] |= 64
+    k = int.from_bytes(k, "little")
+    x1 = int.from_bytes(u, "little") & ((1 << 255) - 1)
+    x2, z2, x3, z3 = 1, 0, x1, 1
+    swap = 0
+    for t in range(254, -1, -1):
+        k_t = (k >> t) & 1
+        swap ^= k_t
+        if swap:
+            x2, x3 = x3, x2
+            z2, z3 = z3, z2
+        swap = k_t
+        a = x2 + z2
+        aa = a * a % _P
+        b = x2 - z2
+        bb = b * b % _P
+        e = aa - bb
+        c = x3 + z3
+        d = x3 - z3
+        da = d * a % _P
+        cb = c * b % _P
+        x3 = (da + cb) ** 2 % _P
+        z3 = x1 * (da - cb) ** 2 % _P
+        x2 = aa * bb % _P
+        z2 = e * (aa + _A24 * e) % _P
+    if swap:
+        x2, x3 = x3, x2
+        z2, z3 = z3, z2
+    return (x2 * pow(z2, _P - 2, _P) % _P).to_bytes(32, "little")
+
+def _load_backend():
+    """Return the X25519 private key class from 'cryptography', or None if it is not installed."""
+    try:
+        from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+    except ImportError:
+        return None
+    return X25519PrivateKey
+
+def public_key(private_key):
+    """Derive a base64 WireGuard public key from a base64 private key (same as 'wg pubkey')."""
+    raw = base64.b64decode(private_key)
+    backend = _load_backend()
+    if backend is not None:
+        from cryptography.hazmat.primitives import serialization
+        pub = backend.from_private_bytes(raw).public_key().public_bytes(
+            serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+    else:
+        pub = _x25519(raw, (9).to_bytes(32, "little"))
+    return base64.b64encode(pub).decode()
+
+def generate_keypairs(count):
+    """Generate count (private, public) base64 key pairs in-process (same as 'wg genkey | wg pubkey')."""
+    backend = _load_backend()
+    pairs = []
+    if backend is not None:
+        from cryptography.hazmat.primitives import serialization
+        for _ in range(count):
+            key = backend.generate()
+            priv = key.private_bytes(serialization.Encoding.Raw, serialization.PrivateFormat.Raw,
+                                     serialization.NoEncryption())
+            pub = key.public_key().public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+            pairs.append((base64.b64encode(priv).decode(), base64.b64encode(pub).decode()))
+    else:
+        base = (9).to_bytes(32, "little")
+        for _ in range(count):
+            priv = bytearray(os.urandom(32))
+            priv[0] &= 248
+            priv[31] &= 127
+            priv[31] |= 64
+            pairs.append((base64.b64encode(priv).decode(), base64.b64encode(_x25519(priv, base)).decode()))
+    return pairs
+
+def generate_keypair():
+    """Generate a single (private, public) base64 key pair."""
+    return generate_keypairs(1)[0]
+
+def probe_path_mtu(host, low=PROBE_MIN, high=PROBE_MAX, timeout=1):
+    """Find the path MTU to host by binary search over DF-bit pings (ping -M do).
+
+    Returns None if ping is missing or even the smallest probe gets no reply (host down or ICMP filtered).
+    """
+    if not depprobe.which("ping"):
+        return None
+    header = 48 if ":" in host else 28  # IP + ICMP headers around the ping payload
+
+    def fits(size):
+        return subprocess.run(["ping", "-M", "do", "-c", "1", "-W", str(timeout), "-s", str(size - header), host],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0
+
+    if not fits(low):
+        return None
+    while low < high:
+        mid = (low + high + 1) // 2
+        if fits(mid):
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+def tunnel_mtu(path_mtu, endpoint_host):
+    """WireGuard interface MTU that keeps encapsulated packets within path_mtu."""
+    version = 6 if ":" in endpoint_host else 4
+    return path_mtu - WG_OVERHEAD[version]
+
+def collapse_cidrs(include, exclude=()):
+    """Minimal CIDR list covering every network in include minus every network in exclude."""
+    networks = [ipaddress.ip_network(n, strict=False) for n in include]
+    for removed in (ipaddress.ip_network(n, strict=False) for n in exclude):
+        remaining = []
+        for net in networks:
+            if net.version != removed.version or not net.overlaps(removed):
+                remaining.append(net)
+            elif removed.supernet_of(net):
+                continue
+            else:
+                remaining.extend(net.address_exclude(removed))
+        networks = remaining
+    collapsed = []
+    for version in (4, 6):
+        collapsed += ipaddress.collapse_addresses(n for n in networks if n.version == version)
+    return [str(n) for n in collapsed]
+
+def render_server_config(server_private_key, server_address, listen_port, peers, mtu=None):
+    """Render wg0.conf for the central server with one [Peer] block per jump box."""
+    lines = [
+        "[Interface]",
+        f"PrivateKey = {server_private_key}",
+        f"Address = {server_address}",
+        f"ListenPort = {listen_port}",
+    ]
+    if mtu:
+        lines.append(f"MTU = {mtu}")
+    for peer in peers:
+        lines += [
+            "",
+            f"# {peer['name']}",
+            "[Peer]",
+            f"PublicKey = {peer['public_key']}",
+            f"AllowedIPs = {peer['address']}/32",
+        ]
+    return "\n".join(lines) + "\n"
+
+def render_client_config(client_private_key, client_address, server_public_key, endpoint,
+                         mtu=None, allowed_ips=("0.0.0.0/0",), dns="8.8.8.8"):
+    """Render the wg0.conf a jump box uses to reach the central server.
+
+    The defaults route everything through the tunnel; pass a CIDR list (see collapse_cidrs)
+    and dns=None for a split tunnel.
+    """
+    lines = [
+        "[Interface]",
+        f"PrivateKey = {client_private_key}",
+        f"Address = {client_address}",
+    ]
+    if dns:
+        lines.append(f"DNS = {dns}")
+    if mtu:
+        lines.append(f"MTU = {mtu}")
+    lines += [
+        "",
+        "[Peer]",
+        f"PublicKey = {server_public_key}",
+        f"Endpoint = {endpoint}",
+        f"AllowedIPs = {', '.join(allowed_ips)}",
+        "PersistentKeepalive = 25",
+    ]
+    return "\n".join(lines) + "\n"
+
+def render_jumpbox_script(client_config):
+    """Render the self-contained jump box setup script for one client config."""
+    return bundle_writer.render(JUMPBOX_SCRIPT_TEMPLATE, **script_values(client_config))
+
+def script_values(client_config):
+    """Template values for one jump box script."""
+    return {"client_config": client_config, "install_packages": apt_plan.INSTALL_SNIPPET, "mtu_probe": MTU_PROBE_SNIPPET}
+
+def peer_names(count, prefix="jumpbox"):
+    """Jump box names for a fleet of count: 'jumpbox' alone, else 'jumpbox1'..'jumpboxN'."""
+    return [prefix] if count == 1 else [f"{prefix}{i}" for i in range(1, count + 1)]
+
+def provision_peers(count, central_ip, wg_port, network="10.0.0.0/24", prefix="jumpbox",
+                    mtu=None, allowed_ips=None, pool=None):
+    """Generate server and peer keys in one pass and return (server_config, bundles).
+
+    Each bundle is a dict with the peer name, address, keys and rendered client config.
+    Addresses are leased from pool (an ipam.Pool over network) under the names "server" and
+    the peer names, so re-runs keep them; without a pool the server takes the first host
+    address and peers the following ones. mtu is written into every config; allowed_ips
+    (a CIDR list) makes the clients split-tunnel.
+    """
+    net = ipaddress.ip_network(network)
+    if count > net.num_addresses - 3:
+        raise ValueError(f"Network {network} has room for at most {net.num_addresses - 3} peers, {count} requested.")
+    names = peer_names(count, prefix)
+    if pool is not None:
+        if pool.network != net:
+            raise ValueError(f"Address pool '{pool.name}' covers {pool.network}, not {network}.")
+        server_ip, *addresses = pool.allocate_many(["server"] + names)
+    else:
+        hosts = net.hosts()
+        server_ip = next(hosts)
+        addresses = [str(next(hosts)) for _ in names]
+
+    keys = generate_keypairs(count + 1)
+    server_private, server_public = keys[0]
+    endpoint = f"{central_ip}:{wg_port}"
+    bundles = []
+    for name, address, (private, public) in zip(names, addresses, keys[1:]):
+        bundles.append({
+            "name": name,
+            "address": address,
+            "private_key": private,
+            "public_key": public,
+            "client_config": render_client_config(private, f"{address}/{net.prefixlen}", server_public, endpoint, mtu,
+                                                  allowed_ips or ("0.0.0.0/0",), None if allowed_ips else "8.8.8.8"),
+        })
+    server_config = render_server_config(server_private, f"{server_ip}/{net.prefixlen}", wg_port, bundles, mtu)
+    return server_config, bundles
+
+def write_bundles(bundles, out_dir, script_prefix="setup_jumpbox_wireguard"):
+    """Write one executable jump box script per bundle, rewriting only changed ones; return the file paths."""
+    artifacts = [bundle_writer.Artifact(f"{script_prefix}_{bundle['name']}.py", JUMPBOX_SCRIPT_TEMPLATE,
+                                        script_values(bundle["client_config"])) for bundle in bundles]
+    bundle_writer.BundleWriter(out_dir).write(artifacts)
+    return [os.path.join(out_dir, artifact.name) for artifact in artifacts]
+
+def write_server_config(server_config, path="/etc/wireguard/wg0.conf"):
+    """Write the server wg0.conf with owner-only permissions."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.write(server_config)
+
+def main():
+    parser = argparse.ArgumentParser(description="Provision many WireGuard jump boxes in one pass.")
+    parser.add_argument("--peers", type=int, required=True, help="Number of jump boxes to provision")
+    parser.add_argument("--endpoint", required=True, help="Public IP or hostname of the central server")
+    parser.add_argument("--port", type=int, default=51820, help="WireGuard listen port")
+    parser.add_argument("--network", default="10.0.0.0/16", help="Tunnel network (server takes the first address)")
+    parser.add_argument("--server-config", default="/etc/wireguard/wg0.conf", help="Where to write the server config")
+    parser.add_argument("--out", default="wireguard_bundles", help="Directory for the jump box scripts")
+    parser.add_argument("--mtu", type=int, help="Tunnel MTU for every config (default: probe with --probe-host, else unset)")
+    parser.add_argument("--probe-host", help="Host across the jump boxes' uplink to measure the path MTU to")
+    parser.add_argument("--split", nargs="+", metavar="CIDR", help="Route only these networks through the tunnel")
+    parser.add_argument("--exclude", nargs="+", metavar="CIDR", default=[], help="Networks to keep off the tunnel")
+    args = parser.parse_args()
+
+    mtu = args.mtu
+    if mtu is None and args.probe_host:
+        path_mtu = probe_path_mtu(args.probe_host)
+        if path_mtu is None:
+            print(f"Path MTU probe to {args.probe_host} got no replies; leaving MTU unset.")
+        else:
+            mtu = tunnel_mtu(path_mtu, args.endpoint)
+            print(f"Path MTU to {args.probe_host} is {path_mtu}; tunnel MTU {mtu}.")
+    allowed_ips = None
+    if args.split or args.exclude:
+        allowed_ips = collapse_cidrs(args.split or ["0.0.0.0/0"], args.exclude)
+        print(f"AllowedIPs: {', '.join(allowed_ips)}")
+
+    started = time.perf_counter()
+    # An existing server config keeps its key and peers; addresses come from the interface's pool,
+    # so re-runs and wg_peers.py agree on them
+    import wg_peers
+    try:
+        server_config, bundles = wg_peers.provision(args.server_config, args.peers, args.endpoint, args.port,
+                                                    args.network, mtu=mtu, allowed_ips=allowed_ips)
+    except ValueError as e:
+        parser.error(str(e))
+    write_server_config(server_config, args.server_config)
+    paths = write_bundles(bundles, args.out)
+    elapsed = time.perf_counter() - started
+    print(f"Wrote {args.server_config} with {server_config.count('[Peer]')} peers and {len(paths)} new jump box scripts "
+          f"to '{args.out}' in {elapsed:.2f}s.")
+
+if __name__ == "__main__":
+    main()